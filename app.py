@@ -1,11 +1,21 @@
+import atexit
 import os
-import tempfile
-from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for
+import threading
+import time
+import uuid
+from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file, abort, Response
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from pdf2md.pdf_processor import PDFProcessor
 from pdf2md.ocr_processor import OCRProcessor
 from pdf2md.markdown_generator import MarkdownGenerator
+from pdf2md.ocr_cache import OCRCache
+from pdf2md.pipeline import ConversionPipeline
+from pdf2md.jobs import JobQueue, STATUS_DONE
+from pdf2md.metrics import Metrics
+from pdf2md.retry import Retrier
+from pdf2md.ocr_backends import create_backend
+from pdf2md.service import ConversionService
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'supersecretkey'
@@ -14,11 +24,150 @@ UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+RESULTS_FOLDER = 'results'
+os.makedirs(RESULTS_FOLDER, exist_ok=True)
+app.config['RESULTS_FOLDER'] = RESULTS_FOLDER
+
+# Uploads are copied to disk in chunks and rejected once they exceed the size limit
+MAX_UPLOAD_BYTES = int(float(os.environ.get('PDF2MD_MAX_UPLOAD_MB', '100')) * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Leave room for the multipart form around the file
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Uploads and results of finished jobs are deleted after this many seconds
+FILE_TTL = float(os.environ.get('PDF2MD_FILE_TTL_HOURS', '24')) * 3600
+SWEEP_INTERVAL = 600
+
+# The result page renders only the start of large results; the rest is downloaded
+RESULT_PREVIEW_BYTES = 256 * 1024
+
+# OCR results are cached across uploads, so re-uploading a PDF does not pay for OCR again
+OCR_CACHE = OCRCache(os.path.join('cache', 'ocr_cache.sqlite'))
+
+# Timings and counters of every conversion, exported at /metrics
+METRICS = Metrics()
+
+# Retries and the circuit breaker are shared by all jobs, as they all call the same API
+OCR_RETRIER = Retrier()
+
+# Conversions run as background jobs so uploads return immediately
+JOB_QUEUE = JobQueue(os.path.join('jobs', 'jobs.sqlite'))
+JOB_WORKERS = int(os.environ.get('PDF2MD_JOB_WORKERS', '2'))
+
+# OCR engine (gemini, tesseract or stub) and the number of OCR requests in flight across all jobs
+OCR_BACKEND = os.environ.get('PDF2MD_OCR_BACKEND', 'gemini')
+OCR_BACKEND_URL = os.environ.get('PDF2MD_OCR_BACKEND_URL')
+OCR_WORKERS = int(os.environ.get('PDF2MD_OCR_WORKERS', str(JOB_WORKERS)))
+_background_started = False
+_background_lock = threading.Lock()
+
+def build_pipeline():
+    # Built once and shared by every job, so the OCR client, its connections and the
+    # OCR worker pool are reused instead of being set up again for every upload
+    pdf_processor = PDFProcessor(dpi=300, image_format='png', metrics=METRICS)
+    # Assumes API key is handled by the backend (e.g., via .env)
+    backend = create_backend(OCR_BACKEND, url=OCR_BACKEND_URL)
+    ocr_processor = OCRProcessor(
+        max_workers=OCR_WORKERS, cache=OCR_CACHE, backend=backend, retrier=OCR_RETRIER, metrics=METRICS,
+    )
+    markdown_generator = MarkdownGenerator(metrics=METRICS)
+    # Pages are rendered in memory, so no temporary directory is needed
+    return ConversionPipeline(
+        pdf_processor, ocr_processor, markdown_generator, in_memory=True, show_progress=False,
+        metrics=METRICS,
+    )
+
+# Long-lived conversion pipeline shared by all jobs, checked by /healthz
+CONVERSION_SERVICE = ConversionService(build_pipeline)
+atexit.register(CONVERSION_SERVICE.close)
+
 ALLOWED_EXTENSIONS = {'pdf'}
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def start_background_workers():
+    # Start the job workers and the sweeper on the first request rather than at import
+    # time, so the reloader's parent process (which never serves requests) does not run them
+    global _background_started
+    with _background_lock:
+        if not _background_started:
+            CONVERSION_SERVICE.start()
+            if CONVERSION_SERVICE.startup_error:
+                app.logger.error(f"Conversion service failed to start: {CONVERSION_SERVICE.startup_error}")
+            JOB_QUEUE.start(process_job, workers=JOB_WORKERS)
+            threading.Thread(target=sweep_loop, name='pdf2md-sweeper', daemon=True).start()
+            _background_started = True
+
+def remove_files(paths, reason):
+    for path in paths:
+        try:
+            if path and os.path.exists(path): # Check if file exists before removing
+                os.remove(path)
+                app.logger.info(f"Removed file of {reason}: {path}")
+        except OSError as e:
+            app.logger.error(f"Error removing file of {reason} {path}: {e}")
+
+def save_upload(stream, filepath):
+    """
+    Copies an uploaded PDF from a stream to disk in chunks, so it is never held in memory.
+    Raises RequestEntityTooLarge if it exceeds MAX_UPLOAD_BYTES and ValueError if it is not a PDF;
+    the partial file is removed in both cases.
+    """
+    size = 0
+    try:
+        with open(filepath, 'wb') as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise RequestEntityTooLarge()
+                f.write(chunk)
+
+        # The PDF header must appear within the first 1024 bytes
+        with open(filepath, 'rb') as f:
+            if b'%PDF-' not in f.read(1024):
+                raise ValueError("The uploaded file is not a PDF.")
+    except Exception:
+        remove_files([filepath], 'rejected upload')
+        raise
+
+def new_upload_path(filename):
+    # Prefix stored uploads so that files with the same name do not overwrite each other
+    return os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+
+def sweep_expired_files():
+    """
+    Deletes finished jobs older than FILE_TTL together with their files, and stray files
+    in the upload and result folders that no queued or running job needs.
+    """
+    cutoff = time.time() - FILE_TTL
+    for job in JOB_QUEUE.delete_expired(cutoff):
+        remove_files([job['pdf_path'], job['result_path']], 'expired job')
+
+    # Stray files get an extra sweep interval, so a result written just before its job
+    # was last updated is never removed before the job itself expires
+    active_paths = {os.path.abspath(job['pdf_path']) for job in JOB_QUEUE.list_active()}
+    stray_cutoff = cutoff - SWEEP_INTERVAL
+    for folder in (app.config['UPLOAD_FOLDER'], app.config['RESULTS_FOLDER']):
+        stale = [
+            entry.path for entry in os.scandir(folder)
+            if entry.is_file() and entry.stat().st_mtime < stray_cutoff
+            and os.path.abspath(entry.path) not in active_paths
+        ]
+        remove_files(stale, 'expired upload or result')
+
+def sweep_loop():
+    while True:
+        try:
+            sweep_expired_files()
+        except Exception as e:
+            app.logger.error(f"Error sweeping expired files: {e}", exc_info=True)
+        time.sleep(SWEEP_INTERVAL)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -34,74 +183,149 @@ def upload_file():
         return redirect(request.url)
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
-        markdown_content = process_pdf_to_markdown(filepath)
-        # Clean up the uploaded file after processing
-        # os.remove(filepath) # Consider if you want to keep or remove the uploaded PDF
-
-        # Check if process_pdf_to_markdown returned an error message (string)
-        if isinstance(markdown_content, str) and markdown_content.startswith("Error:"):
-            # An error occurred during processing, render index with error
-            try:
-                if os.path.exists(filepath): # Check if file exists before removing
-                    os.remove(filepath)
-                    app.logger.info(f"Removed failed upload: {filepath}")
-            except OSError as e:
-                app.logger.error(f"Error removing failed upload {filepath}: {e}")
-            return render_template('index.html', error_message=markdown_content)
-
-        # If successful, consider removing the uploaded PDF if it's no longer needed
-        # For now, we keep it as per current commented out os.remove
-        # try:
-        #     if os.path.exists(filepath):
-        #         os.remove(filepath)
-        #         app.logger.info(f"Removed successfully processed upload: {filepath}")
-        # except OSError as e:
-        #     app.logger.error(f"Error removing successfully processed upload {filepath}: {e}")
-
-        return render_template('result.html', markdown_content=markdown_content, filename=filename)
+        filepath = new_upload_path(filename)
+        try:
+            save_upload(file.stream, filepath)
+        except ValueError as e:
+            return render_template('index.html', error_message=str(e)), 400
+
+        # Queue the conversion and return right away; the result page polls for progress
+        job_id = JOB_QUEUE.submit(filepath, filename)
+        return redirect(url_for('job_page', job_id=job_id))
     else:
         # Invalid file type
         return render_template('index.html', error_message="Invalid file type. Please upload a PDF.")
 
-def process_pdf_to_markdown(pdf_filepath):
+@app.route('/api/upload', methods=['POST'])
+def api_upload():
+    # Raw PDF body (e.g. curl --data-binary @file.pdf or chunked transfer encoding),
+    # streamed to disk without multipart parsing
+    filename = secure_filename(request.args.get('filename', 'document.pdf')) or 'document.pdf'
+    if not allowed_file(filename):
+        return jsonify({'error': "Invalid file type. Please upload a PDF."}), 400
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        raise RequestEntityTooLarge()
+
+    filepath = new_upload_path(filename)
+    try:
+        save_upload(request.stream, filepath)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    job_id = JOB_QUEUE.submit(filepath, filename)
+    return jsonify({
+        'id': job_id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'page_url': url_for('job_page', job_id=job_id),
+    }), 202
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    message = f"The file is too large. The maximum upload size is {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB."
+    if request.path.startswith('/api/'):
+        return jsonify({'error': message}), 413
+    return render_template('index.html', error_message=message), 413
+
+def get_job_or_404(job_id):
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    job = get_job_or_404(job_id)
+    return render_template(
+        'result.html', job_id=job_id, filename=job['filename'], preview_bytes=RESULT_PREVIEW_BYTES
+    )
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    job = get_job_or_404(job_id)
+    done = job['status'] == STATUS_DONE and job['result_path'] and os.path.exists(job['result_path'])
+    return jsonify({
+        'id': job['id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'pages_done': job['pages_done'],
+        'pages_total': job['pages_total'],
+        'error': job['error'],
+        'result_url': url_for('job_result', job_id=job_id) if done else None,
+        'download_url': url_for('job_download', job_id=job_id) if done else None,
+        'result_size': os.path.getsize(job['result_path']) if done else None,
+    })
+
+def get_result_path_or_404(job_id):
+    job = get_job_or_404(job_id)
+    if job['status'] != STATUS_DONE or not job['result_path'] or not os.path.exists(job['result_path']):
+        abort(404)
+    return job['result_path'], job['filename']
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    # Streamed from disk; supports Range requests, which the result page uses for its preview
+    result_path, _ = get_result_path_or_404(job_id)
+    return send_file(result_path, mimetype='text/markdown; charset=utf-8')
+
+@app.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    result_path, filename = get_result_path_or_404(job_id)
+    download_name = os.path.splitext(filename)[0] + '.md'
+    return send_file(result_path, mimetype='text/markdown; charset=utf-8', as_attachment=True,
+                     download_name=download_name)
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format, with p50/p95 summaries of every stage
+    gauges = {f"jobs_{status}": count for status, count in JOB_QUEUE.count_by_status().items()}
+    gauges.update({f"ocr_cache_{name}": value for name, value in OCR_CACHE.get_stats().items()})
+    gauges.update({f"ocr_retry_{name}": value for name, value in OCR_RETRIER.get_stats().items()})
+    return Response(METRICS.to_prometheus(gauges=gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    # Healthy when the shared pipeline started, the OCR backend answers and the job workers run
+    health = CONVERSION_SERVICE.check_health()
+    health['job_workers'] = JOB_QUEUE.count_alive_workers()
+    if health['job_workers'] < JOB_WORKERS:
+        health['healthy'] = False
+    return jsonify(health), 200 if health['healthy'] else 503
+
+def process_job(job, progress_callback):
     """
-    Processes the PDF to Markdown.
-    Returns the Markdown string on success, or an error message string starting with "Error:" on failure.
+    Processes a queued conversion job. Raises RuntimeError with a user-facing message on failure.
+    """
+    pdf_filepath = job['pdf_path']
+    # send_file resolves relative paths against the app root, so store an absolute path
+    markdown_path = os.path.abspath(os.path.join(app.config['RESULTS_FOLDER'], f"{job['id']}.md"))
+
+    error_message = process_pdf_to_markdown(pdf_filepath, markdown_path, progress_callback)
+    if error_message:
+        # An error occurred during processing, remove the failed upload and result
+        remove_files([pdf_filepath, markdown_path], 'failed job')
+        raise RuntimeError(error_message)
+
+    JOB_QUEUE.update(job['id'], result_path=markdown_path)
+    # The upload is no longer needed once converted; the result is kept until it expires
+    remove_files([pdf_filepath], 'converted upload')
+
+def process_pdf_to_markdown(pdf_filepath, markdown_path, progress_callback=None):
+    """
+    Processes the PDF to Markdown, writing the result to markdown_path.
+    Returns None on success, or an error message string starting with "Error:" on failure.
     """
     try:
-        # Create a temporary directory for intermediate files
-        with tempfile.TemporaryDirectory(prefix="pdf2md_webapp_") as temp_dir:
-            # Step 1: Convert PDF to images
-            pdf_processor = PDFProcessor(dpi=300, image_format='png')
-            image_paths = pdf_processor.convert_pdf_to_images(Path(pdf_filepath), Path(temp_dir)) # Ensure Path objects
-            if not image_paths:
-                return "Error: Could not convert PDF to images. The PDF might be empty, corrupted, or password-protected."
-
-            # Step 2: Process images with OCR
-            ocr_processor = OCRProcessor() # Assumes API key is handled by OCRProcessor (e.g., via .env)
-            ocr_results = ocr_processor.process_images(image_paths)
-            if not ocr_results: # Assuming process_images returns a list, and empty means failure or no text
-                # Check if any image was processed but no text found
-                if any(isinstance(res, dict) and res.get("text") == "" for res in ocr_results if res): # More specific check if possible
-                     return "Error: OCR processing did not find any text in the images. The PDF might be image-based with no textual content."
-                return "Error: OCR processing failed. This could be due to API issues or unreadable images."
-
-            # Filter out potential None results if process_images can return them
-            valid_ocr_results = [res for res in ocr_results if res and "text" in res]
-            if not valid_ocr_results and image_paths: # If there were images but no valid OCR results
-                 return "Error: OCR processing yielded no valid text results from the document images."
-
-
-            # Step 3: Generate Markdown
-            markdown_generator = MarkdownGenerator()
-            markdown_text = markdown_generator.generate_markdown(valid_ocr_results)
-            if not markdown_text.strip(): # If markdown is empty (e.g. only whitespace)
-                return "Error: Generated Markdown is empty. This might happen if the PDF contained no recognizable text."
-
-            return markdown_text
+        # Render, OCR and convert the pages (served from the cache for previously seen PDFs)
+        num_pages = CONVERSION_SERVICE.convert(str(pdf_filepath), markdown_path, progress_callback)
+        if not num_pages:
+            return "Error: Could not convert PDF to images. The PDF might be empty, corrupted, or password-protected."
+
+        with open(markdown_path, 'r', encoding='utf-8') as f:
+            has_text = any(line.strip() for line in f)
+        if not has_text: # If markdown is empty (e.g. only whitespace)
+            return "Error: Generated Markdown is empty. This might happen if the PDF contained no recognizable text."
+
+        return None
     except Exception as e:
         # Log the exception e for debugging
         app.logger.error(f"Error during PDF processing for {pdf_filepath}: {e}", exc_info=True)
@@ -0,0 +1,179 @@
+"""
+Benchmark for the startup time of the CLI and the web app.
+
+Runs each entry point many times in fresh interpreters and reports the
+median wall time on top of a bare interpreter start. Also checks that the
+heavy dependencies (PyMuPDF, pdf2image, the Gemini SDK, ...) are not
+imported until a stage that needs them runs, since wrappers invoking the
+CLI thousands of times pay the startup cost on every call.
+
+Usage:
+    python benchmarks/bench_import.py [--runs 10] [--max-seconds 0.3] [--importtime 15]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported by the stage that uses them
+HEAVY_MODULES = ("fitz", "pymupdf", "pdf2image", "PIL", "google.generativeai", "grpc", "dotenv", "tqdm")
+
+# Entry points timed by the benchmark; the app is imported from a scratch directory
+# as it creates its upload and result folders in the working directory
+ENTRY_POINTS = {
+    "python": "pass",
+    "import pdf2md.cli": "import pdf2md.cli",
+    "pdf2md.cli --help": (
+        "import runpy, sys\n"
+        "sys.argv = ['pdf2md.cli', '--help']\n"
+        "sys.stdout = open(__import__('os').devnull, 'w')\n"
+        "try:\n"
+        "    runpy.run_module('pdf2md.cli', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "sys.stdout = sys.__stdout__"
+    ),
+    "import app": "import app",
+}
+
+
+def run_python(code: str, cwd: str, extra_args: List[str] = ()) -> subprocess.CompletedProcess:
+    """
+    Run Python code in a fresh interpreter with the repository on the path.
+
+    Args:
+        code: Code to run
+        cwd: Working directory
+        extra_args: Interpreter options (e.g. -X importtime)
+
+    Returns:
+        Completed process with its output captured
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PYTHONWARNINGS="ignore")
+    return subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def time_entry_point(code: str, cwd: str, runs: int) -> float:
+    """
+    Measure the median wall time of an entry point.
+
+    Args:
+        code: Code importing or running the entry point
+        cwd: Working directory
+        runs: Number of runs
+
+    Returns:
+        Median wall time in seconds
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_python(code, cwd)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def find_heavy_modules(code: str, cwd: str) -> List[str]:
+    """
+    List the heavy modules imported by an entry point.
+
+    Args:
+        code: Code importing or running the entry point
+        cwd: Working directory
+
+    Returns:
+        Names of the heavy modules found in sys.modules afterwards
+    """
+    check = f"{code}\nimport json, sys\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    return json.loads(run_python(check, cwd).stdout.strip().splitlines()[-1])
+
+
+def top_imports(code: str, cwd: str, count: int) -> List[Dict]:
+    """
+    Find the slowest imports of an entry point with -X importtime.
+
+    Args:
+        code: Code importing or running the entry point
+        cwd: Working directory
+        count: Number of imports to return
+
+    Returns:
+        Dictionaries with the "module" name and "cumulative" import time in seconds, slowest first
+    """
+    stderr = run_python(code, cwd, ["-X", "importtime"]).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        imports.append({"module": module.strip(), "cumulative": int(cumulative) / 1e6})
+    imports.sort(key=lambda entry: entry["cumulative"], reverse=True)
+    return imports[:count]
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the CLI and the web app")
+    parser.add_argument("--runs", type=int, default=10, help="Number of runs per entry point (default: 10)")
+    parser.add_argument(
+        "--max-seconds", type=float,
+        help="Fail if an entry point takes more than this many seconds on top of a bare interpreter (optional)"
+    )
+    parser.add_argument(
+        "--importtime", type=int, default=0, metavar="N",
+        help="Print the N slowest imports of pdf2md.cli (default: 0)"
+    )
+    parser.add_argument("--output", help="Path to write the results as JSON (optional)")
+    args = parser.parse_args()
+
+    failed = False
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="pdf2md_bench_") as scratch_dir:
+        baseline = time_entry_point(ENTRY_POINTS["python"], scratch_dir, args.runs)
+        print(f"{'python':<20} {baseline * 1000:8.1f} ms (bare interpreter)")
+
+        for name, code in ENTRY_POINTS.items():
+            if name == "python":
+                continue
+
+            seconds = time_entry_point(code, scratch_dir, args.runs)
+            heavy = find_heavy_modules(code, scratch_dir)
+            results[name] = {"seconds": round(seconds, 4), "overhead": round(seconds - baseline, 4), "heavy": heavy}
+            print(f"{name:<20} {seconds * 1000:8.1f} ms (+{(seconds - baseline) * 1000:.1f} ms)"
+                  + (f"  heavy imports: {', '.join(heavy)}" if heavy else ""))
+
+            if heavy:
+                print(f"FAIL: {name} imports {', '.join(heavy)} eagerly")
+                failed = True
+            if args.max_seconds and seconds - baseline > args.max_seconds:
+                print(f"FAIL: {name} takes more than {args.max_seconds} s on top of the interpreter")
+                failed = True
+
+        if args.importtime:
+            print("\nSlowest imports of pdf2md.cli (cumulative):")
+            for entry in top_imports(ENTRY_POINTS["import pdf2md.cli"], scratch_dir, args.importtime):
+                print(f"  {entry['cumulative'] * 1000:8.1f} ms  {entry['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"baseline": round(baseline, 4), "entry_points": results}, output_file, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
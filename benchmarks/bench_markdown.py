@@ -0,0 +1,178 @@
+"""
+Benchmark for Markdown generation on large OCR outputs.
+
+Measures the throughput of MarkdownGenerator on a synthetic OCR corpus (or on
+text files given on the command line) and checks that the run time grows
+linearly with the input size, so that accidental quadratic behavior is caught
+even on machines of different speed.
+
+With --workers, the parallel mode is timed too and its output checked to
+be identical to the sequential output.
+
+Usage:
+    python benchmarks/bench_markdown.py [--size-mb 8] [--min-throughput MB/s] [--workers 4] [files...]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf2md.markdown_generator import MarkdownGenerator  # noqa: E402
+
+# Words used to build synthetic paragraphs
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or an which "
+    "document page table figure results analysis method data system value section report"
+).split()
+
+# Maximum ratio between the per-MB time of the full corpus and of a quarter of it
+MAX_SCALING_RATIO = 2.0
+
+
+def make_page(rng: random.Random) -> str:
+    """
+    Build the OCR text of one synthetic page.
+
+    Args:
+        rng: Random number generator
+
+    Returns:
+        Text mixing headings, paragraphs with hard line breaks, and lists
+    """
+    blocks = []
+    for _ in range(rng.randint(8, 20)):
+        kind = rng.random()
+        if kind < 0.15:
+            blocks.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))).title())
+        elif kind < 0.3:
+            marker = rng.choice(["-", "*", "•"])
+            blocks.append("\n".join(
+                f"{marker}  " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+                for _ in range(rng.randint(2, 6))
+            ))
+        elif kind < 0.4:
+            blocks.append(f"{rng.randint(1, 20)}. " + " ".join(rng.choice(WORDS) for _ in range(8)))
+        else:
+            lines = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))) + rng.choice([",", ".", ""])
+                for _ in range(rng.randint(2, 10))
+            ]
+            blocks.append("\n".join(lines))
+    return rng.choice(["\n\n", "\n \n", "\n\n\n"]).join(blocks)
+
+
+def make_corpus(size_bytes: int, seed: int = 0) -> List[str]:
+    """
+    Build a synthetic OCR corpus.
+
+    Args:
+        size_bytes: Approximate total size of the corpus
+        seed: Seed of the random number generator
+
+    Returns:
+        List of page texts
+    """
+    rng = random.Random(seed)
+    pages = []
+    total = 0
+    while total < size_bytes:
+        page = make_page(rng)
+        pages.append(page)
+        total += len(page)
+    return pages
+
+
+def time_generation(generator: MarkdownGenerator, pages: List[str], repeat: int) -> float:
+    """
+    Time streaming Markdown generation of a corpus.
+
+    Args:
+        generator: Markdown generator
+        pages: Page texts
+        repeat: Number of runs; the fastest is kept
+
+    Returns:
+        Best run time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        output = io.StringIO()
+        start = time.perf_counter()
+        generator.write_markdown(pages, output)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark Markdown generation on large OCR outputs")
+    parser.add_argument("files", nargs="*", help="OCR text files to use instead of a synthetic corpus")
+    parser.add_argument("--size-mb", type=float, default=8, help="Size of the synthetic corpus in MB (default: 8)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the fastest is reported (default: 3)")
+    parser.add_argument(
+        "--min-throughput", type=float,
+        help="Fail if the throughput is below this many MB per second (optional)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Also time generation with this many worker processes (default: 1, sequential only)"
+    )
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as text_file:
+                pages.append(text_file.read())
+    else:
+        pages = make_corpus(int(args.size_mb * 1024 * 1024))
+
+    generator = MarkdownGenerator()
+    size_mb = sum(len(page) for page in pages) / (1024 * 1024)
+    seconds = time_generation(generator, pages, args.repeat)
+    throughput = size_mb / seconds
+    print(f"Corpus: {len(pages)} pages, {size_mb:.1f} MB")
+    print(f"Markdown generation: {seconds:.3f} s, {throughput:.1f} MB/s")
+
+    failed = False
+
+    # Compare with a quarter of the corpus: a linear-time generator takes
+    # about the same time per MB on both
+    quarter = pages[:max(1, len(pages) // 4)]
+    quarter_mb = sum(len(page) for page in quarter) / (1024 * 1024)
+    quarter_seconds = time_generation(generator, quarter, args.repeat)
+    scaling = (seconds / size_mb) / (quarter_seconds / quarter_mb)
+    print(f"Scaling: {scaling:.2f}x time per MB on the full corpus vs a quarter of it")
+    if scaling > MAX_SCALING_RATIO:
+        print(f"FAIL: time per MB grows with input size (more than {MAX_SCALING_RATIO}x)")
+        failed = True
+
+    if args.min_throughput and throughput < args.min_throughput:
+        print(f"FAIL: throughput below {args.min_throughput} MB/s")
+        failed = True
+
+    if args.workers > 1:
+        parallel = MarkdownGenerator(workers=args.workers)
+        parallel_seconds = time_generation(parallel, pages, args.repeat)
+        print(
+            f"Parallel ({args.workers} workers): {parallel_seconds:.3f} s, "
+            f"{size_mb / parallel_seconds:.1f} MB/s, {seconds / parallel_seconds:.2f}x"
+        )
+        if parallel.generate_markdown(pages) != generator.generate_markdown(pages):
+            print("FAIL: parallel output differs from sequential output")
+            failed = True
+        parallel.close()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+End-to-end benchmark of the conversion pipeline.
+
+Generates synthetic PDFs with PyMuPDF (text-native pages, image-only
+"scanned" pages, or a mix), starts the stub OCR server with a simulated
+latency model, and runs the full command-line converter on every scenario.
+Reports pages per second, peak RSS, peak temporary disk usage and time to
+first page, and compares them with the stored baselines, or with another
+revision of the code run on the same machine in the same run.
+
+Usage:
+    python benchmarks/bench_pipeline.py                    # run and compare with baselines.json
+    python benchmarks/bench_pipeline.py --against HEAD~1   # compare with a git revision, run alongside
+    python benchmarks/bench_pipeline.py --save-baseline    # run and store the results as baselines
+    python benchmarks/bench_pipeline.py --scenario mixed-40 --latency 0.5
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from pdf2md.stub_server import StubOCRServer  # noqa: E402
+
+# Default file holding the baseline results
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Benchmark scenarios: document shape and converter options
+SCENARIOS = [
+    {"name": "text-native-20", "pages": 20, "image_ratio": 0.0, "options": ["--text-layer"]},
+    {"name": "scanned-40", "pages": 40, "image_ratio": 1.0, "options": ["--workers", "8"]},
+    {"name": "scanned-40-in-memory", "pages": 40, "image_ratio": 1.0, "options": ["--workers", "8", "--in-memory"]},
+    {"name": "scanned-40-batched", "pages": 40, "image_ratio": 1.0, "options": ["--workers", "4", "--batch-size", "4"]},
+    {"name": "mixed-40", "pages": 40, "image_ratio": 0.5, "options": ["--text-layer", "--workers", "8"]},
+]
+
+# Metrics compared with the baselines: whether higher values are better, and the
+# smallest absolute change counted as a regression, so that timer noise on
+# near-zero values is not reported
+COMPARED_METRICS: Dict[str, Tuple[bool, float]] = {
+    "pages_per_second": (True, 0.0),
+    "first_page_seconds": (False, 0.1),
+    "peak_rss_mb": (False, 10.0),
+    "peak_temp_disk_mb": (False, 1.0),
+}
+
+# Words used to fill the synthetic pages
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud"
+).split()
+
+
+def make_pdf(path: str, pages: int, image_ratio: float, seed: int = 0) -> None:
+    """
+    Generate a synthetic PDF.
+
+    Text-native pages have a heading, paragraphs and a bullet list in the
+    text layer. Image-only pages contain the same kind of content as a
+    rendered picture without any text layer, like a scanned document.
+
+    Args:
+        path: Path to the PDF file to write
+        pages: Number of pages
+        image_ratio: Fraction of image-only pages, spread evenly over the document
+        seed: Seed of the random text
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+    image_pages = round(pages * image_ratio)
+
+    for page_num in range(pages):
+        text = f"Section {page_num + 1}\n\n"
+        for _ in range(4):
+            text += " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 80))) + ".\n\n"
+        text += "\n".join("- " + " ".join(rng.choice(WORDS) for _ in range(6)) for _ in range(4))
+
+        page = document.new_page()
+        page.insert_textbox(page.rect + (54, 54, -54, -54), text, fontsize=11)
+
+        # Spread image-only pages evenly: page i is scanned when the running count increases
+        if (page_num + 1) * image_pages // pages > page_num * image_pages // pages:
+            pixmap = page.get_pixmap(dpi=150)
+            document.delete_page(page_num)
+            page = document.new_page(page_num)
+            page.insert_image(page.rect, pixmap=pixmap)
+
+    document.save(path)
+    document.close()
+
+
+def directory_size(path: str) -> int:
+    """
+    Get the total size of the files in a directory tree.
+
+    Args:
+        path: Directory
+
+    Returns:
+        Size in bytes
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                # The file was deleted while walking
+                pass
+    return total
+
+
+def get_machine() -> Dict:
+    """
+    Describe the machine the benchmark runs on, to tell whether baselines are comparable.
+
+    Returns:
+        Operating system, architecture, processor count and Python version
+    """
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def export_revision(revision: str, directory: str) -> None:
+    """
+    Extract the files of a git revision of the repository.
+
+    Args:
+        revision: Git revision, e.g. a commit, branch or tag
+        directory: Directory to extract the files into
+    """
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", revision], cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    if archive.returncode != 0:
+        raise RuntimeError(f"Cannot export revision {revision}: {archive.stderr.decode('utf-8', 'replace').strip()}")
+    with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar_file:
+        tar_file.extractall(directory)
+
+
+def run_scenario(scenario: Dict, work_dir: str, backend_url: str, code_dir: str = REPO_DIR) -> Dict:
+    """
+    Run the command-line converter on one scenario.
+
+    Args:
+        scenario: Scenario from SCENARIOS
+        work_dir: Directory for the PDF, output and temporary files
+        backend_url: URL of the stub OCR server
+        code_dir: Directory of the pdf2md code to run (default: this repository)
+
+    Returns:
+        Results of the scenario
+    """
+    name = scenario["name"]
+    pdf_path = os.path.join(work_dir, f"{name}.pdf")
+    output_path = os.path.join(work_dir, f"{name}.md")
+    report_path = os.path.join(work_dir, f"{name}.json")
+    temp_dir = os.path.join(work_dir, f"{name}_tmp")
+    os.makedirs(temp_dir, exist_ok=True)
+    make_pdf(pdf_path, scenario["pages"], scenario["image_ratio"])
+
+    command = [
+        sys.executable, "-m", "pdf2md.cli", "--input", pdf_path, "--output", output_path,
+        "--temp-dir", temp_dir, "--report", report_path,
+        "--backend", "stub", "--backend-url", backend_url,
+    ] + scenario["options"]
+
+    # Sample the temporary directory while the converter runs
+    peak_disk = 0
+    stop_event = threading.Event()
+
+    def sample_disk():
+        nonlocal peak_disk
+        while not stop_event.wait(0.02):
+            peak_disk = max(peak_disk, directory_size(temp_dir))
+
+    sampler = threading.Thread(target=sample_disk, daemon=True)
+    sampler.start()
+
+    start_time = time.perf_counter()
+    # Import pdf2md from the code being measured, ahead of any installed copy
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [code_dir, os.environ.get("PYTHONPATH")])))
+    process = subprocess.Popen(
+        command, cwd=code_dir, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    stderr = process.stderr.read()
+    # wait4 gives the resource usage of this child and the render processes it waited for
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall_seconds = time.perf_counter() - start_time
+
+    stop_event.set()
+    sampler.join()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{stderr.decode('utf-8', 'replace')[-2000:]}")
+
+    with open(report_path, "r", encoding="utf-8") as report_file:
+        report = json.load(report_file)
+    document_seconds = report["timings"]["document"]["total_seconds"]
+
+    return {
+        "pages": scenario["pages"],
+        "wall_seconds": round(wall_seconds, 3),
+        "pages_per_second": round(scenario["pages"] / document_seconds, 2),
+        "first_page_seconds": round(report["timings"]["first_page"]["total_seconds"], 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+        "peak_temp_disk_mb": round(peak_disk / (1024 * 1024), 2),
+        "upload_mb": round(report["counters"].get("upload_bytes", 0) / (1024 * 1024), 2),
+        "ocr_requests": report["retries"]["requests"],
+    }
+
+
+def compare(results: Dict[str, Dict], baselines: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    Compare results with baselines.
+
+    Args:
+        results: Results by scenario name
+        baselines: Baseline results by scenario name
+        tolerance: Allowed relative regression, e.g. 0.2 for 20%
+
+    Returns:
+        Descriptions of the regressions found
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        for metric, (higher_is_better, min_change) in COMPARED_METRICS.items():
+            old, new = baseline.get(metric), result.get(metric)
+            if not old or new is None or abs(new - old) < min_change:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_result(label: str, result: Dict) -> None:
+    """
+    Print the results of a scenario on one line.
+
+    Args:
+        label: Name of the scenario, with the revision it ran when comparing revisions
+        result: Results of the scenario
+    """
+    print(
+        f"{label:<32} {result['pages_per_second']:>7.2f} pages/s  "
+        f"first page {result['first_page_seconds']:>6.2f} s  "
+        f"RSS {result['peak_rss_mb']:>7.1f} MB  temp disk {result['peak_temp_disk_mb']:>6.2f} MB  "
+        f"{result['ocr_requests']} requests"
+    )
+
+
+def main():
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the PDF to Markdown pipeline")
+    parser.add_argument(
+        "--scenario", action="append", choices=[scenario["name"] for scenario in SCENARIOS],
+        help="Scenario to run, may be repeated (default: all)"
+    )
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated OCR latency in seconds (default: 0.2)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Maximum extra OCR latency in seconds (default: 0.1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of OCR requests failing (default: 0)")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="Baselines file (default: benchmarks/baselines.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument(
+        "--against", metavar="REVISION",
+        help="Compare with a git revision run alongside on this machine, instead of the stored baselines"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed relative regression before failing (default: 0.25)"
+    )
+    parser.add_argument("--output", help="Path to write the results as JSON (optional)")
+    args = parser.parse_args()
+    if args.against and args.save_baseline:
+        parser.error("--against cannot be combined with --save-baseline")
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario["name"] in args.scenario]
+
+    server = StubOCRServer(port=0, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    backend_url = server.start()
+
+    results, revision_results = {}, {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="pdf2md_bench_") as work_dir:
+            revision_dir = os.path.join(work_dir, "revision")
+            if args.against:
+                export_revision(args.against, revision_dir)
+
+            # Run the revision right before this tree on every scenario, so both see the same machine load
+            for scenario in scenarios:
+                if args.against:
+                    result = run_scenario(scenario, os.path.join(work_dir, "before"), backend_url, revision_dir)
+                    revision_results[scenario["name"]] = result
+                    print_result(f"{scenario['name']} ({args.against})", result)
+                result = run_scenario(scenario, os.path.join(work_dir, "after"), backend_url)
+                results[scenario["name"]] = result
+                print_result(scenario["name"], result)
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.against:
+        regressions = compare(results, revision_results, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.against}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.against}")
+        return
+
+    baselines: Optional[Dict] = None
+    if os.path.exists(args.baselines):
+        with open(args.baselines, "r", encoding="utf-8") as baselines_file:
+            baselines = json.load(baselines_file)
+
+    if args.save_baseline:
+        # Keep the other scenarios' baselines only if they were recorded on this machine
+        if baselines and baselines.get("machine") != get_machine():
+            baselines = None
+        baselines = {
+            "machine": get_machine(),
+            "settings": {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate},
+            "scenarios": {**(baselines or {}).get("scenarios", {}), **results},
+        }
+        with open(args.baselines, "w", encoding="utf-8") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2)
+            baselines_file.write("\n")
+        print(f"Baselines saved to: {args.baselines}")
+        return
+
+    if baselines is None:
+        print("No baselines to compare with; run with --save-baseline to create them")
+        return
+
+    settings = {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate}
+    if baselines.get("settings") != settings:
+        print(f"Warning: baselines were recorded with different settings: {baselines.get('settings')}")
+
+    # Baselines from another machine say nothing about this change: report, but do not fail
+    regressions = compare(results, baselines["scenarios"], args.tolerance)
+    if baselines.get("machine") != get_machine():
+        print(f"\nWarning: baselines were recorded on a different machine: {baselines.get('machine')}")
+        for regression in regressions:
+            print(f"  {regression}")
+        print("Use --against REVISION to compare with a revision run on this machine, "
+              "or --save-baseline to record baselines here")
+        return
+
+    if regressions:
+        print("\nRegressions against the baselines:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions against the baselines")
+
+
+if __name__ == "__main__":
+    main()
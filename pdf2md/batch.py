@@ -0,0 +1,171 @@
+"""
+Module for converting many PDF files in one run.
+"""
+
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pdf2md.checkpoint import Checkpoint
+from pdf2md.pipeline import ConversionPipeline
+
+
+def collect_inputs(sources: List[str]) -> List[Tuple[str, str]]:
+    """
+    Expand directories, glob patterns and manifest files into PDF paths.
+
+    Directories are searched recursively for PDF files. A manifest is a text
+    file listing one PDF path per line (blank lines and lines starting with #
+    are ignored); relative paths are resolved against the manifest's directory.
+
+    Args:
+        sources: Directories, glob patterns, manifest files or PDF paths
+
+    Returns:
+        List of (PDF path, output path relative to the output directory) tuples
+    """
+    inputs = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            for pdf_path in sorted(Path(source).rglob("*")):
+                if pdf_path.is_file() and pdf_path.suffix.lower() == ".pdf":
+                    relative = pdf_path.relative_to(source).with_suffix(".md")
+                    inputs.append((str(pdf_path), str(relative)))
+        elif os.path.isfile(source) and not source.lower().endswith(".pdf"):
+            base_dir = os.path.dirname(os.path.abspath(source))
+            with open(source, "r", encoding="utf-8") as manifest_file:
+                for line in manifest_file:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    pdf_path = line if os.path.isabs(line) else os.path.join(base_dir, line)
+                    inputs.append((pdf_path, Path(pdf_path).with_suffix(".md").name))
+        elif os.path.isfile(source):
+            inputs.append((source, Path(source).with_suffix(".md").name))
+        else:
+            for pdf_path in sorted(glob.glob(source, recursive=True)):
+                if os.path.isfile(pdf_path):
+                    inputs.append((pdf_path, Path(pdf_path).with_suffix(".md").name))
+
+    # Make output names unique when different inputs share a file name
+    seen = set()
+    unique_inputs = []
+    for pdf_path, relative_output in inputs:
+        candidate = relative_output
+        counter = 1
+        while candidate in seen:
+            stem = Path(relative_output).with_suffix("")
+            candidate = f"{stem}_{counter}.md"
+            counter += 1
+        seen.add(candidate)
+        unique_inputs.append((pdf_path, candidate))
+
+    return unique_inputs
+
+
+class BatchConverter:
+    """
+    Class for converting many PDF files with shared workers.
+
+    Several documents are converted at once, each rendering pages in its own
+    thread, while all of them submit pages to the single OCR worker pool of
+    the pipeline's OCR processor. Pages from small documents therefore keep
+    the OCR workers busy while a large document is still being processed.
+    """
+
+    def __init__(self, pipeline: ConversionPipeline, max_documents: int = 4, resume: bool = False):
+        """
+        Initialize the batch converter.
+
+        Args:
+            pipeline: Pipeline used to convert every document
+            max_documents: Maximum number of documents converted at once
+            resume: Whether to resume documents from their checkpoints
+        """
+        if max_documents < 1:
+            raise ValueError("max_documents must be at least 1")
+
+        self.pipeline = pipeline
+        self.max_documents = max_documents
+        self.resume = resume
+
+    def convert_document(self, pdf_path: str, output_path: str) -> Dict:
+        """
+        Convert a single document of the batch.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_path: Path to the output Markdown file
+
+        Returns:
+            Report entry for the document
+        """
+        entry = {"input": pdf_path, "output": output_path, "status": "done", "pages": 0, "error": None}
+        start_time = time.monotonic()
+
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            checkpoint = Checkpoint(
+                output_path + ".checkpoint",
+                self.pipeline.document_cache_key(pdf_path),
+                self.pipeline.pdf_processor.get_page_count(pdf_path),
+                resume=self.resume,
+            )
+            entry["pages"] = self.pipeline.run(pdf_path, output_path, checkpoint=checkpoint)
+            checkpoint.remove()
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+
+        entry["seconds"] = round(time.monotonic() - start_time, 3)
+        return entry
+
+    def run(self, inputs: List[Tuple[str, str]], output_dir: str,
+            report_path: Optional[str] = None) -> Dict:
+        """
+        Convert a batch of documents and write a summary report.
+
+        Args:
+            inputs: List of (PDF path, output path relative to output_dir) tuples
+            output_dir: Directory receiving the Markdown files
+            report_path: Path to the JSON report (optional, default: pdf2md_report.json
+                         in output_dir)
+
+        Returns:
+            Summary report
+        """
+        from tqdm import tqdm
+
+        os.makedirs(output_dir, exist_ok=True)
+        start_time = time.monotonic()
+        entries = []
+
+        with ThreadPoolExecutor(max_workers=self.max_documents, thread_name_prefix="pdf2md-doc") as executor:
+            futures = [
+                executor.submit(self.convert_document, pdf_path, os.path.join(output_dir, relative_output))
+                for pdf_path, relative_output in inputs
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Converting documents"):
+                entries.append(future.result())
+
+        entries.sort(key=lambda entry: entry["input"])
+        report = {
+            "documents": len(entries),
+            "succeeded": sum(1 for entry in entries if entry["status"] == "done"),
+            "failed": sum(1 for entry in entries if entry["status"] == "failed"),
+            "pages": sum(entry["pages"] for entry in entries),
+            "seconds": round(time.monotonic() - start_time, 3),
+            "metrics": self.pipeline.get_report(),
+            "results": entries,
+        }
+
+        report_path = report_path or os.path.join(output_dir, "pdf2md_report.json")
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2, ensure_ascii=False)
+
+        return report
@@ -0,0 +1,465 @@
+"""
+Module for estimating the token usage and cost of OCR and enforcing budgets.
+"""
+
+import io
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Tokens billed for an image whose sides are both at most SMALL_IMAGE_SIDE pixels
+IMAGE_TOKENS = 258
+SMALL_IMAGE_SIDE = 384
+
+# Larger images are split into tiles of this many pixels square, each billed IMAGE_TOKENS
+IMAGE_TILE_SIDE = 768
+
+# Output tokens per page assumed until the usage history has data for the model
+DEFAULT_OUTPUT_TOKENS_PER_PAGE = 600
+
+# Default prices in USD per million tokens (Gemini 2.5 Flash, non-thinking output)
+DEFAULT_INPUT_PRICE = 0.15
+DEFAULT_OUTPUT_PRICE = 0.60
+
+# Default location of the usage history shared by all runs of the user
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf2md", "usage.sqlite")
+
+# Resolutions tried, in order, when lowering the DPI to fit a budget
+_FALLBACK_DPIS = (200, 150, 100, 72)
+
+
+class BudgetExceededError(RuntimeError):
+    """
+    Error raised when a job would exceed, or has exhausted, its token or cost budget.
+    """
+
+
+def image_tokens(width: int, height: int) -> int:
+    """
+    Estimate the input tokens billed for an image.
+
+    Args:
+        width: Width of the image in pixels
+        height: Height of the image in pixels
+
+    Returns:
+        Number of tokens
+    """
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return IMAGE_TOKENS
+    return IMAGE_TOKENS * math.ceil(width / IMAGE_TILE_SIDE) * math.ceil(height / IMAGE_TILE_SIDE)
+
+
+def text_tokens(text: str) -> int:
+    """
+    Estimate the tokens of a text (about four characters per token).
+
+    Args:
+        text: Text
+
+    Returns:
+        Number of tokens
+    """
+    return len(text) // 4 + 1
+
+
+def image_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read the dimensions of an encoded image from its header.
+
+    Args:
+        image_bytes: Encoded image (PNG, JPEG or WebP)
+
+    Returns:
+        Tuple of the width and height in pixels, or None if they cannot be read
+    """
+    try:
+        from PIL import Image
+
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def estimate_request_tokens(prompt_parts: Iterable[str], image_sizes: Iterable[Optional[Tuple[int, int]]]) -> int:
+    """
+    Estimate the input tokens of an OCR request.
+
+    Args:
+        prompt_parts: Prompt and label strings of the request
+        image_sizes: Dimensions of each image of the request (None if unknown, counted as one tile)
+
+    Returns:
+        Number of tokens
+    """
+    tokens = sum(text_tokens(part) for part in prompt_parts)
+    for size in image_sizes:
+        tokens += image_tokens(*size) if size else IMAGE_TOKENS
+    return tokens
+
+
+class UsageHistory:
+    """
+    Persistent record of the tokens used by OCR requests, backed by SQLite.
+
+    Every request adds a row with the tokens the API reported and the
+    tokens the estimator predicted for it. The rows calibrate future
+    estimates per model and sum up the spending within a time window.
+    Several processes can share the same file.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the usage history.
+
+        Args:
+            db_path: Path to the SQLite database file (created if missing)
+        """
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+
+        # A single connection shared by all OCR worker threads, guarded by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "time REAL NOT NULL, model TEXT NOT NULL, pages REAL NOT NULL, "
+                "estimated_input_tokens INTEGER NOT NULL, input_tokens INTEGER NOT NULL, "
+                "output_tokens INTEGER NOT NULL, cost REAL NOT NULL, images INTEGER NOT NULL DEFAULT 0)"
+            )
+
+            # Histories written before images were counted separately lack the column
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(usage)")]
+            if "images" not in columns:
+                self._conn.execute("ALTER TABLE usage ADD COLUMN images INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS usage_model ON usage (model, time)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS usage_time ON usage (time)")
+
+    def record(self, model: str, pages: float, images: int, estimated_input_tokens: int, input_tokens: int,
+               output_tokens: int, cost: float) -> None:
+        """
+        Record the usage of a request.
+
+        Args:
+            model: Name of the OCR model
+            pages: Number of source pages in the request (a lone tile counts as a fraction of its page)
+            images: Number of images in the request (tiled pages send several)
+            estimated_input_tokens: Input tokens predicted from the prompt and image sizes
+            input_tokens: Input tokens reported by the API
+            output_tokens: Output tokens reported by the API
+            cost: Cost of the request in USD
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO usage (time, model, pages, images, estimated_input_tokens, input_tokens, output_tokens, cost) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), model, pages, images, estimated_input_tokens, input_tokens, output_tokens, cost),
+            )
+
+    def get_model_stats(self, model: str, limit: int = 1000) -> Optional[Dict]:
+        """
+        Summarize the recent requests made to a model.
+
+        Args:
+            model: Name of the OCR model
+            limit: Number of most recent requests considered
+
+        Returns:
+            Dictionary with the number of "pages", the "input_ratio" of reported
+            to estimated input tokens and the "output_tokens_per_page", or None
+            if the model has no history
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT SUM(pages), SUM(estimated_input_tokens), SUM(input_tokens), SUM(output_tokens) "
+                "FROM (SELECT * FROM usage WHERE model = ? ORDER BY time DESC LIMIT ?)",
+                (model, limit),
+            ).fetchone()
+
+        pages, estimated_input, input_tokens, output_tokens = row
+        if not pages:
+            return None
+        return {
+            "pages": pages,
+            "input_ratio": input_tokens / estimated_input if estimated_input else 1.0,
+            "output_tokens_per_page": output_tokens / pages,
+        }
+
+    def get_spent(self, since: float) -> Dict[str, float]:
+        """
+        Sum up the usage of all models since a point in time.
+
+        Args:
+            since: Start of the window (time.time() value)
+
+        Returns:
+            Dictionary with the "tokens" and "cost" spent
+        """
+        with self._lock:
+            tokens, cost = self._conn.execute(
+                "SELECT SUM(input_tokens + output_tokens), SUM(cost) FROM usage WHERE time >= ?", (since,)
+            ).fetchone()
+        return {"tokens": tokens or 0, "cost": cost or 0.0}
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+class TokenBudget:
+    """
+    Spending limit of a job, checked before every OCR request.
+
+    Requests already in flight when the limit is reached still complete, so
+    a job can overshoot its budget by at most the requests in flight.
+    """
+
+    def __init__(self, max_cost: Optional[float] = None, max_tokens: Optional[int] = None):
+        """
+        Initialize the budget.
+
+        Args:
+            max_cost: Maximum cost in USD (optional, default: unlimited)
+            max_tokens: Maximum number of input and output tokens (optional, default: unlimited)
+        """
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.cost = 0.0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        """
+        Make sure the budget is not exhausted before sending a request.
+
+        Raises:
+            BudgetExceededError: If the cost or token limit has been reached
+        """
+        with self._lock:
+            if self.max_cost is not None and self.cost >= self.max_cost:
+                raise BudgetExceededError(f"Cost budget of ${self.max_cost:.4f} exhausted (spent ${self.cost:.4f})")
+            if self.max_tokens is not None and self.tokens >= self.max_tokens:
+                raise BudgetExceededError(f"Token budget of {self.max_tokens} exhausted (used {self.tokens})")
+
+    def add(self, tokens: int, cost: float) -> None:
+        """
+        Account for a completed request.
+
+        Args:
+            tokens: Input and output tokens of the request
+            cost: Cost of the request in USD
+        """
+        with self._lock:
+            self.tokens += tokens
+            self.cost += cost
+
+
+class CostEstimate:
+    """
+    Predicted token usage and cost of converting one or more documents.
+    """
+
+    def __init__(self, pages: int = 0, ocr_pages: int = 0, images: int = 0, requests: int = 0,
+                 input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0):
+        """
+        Initialize the estimate.
+
+        Args:
+            pages: Number of pages converted
+            ocr_pages: Number of pages sent to OCR (the others use their text layer)
+            images: Number of images sent to OCR (tiled pages send several)
+            requests: Number of OCR requests
+            input_tokens: Predicted input tokens
+            output_tokens: Predicted output tokens
+            cost: Predicted cost in USD
+        """
+        self.pages = pages
+        self.ocr_pages = ocr_pages
+        self.images = images
+        self.requests = requests
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cost = cost
+
+    @property
+    def tokens(self) -> int:
+        """
+        Predicted input and output tokens.
+        """
+        return self.input_tokens + self.output_tokens
+
+    def to_dict(self) -> Dict:
+        """
+        Get the estimate as a dictionary, for reports.
+
+        Returns:
+            Dictionary of the estimate's fields
+        """
+        return {
+            "pages": self.pages, "ocr_pages": self.ocr_pages, "images": self.images,
+            "requests": self.requests, "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens, "cost": round(self.cost, 6),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.pages} pages ({self.ocr_pages} OCR'd in {self.requests} requests), "
+            f"~{self.input_tokens} input + {self.output_tokens} output tokens, ~${self.cost:.4f}"
+        )
+
+
+class CostEstimator:
+    """
+    Pre-flight estimator of the token usage and cost of OCR.
+
+    Input tokens are predicted from the size every page would be rendered
+    at, without rendering it, and corrected by the ratio of reported to
+    predicted tokens in the usage history. Output tokens per page come from
+    the history, or a default until the model has history.
+    """
+
+    def __init__(self, input_price: float = DEFAULT_INPUT_PRICE, output_price: float = DEFAULT_OUTPUT_PRICE,
+                 history: Optional[UsageHistory] = None):
+        """
+        Initialize the estimator.
+
+        Args:
+            input_price: Price of a million input tokens in USD
+            output_price: Price of a million output tokens in USD
+            history: Usage history calibrating the estimates (optional)
+        """
+        self.input_price = input_price
+        self.output_price = output_price
+        self.history = history
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        """
+        Compute the cost of a number of tokens.
+
+        Args:
+            input_tokens: Input tokens
+            output_tokens: Output tokens
+
+        Returns:
+            Cost in USD
+        """
+        return (input_tokens * self.input_price + output_tokens * self.output_price) / 1_000_000
+
+    def estimate(self, pdf_processor, ocr_processor, documents: Sequence[Tuple[str, Optional[Sequence[int]]]]) -> CostEstimate:
+        """
+        Estimate the usage of converting documents with the current settings.
+
+        Args:
+            pdf_processor: PDF processor whose render settings are used
+            ocr_processor: OCR processor whose model, prompt and batch size are used
+            documents: List of (PDF path, zero-based pages or None for all pages) tuples
+
+        Returns:
+            Cost estimate
+        """
+        from pdf2md.ocr_processor import BATCH_OCR_PROMPT, OCR_PROMPT
+
+        estimate = CostEstimate()
+        page_images: List[int] = []
+        for pdf_path, pages in documents:
+            for sizes in pdf_processor.get_render_sizes(pdf_path, pages):
+                estimate.pages += 1
+                if not sizes:
+                    continue
+                estimate.ocr_pages += 1
+                estimate.images += len(sizes)
+                page_images.append(len(sizes))
+                estimate.input_tokens += sum(image_tokens(width, height) for width, height in sizes)
+
+        if not ocr_processor.backend.billed:
+            estimate.requests = estimate.images
+            estimate.input_tokens = 0
+            return estimate
+
+        # Prompt tokens: batches share one prompt and label every image, tiles of unbatched pages are sent one by one
+        if ocr_processor.batch_size > 1:
+            estimate.requests = math.ceil(estimate.ocr_pages / ocr_processor.batch_size)
+            estimate.input_tokens += estimate.requests * text_tokens(BATCH_OCR_PROMPT)
+            estimate.input_tokens += estimate.images * text_tokens("Page 100:")
+        else:
+            estimate.requests = estimate.images
+            estimate.input_tokens += estimate.requests * text_tokens(OCR_PROMPT)
+
+        stats = self.history.get_model_stats(ocr_processor.model_name) if self.history else None
+        output_per_page = DEFAULT_OUTPUT_TOKENS_PER_PAGE
+        if stats:
+            estimate.input_tokens = int(estimate.input_tokens * stats["input_ratio"])
+            output_per_page = stats["output_tokens_per_page"]
+
+        estimate.output_tokens = int(estimate.ocr_pages * output_per_page)
+        estimate.cost = self.cost(estimate.input_tokens, estimate.output_tokens)
+        return estimate
+
+    @staticmethod
+    def _fits(estimate: CostEstimate, max_cost: Optional[float], max_tokens: Optional[int]) -> bool:
+        """
+        Check whether an estimate is within limits.
+        """
+        return (max_cost is None or estimate.cost <= max_cost) and (max_tokens is None or estimate.tokens <= max_tokens)
+
+    def plan(self, pdf_processor, ocr_processor, documents: Sequence[Tuple[str, Optional[Sequence[int]]]],
+             max_cost: Optional[float] = None, max_tokens: Optional[int] = None) -> Tuple[CostEstimate, List[str]]:
+        """
+        Adjust the render settings until the estimated usage fits the budget.
+
+        Cheaper settings are tried in order: extracting the text layer of
+        text-native pages instead of OCR'ing them, then lowering the render
+        resolution step by step (down to the processor's minimum DPI). The
+        PDF processor is modified in place.
+
+        Args:
+            pdf_processor: PDF processor whose settings are adjusted
+            ocr_processor: OCR processor used for the conversion
+            documents: List of (PDF path, zero-based pages or None for all pages) tuples
+            max_cost: Maximum cost in USD (optional)
+            max_tokens: Maximum number of tokens (optional)
+
+        Returns:
+            Tuple of the estimate with the final settings and a description of each adjustment made
+
+        Raises:
+            BudgetExceededError: If even the cheapest settings exceed the budget
+        """
+        estimate = self.estimate(pdf_processor, ocr_processor, documents)
+        adjustments = []
+
+        if not self._fits(estimate, max_cost, max_tokens) and not pdf_processor.extract_text:
+            pdf_processor.extract_text = True
+            adjustments.append("using the text layer of text-native pages instead of OCR")
+            estimate = self.estimate(pdf_processor, ocr_processor, documents)
+
+        for dpi in _FALLBACK_DPIS:
+            if self._fits(estimate, max_cost, max_tokens):
+                break
+            if dpi >= pdf_processor.dpi or dpi < pdf_processor.min_dpi:
+                continue
+            pdf_processor.dpi = dpi
+            adjustments.append(f"lowering the resolution to {dpi} DPI")
+            estimate = self.estimate(pdf_processor, ocr_processor, documents)
+
+        if not self._fits(estimate, max_cost, max_tokens):
+            limits = []
+            if max_cost is not None:
+                limits.append(f"${max_cost:.4f}")
+            if max_tokens is not None:
+                limits.append(f"{max_tokens} tokens")
+            raise BudgetExceededError(
+                f"Estimated usage ({estimate}) exceeds the budget of {' and '.join(limits)} "
+                f"even at {pdf_processor.dpi} DPI"
+            )
+        return estimate, adjustments
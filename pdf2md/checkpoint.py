@@ -0,0 +1,261 @@
+"""
+Module for checkpointing the progress of a document conversion.
+"""
+
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, TextIO
+
+# Version of the manifest layout, bumped on incompatible changes
+MANIFEST_VERSION = 1
+
+
+def atomic_write(path: str, data: str) -> None:
+    """
+    Write a text file atomically.
+
+    The data is written to a temporary file in the same directory, which is
+    then renamed over the target, so readers never see a partial file.
+
+    Args:
+        path: Path to the file to write
+        data: Text content
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class Checkpoint:
+    """
+    Per-document checkpoint of page conversion results.
+
+    The checkpoint is a directory holding a small JSON manifest with the
+    status of every page, and one text file per finished page, written
+    atomically as pages finish. Page statuses are appended to a log next to
+    the manifest rather than rewriting it for every page, and folded into the
+    manifest when the checkpoint is compacted, so a crashed or failed run can
+    be resumed by converting only the pages that are not done yet.
+    """
+
+    def __init__(self, directory: str, document_key: str, num_pages: int, resume: bool = False):
+        """
+        Initialize the checkpoint.
+
+        Args:
+            directory: Directory holding the checkpoint (created if missing)
+            document_key: Key identifying the document and conversion settings
+            num_pages: Number of pages in the document
+            resume: Whether to keep the results of a previous run of the same document
+        """
+        self.directory = directory
+        self.document_key = document_key
+        self.num_pages = num_pages
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.log_path = os.path.join(directory, "pages.jsonl")
+        self.pages: Dict[int, Dict] = {}
+        self._log_file: Optional[TextIO] = None
+
+        if resume and self._load():
+            # Fold the previous run's log into the manifest so this run starts a new one
+            self.compact()
+            return
+
+        # Start over, discarding anything left by a previous run
+        self._clear()
+        os.makedirs(directory, exist_ok=True)
+        self._save()
+
+    def _load(self) -> bool:
+        """
+        Load the manifest of a previous run.
+
+        Returns:
+            True if a manifest for the same document and settings was loaded
+        """
+        if not os.path.exists(self.manifest_path):
+            return False
+
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.manifest_path}: {e}")
+            return False
+
+        if (manifest.get("version") != MANIFEST_VERSION
+                or manifest.get("document_key") != self.document_key
+                or manifest.get("num_pages") != self.num_pages):
+            print("Checkpoint belongs to a different document or settings, starting over")
+            return False
+
+        self.pages = {int(page_num): entry for page_num, entry in manifest["pages"].items()}
+
+        # Replay the statuses logged since the manifest was written
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as log_file:
+                for line in log_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last record of a crashed run may be cut short
+                        continue
+                    self.pages[int(record.pop("page"))] = record
+        return True
+
+    def _save(self) -> None:
+        """
+        Write the manifest atomically.
+        """
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "document_key": self.document_key,
+            "num_pages": self.num_pages,
+            "pages": {str(page_num): entry for page_num, entry in sorted(self.pages.items())},
+        }
+        atomic_write(self.manifest_path, json.dumps(manifest, indent=2))
+
+    def _log(self, page_num: int) -> None:
+        """
+        Append the status of a page to the log.
+
+        The record is flushed to the operating system but not synced, so it
+        survives a crash of the process; a page whose record is lost is
+        simply converted again on resume.
+
+        Args:
+            page_num: Zero-based page number
+        """
+        if self._log_file is None:
+            self._log_file = open(self.log_path, "a", encoding="utf-8")
+        self._log_file.write(json.dumps({"page": page_num, **self.pages[page_num]}) + "\n")
+        self._log_file.flush()
+
+    def _close_log(self) -> None:
+        """
+        Close the log file if it is open.
+        """
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def compact(self) -> None:
+        """
+        Fold the logged page statuses into the manifest and start a new log.
+        """
+        self._close_log()
+        self._save()
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def _text_path(self, page_num: int) -> str:
+        """
+        Get the path of the text file of a page.
+
+        Args:
+            page_num: Zero-based page number
+
+        Returns:
+            Path to the page's text file
+        """
+        return os.path.join(self.directory, f"page_{page_num + 1}.txt")
+
+    def is_done(self, page_num: int) -> bool:
+        """
+        Check whether a page has been converted.
+
+        Args:
+            page_num: Zero-based page number
+
+        Returns:
+            True if the page's text is available
+        """
+        return self.pages.get(page_num, {}).get("status") == "done"
+
+    def get_text(self, page_num: int) -> Optional[str]:
+        """
+        Get the text of a converted page.
+
+        Args:
+            page_num: Zero-based page number
+
+        Returns:
+            Text of the page, or None if it has not been converted
+        """
+        if not self.is_done(page_num):
+            return None
+
+        with open(self._text_path(page_num), "r", encoding="utf-8") as text_file:
+            return text_file.read()
+
+    def record_success(self, page_num: int, text: str) -> None:
+        """
+        Record the text of a converted page.
+
+        Args:
+            page_num: Zero-based page number
+            text: Text of the page
+        """
+        atomic_write(self._text_path(page_num), text)
+        attempts = self.pages.get(page_num, {}).get("attempts", 0) + 1
+        self.pages[page_num] = {"status": "done", "attempts": attempts}
+        self._log(page_num)
+
+    def record_failure(self, page_num: int, error: Exception) -> None:
+        """
+        Record a page that could not be converted.
+
+        Args:
+            page_num: Zero-based page number
+            error: Error raised while converting the page
+        """
+        attempts = self.pages.get(page_num, {}).get("attempts", 0) + 1
+        self.pages[page_num] = {"status": "failed", "attempts": attempts, "error": str(error)}
+        self._log(page_num)
+
+    @property
+    def failed_pages(self) -> List[int]:
+        """
+        Zero-based numbers of the pages that failed, in page order.
+        """
+        return sorted(page_num for page_num, entry in self.pages.items() if entry["status"] == "failed")
+
+    @property
+    def missing_pages(self) -> List[int]:
+        """
+        Zero-based numbers of the pages that are not converted yet, in page order.
+        """
+        return [page_num for page_num in range(self.num_pages) if not self.is_done(page_num)]
+
+    def _clear(self) -> None:
+        """
+        Delete the manifest, log and page files written by this module.
+
+        Only files the checkpoint owns are removed, so a directory passed in
+        by the user is never wiped wholesale.
+        """
+        self._close_log()
+        if not os.path.isdir(self.directory):
+            return
+
+        for name in os.listdir(self.directory):
+            if name in ("manifest.json", "pages.jsonl") or (name.startswith("page_") and name.endswith(".txt")):
+                os.remove(os.path.join(self.directory, name))
+
+    def remove(self) -> None:
+        """
+        Delete the checkpoint once it is no longer needed.
+        """
+        self._clear()
+        if os.path.isdir(self.directory) and not os.listdir(self.directory):
+            os.rmdir(self.directory)
@@ -6,21 +6,460 @@ import argparse
 import os
 import sys
 import tempfile
+import time
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 
 from pdf2md.pdf_processor import PDFProcessor
 from pdf2md.ocr_processor import OCRProcessor
+from pdf2md.batch import BatchConverter, collect_inputs
+from pdf2md.budget import (
+    DEFAULT_HISTORY_PATH, DEFAULT_INPUT_PRICE, DEFAULT_OUTPUT_PRICE, CostEstimator,
+    TokenBudget, UsageHistory,
+)
+from pdf2md.checkpoint import Checkpoint
+from pdf2md.dedupe import PageDeduplicator
 from pdf2md.markdown_generator import MarkdownGenerator
+from pdf2md.metrics import Metrics, write_report
+from pdf2md.ocr_backends import DEFAULT_STUB_URL, create_backend
+from pdf2md.ocr_cache import OCRCache
+from pdf2md.pipeline import ConversionPipeline
+from pdf2md.retry import Retrier, RetryPolicy
 
 
-def main():
+def parse_page_ranges(spec: str, num_pages: int) -> List[int]:
+    """
+    Parse a page range specification such as "1-3,7,10-".
+
+    Pages are one-based and ranges inclusive; open ranges ("-3", "10-")
+    extend to the first or last page of the document.
+
+    Args:
+        spec: Comma-separated page numbers and ranges
+        num_pages: Number of pages in the document
+
+    Returns:
+        Sorted zero-based page numbers
+
+    Raises:
+        ValueError: If the specification is malformed, has a range whose start is greater than
+                    its end or refers to pages outside the document
+    """
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        start, dash, end = part.partition("-")
+        try:
+            if not part:
+                raise ValueError
+            first = int(start) if start else 1
+            last = (int(end) if end else num_pages) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}") from None
+
+        if not 1 <= first <= num_pages:
+            raise ValueError(f"Page range {part!r} is outside the document (pages 1-{num_pages})")
+        if first > last:
+            raise ValueError(f"Invalid page range {part!r}: start is greater than end")
+        if last > num_pages:
+            raise ValueError(f"Page range {part!r} is outside the document (pages 1-{num_pages})")
+        pages.update(range(first - 1, last))
+    return sorted(pages)
+
+
+def add_conversion_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the options shared by single-file and batch conversion.
+
+    Args:
+        parser: Parser to add the options to
+    """
+    parser.add_argument(
+        "--dpi", type=int, default=300, help="DPI for image conversion (default: 300, the maximum with --adaptive)"
+    )
+    parser.add_argument(
+        "--format", choices=["png", "jpg", "webp", "auto"], default="png",
+        help="Image format for conversion; auto picks PNG or JPEG per page (default: png)"
+    )
+    parser.add_argument(
+        "--adaptive", action="store_true",
+        help="Pick the DPI per page from its size and font sizes, and render pages without color in grayscale"
+    )
+    parser.add_argument(
+        "--max-pixels", type=int, default=4_000_000,
+        help="Pixel budget of a rendered page with --adaptive (default: 4000000)"
+    )
+    parser.add_argument(
+        "--quality", type=int, default=85, help="Quality of JPEG and WebP images, 1-100 (default: 85)"
+    )
+    parser.add_argument(
+        "--render-workers", type=int, default=1,
+        help="Number of processes rasterizing pages in parallel (default: 1)"
+    )
+    parser.add_argument(
+        "--markdown-workers", type=int, default=1,
+        help="Number of processes generating Markdown in parallel, for very large documents (default: 1)"
+    )
+    parser.add_argument(
+        "--reconcile-breaks", action="store_true",
+        help="Fix the start of each page using the end of the page before it, for headings, sentences "
+             "and list items continuing across a page break"
+    )
+    parser.add_argument(
+        "--crop", action="store_true",
+        help="Render only the content of each page, leaving out blank margins"
+    )
+    parser.add_argument(
+        "--tile-ratio", type=float,
+        help="Split pages whose content is taller than this multiple of its width into tiles "
+             "that are OCR'd separately (optional, default: no tiling)"
+    )
+    parser.add_argument(
+        "--backend", choices=["gemini", "tesseract", "stub"], default="gemini",
+        help="OCR engine: the Gemini API, local Tesseract, or the stub OCR server (default: gemini)"
+    )
+    parser.add_argument(
+        "--api-key", help="Gemini API key (optional, will use GEMINI_API_KEY environment variable if not provided)"
+    )
+    parser.add_argument(
+        "--backend-url", default=DEFAULT_STUB_URL,
+        help=f"URL of the stub OCR server with --backend stub (default: {DEFAULT_STUB_URL})"
+    )
+    parser.add_argument(
+        "--tesseract-lang", default="eng", help="Tesseract language code(s) with --backend tesseract (default: eng)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of pages to OCR concurrently (default: 1)"
+    )
+    parser.add_argument(
+        "--rpm", type=float, help="Maximum number of OCR API requests per minute (optional, default: unlimited)"
+    )
+    parser.add_argument(
+        "--max-retries", type=int, default=3,
+        help="Maximum number of attempts per OCR request on rate limits, server errors and timeouts (default: 3)"
+    )
+    parser.add_argument(
+        "--retry-delay", type=float, default=2.0,
+        help="Upper bound of the first retry delay in seconds, doubled on every retry (default: 2)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1,
+        help="Number of page images sent in one OCR request (default: 1)"
+    )
+    parser.add_argument(
+        "--text-layer", action="store_true",
+        help="Extract text locally from pages with a usable text layer and only OCR scanned pages"
+    )
+    parser.add_argument(
+        "--in-memory", action="store_true",
+        help="Keep rendered page images in memory instead of writing them to the temp directory"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Resume an interrupted or partially failed run, converting only the missing pages"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Mark each page of the output with a content hash and, when the output already exists, "
+             "only convert the pages that were added or changed since"
+    )
+    parser.add_argument(
+        "--cache", help="Path to a SQLite file caching OCR results across runs (optional, default: no cache)"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=512, help="Maximum size of the OCR cache in MB (default: 512)"
+    )
+    parser.add_argument(
+        "--dedupe", action="store_true",
+        help="Skip blank pages and reuse the OCR text of pages whose images are identical to those of a page "
+             "already OCR'd in the run (a batch counts as one run)"
+    )
+    parser.add_argument(
+        "--dedupe-threshold", type=float,
+        help="Also reuse the text of near-identical pages with --dedupe: pages whose perceptual hashes are "
+             "at least this similar (0-1, e.g. 0.9) and that match pixel for pixel at full resolution, apart "
+             "from noise (optional, default: identical pages only)"
+    )
+    parser.add_argument(
+        "--max-cost", type=float,
+        help="Maximum OCR cost of the run in USD; the text layer is used and the resolution lowered "
+             "if the estimate exceeds it (optional, default: unlimited)"
+    )
+    parser.add_argument(
+        "--max-tokens", type=int, help="Maximum number of OCR tokens of the run (optional, default: unlimited)"
+    )
+    parser.add_argument(
+        "--window-cost", type=float,
+        help="Maximum OCR cost in USD of all runs within --window-hours, from the usage history "
+             "(optional, default: unlimited)"
+    )
+    parser.add_argument(
+        "--window-hours", type=float, default=24, help="Length of the --window-cost window in hours (default: 24)"
+    )
+    parser.add_argument(
+        "--input-price", type=float, default=DEFAULT_INPUT_PRICE,
+        help=f"Price of a million input tokens in USD (default: {DEFAULT_INPUT_PRICE})"
+    )
+    parser.add_argument(
+        "--output-price", type=float, default=DEFAULT_OUTPUT_PRICE,
+        help=f"Price of a million output tokens in USD (default: {DEFAULT_OUTPUT_PRICE})"
+    )
+    parser.add_argument(
+        "--usage-history", default=DEFAULT_HISTORY_PATH,
+        help=f"Path to the SQLite file recording the token usage of every run (default: {DEFAULT_HISTORY_PATH})"
+    )
+    parser.add_argument(
+        "--estimate-only", action="store_true", help="Print the estimated OCR usage and cost, then exit"
+    )
+
+
+def build_pipeline(args: argparse.Namespace, show_progress: bool = True) -> ConversionPipeline:
+    """
+    Build the conversion pipeline from parsed command-line options.
+
+    Args:
+        args: Parsed options (see add_conversion_arguments)
+        show_progress: Whether the pipeline shows a per-page progress bar
+
+    Returns:
+        Conversion pipeline
+    """
+    # Every stage records into the same metrics, reported by the pipeline
+    metrics = Metrics()
+    pdf_processor = PDFProcessor(
+        dpi=args.dpi,
+        image_format=args.format,
+        extract_text=args.text_layer,
+        adaptive=args.adaptive,
+        max_pixels=args.max_pixels,
+        quality=args.quality,
+        render_workers=args.render_workers,
+        crop=args.crop,
+        tile_ratio=args.tile_ratio,
+        metrics=metrics,
+    )
+    cache = OCRCache(args.cache, max_size_bytes=args.cache_size * 1024 * 1024) if args.cache else None
+    backend = create_backend(args.backend, api_key=args.api_key, url=args.backend_url, lang=args.tesseract_lang)
+    retrier = Retrier(RetryPolicy(max_attempts=args.max_retries, base_delay=args.retry_delay))
+    estimator = CostEstimator(args.input_price, args.output_price, history=UsageHistory(args.usage_history))
+    ocr_processor = OCRProcessor(
+        max_workers=args.workers, requests_per_minute=args.rpm, cache=cache,
+        batch_size=args.batch_size, backend=backend, retrier=retrier, metrics=metrics, estimator=estimator,
+    )
+    markdown_generator = MarkdownGenerator(
+        metrics=metrics, workers=args.markdown_workers, reconcile=args.reconcile_breaks
+    )
+    deduplicator = PageDeduplicator(threshold=args.dedupe_threshold, metrics=metrics) if args.dedupe else None
+    return ConversionPipeline(
+        pdf_processor, ocr_processor, markdown_generator,
+        in_memory=args.in_memory, show_progress=show_progress, incremental=args.incremental, metrics=metrics,
+        deduplicator=deduplicator,
+    )
+
+
+def apply_budget(args: argparse.Namespace, pipeline: ConversionPipeline,
+                 documents: Sequence[Tuple[str, Optional[Sequence[int]]]]) -> None:
+    """
+    Estimate the OCR usage of a run and fit it to the budget before converting.
+
+    The run's budget is the smaller of --max-cost and what is left of
+    --window-cost after the spending recorded in the usage history. If the
+    estimate exceeds it, the render settings are downgraded (see
+    CostEstimator.plan), and the OCR processor stops sending requests once
+    the budget is spent.
+
+    Args:
+        args: Parsed options (see add_conversion_arguments)
+        pipeline: Conversion pipeline of the run
+        documents: List of (PDF path, zero-based pages or None for all pages) tuples
+
+    Raises:
+        BudgetExceededError: If the run cannot fit the budget
+    """
+    if args.max_cost is None and args.max_tokens is None and args.window_cost is None and not args.estimate_only:
+        return
+
+    estimator = pipeline.ocr_processor.estimator
+    max_cost = args.max_cost
+    if args.window_cost is not None:
+        spent = estimator.history.get_spent(time.time() - args.window_hours * 3600)["cost"]
+        print(f"Spent ${spent:.4f} of ${args.window_cost:.4f} in the last {args.window_hours:g} hours")
+        remaining = max(args.window_cost - spent, 0.0)
+        max_cost = remaining if max_cost is None else min(max_cost, remaining)
+
+    estimate, adjustments = estimator.plan(
+        pipeline.pdf_processor, pipeline.ocr_processor, documents, max_cost=max_cost, max_tokens=args.max_tokens
+    )
+    for adjustment in adjustments:
+        print(f"Over budget: {adjustment}")
+    print(f"Estimated OCR usage: {estimate}")
+
+    if max_cost is not None or args.max_tokens is not None:
+        pipeline.ocr_processor.budget = TokenBudget(max_cost=max_cost, max_tokens=args.max_tokens)
+
+
+def print_usage_stats(pipeline: ConversionPipeline) -> None:
+    """
+    Print the OCR tokens used and their cost, if the backend reported any.
+
+    Args:
+        pipeline: Conversion pipeline of the run
+    """
+    metrics = pipeline.ocr_processor.metrics
+    input_tokens = int(metrics.get_counter("input_tokens"))
+    output_tokens = int(metrics.get_counter("output_tokens"))
+    if input_tokens or output_tokens:
+        print(f"OCR usage: {input_tokens} input + {output_tokens} output tokens, ${metrics.get_counter('cost'):.4f}")
+
+
+def close_pipeline(pipeline: ConversionPipeline) -> None:
+    """
+    Shut down the worker pools of every stage and close the OCR backend's connections.
+
+    Args:
+        pipeline: Conversion pipeline of the run
+    """
+    pipeline.pdf_processor.close()
+    pipeline.markdown_generator.close()
+    pipeline.ocr_processor.close()
+
+
+def print_dedupe_stats(pipeline: ConversionPipeline) -> None:
+    """
+    Print the number of pages skipped by deduplication, if it is enabled.
+
+    Args:
+        pipeline: Conversion pipeline of the run
+    """
+    if pipeline.deduplicator is not None:
+        report = pipeline.deduplicator.get_report()
+        print(
+            f"Dedupe: {report['blank_pages']} blank pages skipped, "
+            f"{report['duplicate_pages']} duplicate pages reused without OCR"
+        )
+
+
+def print_cache_stats(cache: Optional[OCRCache]) -> None:
+    """
+    Print the statistics of the OCR cache, if one is used.
+
+    Args:
+        cache: OCR cache (optional)
+    """
+    if cache:
+        stats = cache.get_stats()
+        print(
+            f"OCR cache: {stats['hits']} page hits, {stats['misses']} page misses, "
+            f"{stats['document_hits']} document hits, {stats['evictions']} evictions"
+        )
+
+
+def print_retry_stats(retrier: Retrier) -> None:
+    """
+    Print the retry counters, if any request had to be retried.
+
+    Args:
+        retrier: Retrier of the OCR processor
+    """
+    stats = retrier.get_stats()
+    if stats["retries"] or stats["fatal_errors"] or stats["circuit_opens"]:
+        print(
+            f"OCR requests: {stats['requests']} sent, {stats['retries']} retries "
+            f"({stats['backoff_seconds']:.1f} s backoff), {stats['fatal_errors']} fatal errors, "
+            f"circuit breaker opened {stats['circuit_opens']} times "
+            f"({stats['circuit_wait_seconds']:.1f} s waiting)"
+        )
+
+
+def batch_main(argv: List[str]):
+    """
+    Entry point of the batch subcommand.
+
+    Args:
+        argv: Command-line arguments following "batch"
+    """
+    parser = argparse.ArgumentParser(
+        prog="pdf2md.cli batch",
+        description="Convert many PDF files, sharing one pool of OCR workers across documents"
+    )
+    parser.add_argument(
+        "sources", nargs="+",
+        help="Directories (searched recursively), glob patterns, manifest files (one PDF path per line) or PDF files"
+    )
+    parser.add_argument(
+        "--output-dir", "-o", required=True, help="Directory to write the Markdown files to"
+    )
+    parser.add_argument(
+        "--max-documents", type=int, default=4, help="Number of documents converted at once (default: 4)"
+    )
+    parser.add_argument(
+        "--report", help="Path to the JSON summary report (default: pdf2md_report.json in the output directory)"
+    )
+    add_conversion_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    inputs = collect_inputs(args.sources)
+    if not inputs:
+        print("Error: No PDF files found")
+        sys.exit(1)
+
+    pipeline = None
+    try:
+        print(f"Converting {len(inputs)} PDF files to: {args.output_dir}")
+        pipeline = build_pipeline(args, show_progress=False)
+
+        # The whole batch is one job for the budget
+        apply_budget(args, pipeline, [(pdf_path, None) for pdf_path, _ in inputs])
+        if args.estimate_only:
+            return
+
+        converter = BatchConverter(pipeline, max_documents=args.max_documents, resume=args.resume)
+        report = converter.run(inputs, args.output_dir, args.report)
+
+        print(
+            f"\nConverted {report['succeeded']} of {report['documents']} files "
+            f"({report['pages']} pages) in {report['seconds']:.1f} seconds"
+        )
+        for entry in report["results"]:
+            if entry["status"] == "failed":
+                print(f"Failed: {entry['input']}: {entry['error']}")
+        print_cache_stats(pipeline.ocr_processor.cache)
+        print_retry_stats(pipeline.ocr_processor.retrier)
+        print_dedupe_stats(pipeline)
+        print_usage_stats(pipeline)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    finally:
+        # Do not leave worker processes and connections behind, even if the batch failed
+        if pipeline is not None:
+            close_pipeline(pipeline)
+
+    if report["failed"]:
+        sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None):
     """
     Main entry point for the CLI.
+
+    Args:
+        argv: Command-line arguments (optional, default: sys.argv[1:])
     """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv and argv[0] == "batch":
+        batch_main(argv[1:])
+        return
+
     # Parse command-line arguments
     parser = argparse.ArgumentParser(
-        description="Convert PDF to Markdown using Gemini 2.5 Flash API for OCR"
+        description="Convert PDF to Markdown using Gemini 2.5 Flash API for OCR",
+        epilog="Run 'python -m pdf2md.cli batch --help' to convert many files at once."
     )
     parser.add_argument(
         "--input", "-i", required=True, help="Path to the input PDF file"
@@ -29,19 +468,23 @@ def main():
         "--output", "-o", help="Path to the output Markdown file (default: input filename with .md extension)"
     )
     parser.add_argument(
-        "--dpi", type=int, default=300, help="DPI for image conversion (default: 300)"
+        "--checkpoint-dir",
+        help="Directory for the progress checkpoint (optional, default: output filename with .checkpoint suffix)"
     )
     parser.add_argument(
-        "--format", choices=["png", "jpg"], default="png", help="Image format for conversion (default: png)"
+        "--temp-dir", help="Directory to store temporary files (optional, default: system temp directory)"
     )
     parser.add_argument(
-        "--api-key", help="Gemini API key (optional, will use GEMINI_API_KEY environment variable if not provided)"
+        "--pages", help="Pages to convert, e.g. 1-3,7,10- (optional, default: all pages)"
     )
     parser.add_argument(
-        "--temp-dir", help="Directory to store temporary files (optional, default: system temp directory)"
+        "--report",
+        help="Path to a JSON run report with per-stage timings (p50/p95), bytes uploaded, "
+             "retries and cache hits (optional)"
     )
+    add_conversion_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Validate input file
     if not os.path.exists(args.input):
@@ -55,36 +498,46 @@ def main():
 
     # Create temporary directory if not provided
     temp_dir = args.temp_dir
-    if not temp_dir:
+    if args.in_memory:
+        temp_dir = None
+    elif not temp_dir:
         temp_dir = tempfile.mkdtemp(prefix="pdf2md_")
     else:
         os.makedirs(temp_dir, exist_ok=True)
 
+    pipeline = None
     try:
         print(f"Processing PDF: {args.input}")
         print(f"Output will be saved to: {args.output}")
 
-        # Step 1: Convert PDF to images
-        print("\nStep 1: Converting PDF to images...")
-        pdf_processor = PDFProcessor(dpi=args.dpi, image_format=args.format)
-        image_paths = pdf_processor.convert_pdf_to_images(args.input, temp_dir)
-        print(f"Generated {len(image_paths)} images")
+        # Render, OCR and convert the pages as a stream so that Markdown is
+        # written as soon as the first pages are ready
+        print("\nConverting pages...")
+        pipeline = build_pipeline(args)
+
+        total_pages = pipeline.pdf_processor.get_page_count(args.input)
+        pages = parse_page_ranges(args.pages, total_pages) if args.pages else None
 
-        # Step 2: Process images with OCR
-        print("\nStep 2: Processing images with OCR...")
-        ocr_processor = OCRProcessor(api_key=args.api_key)
-        ocr_results = ocr_processor.process_images(image_paths)
-        print(f"Processed {len(ocr_results)} images with OCR")
+        # Fit the run to its budget before the checkpoint records the render settings
+        apply_budget(args, pipeline, [(args.input, pages)])
+        if args.estimate_only:
+            return
 
-        # Step 3: Generate Markdown
-        print("\nStep 3: Generating Markdown...")
-        markdown_generator = MarkdownGenerator()
-        markdown_text = markdown_generator.generate_markdown(ocr_results)
+        # Record progress so that a failed run can be resumed with --resume
+        checkpoint = Checkpoint(
+            args.checkpoint_dir or args.output + ".checkpoint",
+            pipeline.document_cache_key(args.input),
+            total_pages,
+            resume=args.resume,
+        )
+        num_pages = pipeline.run(args.input, args.output, temp_dir, checkpoint=checkpoint, pages=pages)
+        checkpoint.remove()
+        print(f"Converted {num_pages} pages")
 
-        # Step 4: Save Markdown to file
-        print(f"\nStep 4: Saving Markdown to {args.output}...")
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(markdown_text)
+        print_cache_stats(pipeline.ocr_processor.cache)
+        print_retry_stats(pipeline.ocr_processor.retrier)
+        print_dedupe_stats(pipeline)
+        print_usage_stats(pipeline)
 
         print(f"\nSuccess! Markdown file saved to: {args.output}")
 
@@ -92,6 +545,16 @@ def main():
         print(f"Error: {e}")
         sys.exit(1)
 
+    finally:
+        # Do not leave worker processes and connections behind, even if the run failed
+        if pipeline is not None:
+            close_pipeline(pipeline)
+
+        # Write the report of failed runs too, they are the ones worth investigating
+        if args.report and pipeline is not None:
+            write_report(pipeline.get_report(), args.report)
+            print(f"Run report saved to: {args.report}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,635 @@
+"""
+Module for detecting blank and duplicate pages before they are sent to OCR.
+"""
+
+import hashlib
+import io
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pdf2md.metrics import Metrics
+from pdf2md.pdf_processor import RenderedPage
+
+# Side of the grid the difference hash is computed on; the hash has HASH_SIDE * HASH_SIDE bits.
+# Cells of a 64 x 64 grid are about a line of text high: the hash finds the candidates of a
+# near match, but cannot see a changed word or digit, which only the full-resolution comparison does
+HASH_SIDE = 64
+HASH_BITS = HASH_SIDE * HASH_SIDE
+
+# Fewest bits set in either of two different hashes for them to be compared: sparser pages
+# (title pages, separators) only match pages with the same hash, as a changed word or
+# number is a handful of bits on them
+_MIN_NEAR_MATCH_BITS = 64
+
+# Minimum brightness step between neighboring cells that sets a hash bit, so scan noise on
+# uniform areas (margins, blank space) does not flip bits
+_GRADIENT_TOLERANCE = 2
+
+# Longest side of the thumbnail pages are analyzed on
+_THUMBNAIL_SIDE = 1024
+
+# A pixel is ink if it is this much darker than the page's median brightness (its paper)
+_INK_CONTRAST = 48
+
+# In the full-resolution comparison, a pixel is ink if it is this much darker than the paper
+# and paper if it is at most _PAPER_CONTRAST darker; pixels in between (anti-aliased or
+# blurred edges, JPEG ringing) count as neither
+_STRONG_INK_CONTRAST = 96
+_PAPER_CONTRAST = 24
+
+# Classes of the pixels of the full-resolution comparison
+_PAPER, _UNSURE, _INK = 0, 128, 255
+
+# Side in pixels of the cells the full-resolution comparison is made in, about a glyph stroke long
+_CELL_SIDE = 8
+
+# Largest fraction of the pixels of a cell that may be ink on one page and paper on the other:
+# scan noise leaves a few percent, a changed character several times more in the cells it covers
+_MAX_CELL_CONFLICT = 0.1
+
+# Most candidate pages confirmed at full resolution for a page
+_MAX_CONFIRMATIONS = 3
+
+# Default size of the texts and full-resolution detail of the remembered pages
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _popcount(value: int) -> int:
+    """
+    Count the set bits of an integer.
+    """
+    return bin(value).count("1")
+
+
+# int.bit_count is much faster on 4096-bit hashes, but only exists on Python 3.10+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count  # noqa: F811
+
+
+class _Signature:
+    """
+    What a page is matched on: the digest of its images and, for near matches,
+    their difference hashes and full-resolution detail.
+    """
+
+    __slots__ = ("digest", "hashes", "detail")
+
+    def __init__(self, digest: bytes, hashes: Optional[Tuple[int, ...]] = None,
+                 detail: Optional[List[Tuple[Tuple[int, int], bytes]]] = None):
+        self.digest = digest
+        self.hashes = hashes
+        self.detail = detail
+
+    @property
+    def size(self) -> int:
+        """
+        Number of bytes held by the full-resolution detail.
+        """
+        return sum(len(data) for _, data in self.detail) if self.detail else 0
+
+
+class _Entry:
+    """
+    Page whose OCR text can be reused for pages that are the same.
+    """
+
+    __slots__ = ("signature", "document", "page_num", "text", "entry_id")
+
+    def __init__(self, signature: _Signature, document: str, page_num: int, text: Optional[str] = None,
+                 entry_id: Optional[int] = None):
+        self.signature = signature
+        self.document = document
+        self.page_num = page_num
+        self.text = text
+        self.entry_id = entry_id
+
+
+class PageDeduplicator:
+    """
+    Stage between rendering and OCR skipping blank and duplicate pages.
+
+    Blank pages (no ink on a thumbnail of the page) are not sent to OCR and
+    get empty text. A page whose images are byte for byte the same as those
+    of a page already OCR'd, in the same document or in any document
+    converted by the same pipeline, gets that page's text instead of an OCR
+    request.
+
+    Near-identical pages (recompressed, or with scan noise) are only matched
+    with a ``threshold``. Candidates are found by comparing difference hashes,
+    which cannot tell a changed word or digit from noise, so every candidate
+    is then confirmed by comparing the two pages pixel by pixel at full
+    resolution: a match is rejected if any small area is ink on one page and
+    paper on the other. Pages that do not line up (rescans with a shift or
+    skew) are not matched. Every decision is recorded for the report.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, skip_blank: bool = True, blank_ratio: float = 0.0005,
+                 max_entries: int = 5000, max_bytes: int = DEFAULT_MAX_BYTES, metrics: Optional[Metrics] = None):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            threshold: Minimum similarity (0-1, see similarity()) of the hashes of near-identical pages,
+                       confirmed at full resolution (optional, default: only pages with identical images
+                       are duplicates)
+            skip_blank: Whether to skip blank pages
+            blank_ratio: Maximum fraction of ink pixels of a blank page
+            max_entries: Maximum number of OCR'd pages remembered; the oldest are forgotten first
+            max_bytes: Maximum size of the texts and full-resolution detail of the remembered pages
+            metrics: Metrics recording the time spent fingerprinting and the pages skipped (optional)
+        """
+        if threshold is not None and not 0 < threshold <= 1:
+            raise ValueError("threshold must be between 0 (exclusive) and 1")
+
+        self.threshold = threshold
+        self.skip_blank = skip_blank
+        self.blank_ratio = blank_ratio
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.metrics = metrics or Metrics()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._exact: Dict[bytes, int] = {}
+        self._stored_bytes = 0
+        self._next_id = 0
+        self._events: List[Dict] = []
+
+    def get_settings(self) -> tuple:
+        """
+        Get the settings that affect the output.
+
+        Returns:
+            Tuple of the threshold, whether blank pages are skipped and the blank ratio
+        """
+        return (self.threshold, self.skip_blank, self.blank_ratio)
+
+    @staticmethod
+    def _read_image(image: Union[str, bytes]) -> bytes:
+        """
+        Get the encoded bytes of a page image.
+
+        Args:
+            image: Path to the image file, or its encoded bytes
+
+        Returns:
+            Encoded image bytes
+        """
+        if isinstance(image, bytes):
+            return image
+        with open(image, "rb") as image_file:
+            return image_file.read()
+
+    @staticmethod
+    def _open_thumbnail(image_bytes: bytes):
+        """
+        Decode a page image as a grayscale thumbnail.
+
+        Args:
+            image_bytes: Encoded image bytes
+
+        Returns:
+            Grayscale PIL image no larger than _THUMBNAIL_SIDE on either side
+        """
+        from PIL import Image
+
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            # Let JPEG decode at a reduced size directly
+            source.draft("L", (_THUMBNAIL_SIDE, _THUMBNAIL_SIDE))
+            thumbnail = source.convert("L")
+        thumbnail.thumbnail((_THUMBNAIL_SIDE, _THUMBNAIL_SIDE))
+        return thumbnail
+
+    @staticmethod
+    def _paper_level(image) -> int:
+        """
+        Get the brightness of the paper of a grayscale image.
+
+        Args:
+            image: Grayscale PIL image
+
+        Returns:
+            Median brightness, which is the paper whatever its shade
+        """
+        histogram = image.histogram()
+        total = sum(histogram)
+
+        count = 0
+        for level, level_count in enumerate(histogram):
+            count += level_count
+            if count * 2 >= total:
+                return level
+        return 255
+
+    def _is_blank(self, thumbnail) -> bool:
+        """
+        Check whether a thumbnail has (almost) no ink.
+
+        Args:
+            thumbnail: Grayscale PIL image
+
+        Returns:
+            True if the fraction of pixels much darker than the paper is below blank_ratio
+        """
+        histogram = thumbnail.histogram()
+        ink = sum(histogram[:max(self._paper_level(thumbnail) - _INK_CONTRAST, 0)])
+        return ink <= sum(histogram) * self.blank_ratio
+
+    @staticmethod
+    def _difference_hash(thumbnail) -> int:
+        """
+        Compute the difference hash of a thumbnail.
+
+        Each bit tells whether a cell of a HASH_SIDE x HASH_SIDE grid is
+        brighter than its right neighbor, which survives rescanning,
+        recompression and small changes of brightness.
+
+        Args:
+            thumbnail: Grayscale PIL image
+
+        Returns:
+            Hash of HASH_BITS bits
+        """
+        from PIL import Image
+
+        cells = thumbnail.resize((HASH_SIDE + 1, HASH_SIDE), Image.BOX).tobytes()
+        value = 0
+        for row in range(HASH_SIDE):
+            offset = row * (HASH_SIDE + 1)
+            for column in range(HASH_SIDE):
+                bit = cells[offset + column] > cells[offset + column + 1] + _GRADIENT_TOLERANCE
+                value = (value << 1) | bit
+        return value
+
+    def _get_detail(self, image) -> Tuple[Tuple[int, int], bytes]:
+        """
+        Reduce a full-resolution page image to ink, paper and unsure pixels.
+
+        Args:
+            image: Grayscale PIL image at full resolution
+
+        Returns:
+            Tuple of the image size and the compressed pixel classes (_INK, _PAPER or _UNSURE)
+        """
+        paper = self._paper_level(image)
+        levels = [
+            _INK if level < paper - _STRONG_INK_CONTRAST else _PAPER if level >= paper - _PAPER_CONTRAST else _UNSURE
+            for level in range(256)
+        ]
+        return image.size, zlib.compress(image.point(levels).tobytes(), 1)
+
+    @staticmethod
+    def _confirm(first: List[Tuple[Tuple[int, int], bytes]], second: List[Tuple[Tuple[int, int], bytes]]) -> bool:
+        """
+        Check that two pages are the same at full resolution, apart from noise.
+
+        The pages are compared in cells of _CELL_SIDE pixels: a cell in
+        which more than _MAX_CELL_CONFLICT of the pixels are ink on one page
+        and paper on the other holds a different character or mark.
+
+        Args:
+            first: Full-resolution detail of each image of a page
+            second: Full-resolution detail of each image of another page
+
+        Returns:
+            True if every image of the pages is the same
+        """
+        from PIL import Image, ImageChops
+
+        ink = [255 if level == _INK else 0 for level in range(256)]
+        paper = [255 if level == _PAPER else 0 for level in range(256)]
+
+        if len(first) != len(second):
+            return False
+        for (size, first_data), (second_size, second_data) in zip(first, second):
+            if size != second_size:
+                return False
+
+            first_image = Image.frombytes("L", size, zlib.decompress(first_data))
+            second_image = Image.frombytes("L", size, zlib.decompress(second_data))
+            conflicts = ImageChops.lighter(
+                ImageChops.multiply(first_image.point(ink), second_image.point(paper)),
+                ImageChops.multiply(second_image.point(ink), first_image.point(paper)),
+            )
+            cells = conflicts.resize((max(size[0] // _CELL_SIDE, 1), max(size[1] // _CELL_SIDE, 1)), Image.BOX)
+            if cells.getextrema()[1] > _MAX_CELL_CONFLICT * 255:
+                return False
+        return True
+
+    def fingerprint(self, page: RenderedPage) -> Optional[_Signature]:
+        """
+        Fingerprint the images of a page.
+
+        Args:
+            page: Page that needs OCR
+
+        Returns:
+            Signature of the page, or None if the page is blank (and blank pages are skipped)
+        """
+        from PIL import Image
+
+        images = [self._read_image(image) for image in page.images]
+        digest = hashlib.sha256()
+        for image_bytes in images:
+            digest.update(hashlib.sha256(image_bytes).digest())
+
+        if self.threshold is None:
+            if self.skip_blank and all(self._is_blank(self._open_thumbnail(image_bytes)) for image_bytes in images):
+                return None
+            return _Signature(digest.digest())
+
+        # Near matching needs the full-resolution images anyway, so thumbnails are made from them
+        full_images, thumbnails = [], []
+        for image_bytes in images:
+            with Image.open(io.BytesIO(image_bytes)) as source:
+                full_image = source.convert("L")
+            thumbnail = full_image.copy()
+            thumbnail.thumbnail((_THUMBNAIL_SIDE, _THUMBNAIL_SIDE))
+            full_images.append(full_image)
+            thumbnails.append(thumbnail)
+
+        if self.skip_blank and all(self._is_blank(thumbnail) for thumbnail in thumbnails):
+            return None
+        return _Signature(
+            digest.digest(),
+            tuple(self._difference_hash(thumbnail) for thumbnail in thumbnails),
+            [self._get_detail(full_image) for full_image in full_images],
+        )
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """
+        Compute the similarity of the difference hashes of two pages.
+
+        Differing bits are counted against the bits set in either hash
+        rather than all bits, so the blank space two pages share does not
+        make them similar.
+
+        Args:
+            first: Hash of each image of a page
+            second: Hash of each image of another page
+
+        Returns:
+            Similarity from 0 to 1 of the least similar pair of images (0 for pages
+            with a different number of images)
+        """
+        if len(first) != len(second):
+            return 0.0
+        if first == second:
+            return 1.0
+
+        similarity = 1.0
+        for a, b in zip(first, second):
+            union = _popcount(a | b)
+            if union < _MIN_NEAR_MATCH_BITS and a != b:
+                return 0.0
+            similarity = min(similarity, 1 - _popcount(a ^ b) / max(union, 1))
+        return similarity
+
+    def _match(self, signature: _Signature, entries: Iterable[_Entry]) -> Optional[Tuple[_Entry, float]]:
+        """
+        Find the page among some pages that is the same as a page.
+
+        A page with the same images matches outright. With a threshold, the
+        pages whose hashes are within it are confirmed at full resolution,
+        the most similar first, up to _MAX_CONFIRMATIONS of them.
+
+        Args:
+            signature: Signature of the page
+            entries: Pages to search
+
+        Returns:
+            Tuple of the matching page and its similarity, or None
+        """
+        candidates = []
+        for entry in entries:
+            if entry.signature.digest == signature.digest:
+                return entry, 1.0
+            if self.threshold is not None:
+                similarity = self.similarity(signature.hashes, entry.signature.hashes)
+                if similarity >= self.threshold:
+                    candidates.append((similarity, entry))
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        for similarity, entry in candidates[:_MAX_CONFIRMATIONS]:
+            if self._confirm(signature.detail, entry.signature.detail):
+                return entry, similarity
+        return None
+
+    def find(self, signature: _Signature) -> Optional[Tuple[_Entry, float]]:
+        """
+        Find an OCR'd page that is the same as a page.
+
+        Args:
+            signature: Signature of the page
+
+        Returns:
+            Tuple of the remembered page and its similarity, or None
+        """
+        with self._lock:
+            entry_id = self._exact.get(signature.digest)
+            if entry_id is not None:
+                match = self._entries[entry_id], 1.0
+            elif self.threshold is None:
+                return None
+            else:
+                entries = list(self._entries.values())
+
+        # Near matches are confirmed outside the lock, the other documents of a batch need not wait
+        if entry_id is None:
+            match = self._match(signature, entries)
+            if match is None:
+                return None
+
+        # Pages that keep being matched are forgotten last
+        with self._lock:
+            if match[0].entry_id in self._entries:
+                self._entries.move_to_end(match[0].entry_id)
+        return match
+
+    def remember(self, signature: _Signature, document: str, page_num: int, text: str) -> None:
+        """
+        Remember the OCR text of a page for the pages that are the same.
+
+        Args:
+            signature: Signature of the page
+            document: Path of the page's PDF
+            page_num: Zero-based page number
+            text: OCR text of the page
+        """
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(signature, document, page_num, text, entry_id)
+            self._exact[signature.digest] = entry_id
+            self._stored_bytes += len(text) + signature.size
+
+            # Forget the oldest pages
+            while self._entries and (len(self._entries) > self.max_entries or self._stored_bytes > self.max_bytes):
+                _, entry = self._entries.popitem(last=False)
+                self._stored_bytes -= len(entry.text) + entry.signature.size
+                # A newer page with the same digest keeps its own mapping
+                if self._exact.get(entry.signature.digest) == entry.entry_id:
+                    self._exact.pop(entry.signature.digest, None)
+
+    def record(self, action: str, document: str, page_num: int, source: Optional[_Entry] = None,
+               similarity: Optional[float] = None) -> None:
+        """
+        Record a page that was not sent to OCR, for the report.
+
+        Args:
+            action: "blank" or "duplicate"
+            document: Path of the page's PDF
+            page_num: Zero-based page number
+            source: Page whose text was reused (duplicates only)
+            similarity: Similarity to the source page (duplicates only)
+        """
+        self.metrics.increment(f"{action}_pages")
+        event = {"action": action, "document": document, "page": page_num + 1}
+        if source is not None:
+            event.update(source_document=source.document, source_page=source.page_num + 1,
+                         similarity=round(similarity, 4))
+        with self._lock:
+            self._events.append(event)
+
+    def get_report(self) -> Dict:
+        """
+        Summarize the pages that were not sent to OCR.
+
+        Returns:
+            Dictionary with the number of "blank_pages" and "duplicate_pages", the
+            "threshold" (None when only identical pages are matched) and every
+            skipped page with the page it was matched with
+        """
+        with self._lock:
+            events = list(self._events)
+        return {
+            "threshold": self.threshold,
+            "blank_pages": sum(event["action"] == "blank" for event in events),
+            "duplicate_pages": sum(event["action"] == "duplicate" for event in events),
+            "pages": events,
+        }
+
+    def stream(self, document: str) -> "DedupeStream":
+        """
+        Start deduplicating the pages of a document.
+
+        Args:
+            document: Path of the PDF
+
+        Returns:
+            Stream filtering the document's pages before OCR
+        """
+        return DedupeStream(self, document)
+
+
+class DedupeStream:
+    """
+    Deduplication of one stream of pages of a document, in page order.
+
+    ``filter`` runs before OCR and replaces the pages that need no request;
+    ``resolve`` runs on the results, in the same order, and fills in the text
+    of duplicates. A page may duplicate an earlier page of the same stream
+    whose OCR is still in flight: its text is taken from that page's result
+    once it comes back, which is always first as results are in page order.
+    """
+
+    def __init__(self, deduplicator: PageDeduplicator, document: str):
+        """
+        Initialize the stream.
+
+        Args:
+            deduplicator: Deduplicator shared by the documents of the pipeline
+            document: Path of the PDF
+        """
+        self.deduplicator = deduplicator
+        self.document = document
+        self._signatures: Dict[int, _Signature] = {}
+        self._pending: List[_Entry] = []
+        self._duplicates: Dict[int, Union[_Entry, str]] = {}
+        self._waiting: Dict[int, int] = {}
+        self._results: Dict[int, Union[str, Exception]] = {}
+
+    def _find_pending(self, signature: _Signature) -> Optional[Tuple[_Entry, float]]:
+        """
+        Find a page of this stream sent to OCR but not resolved yet that is the same.
+        """
+        return self.deduplicator._match(signature, self._pending)
+
+    def filter(self, pages: Iterable[RenderedPage]) -> Iterator[RenderedPage]:
+        """
+        Replace the blank and duplicate pages of a stream by pages that need no OCR.
+
+        Args:
+            pages: Rendered pages, in page order
+
+        Yields:
+            Each page, or a page without images for blank and duplicate pages
+        """
+        deduplicator = self.deduplicator
+        for page in pages:
+            if not page.needs_ocr:
+                yield page
+                continue
+
+            start_time = time.perf_counter()
+            signature = deduplicator.fingerprint(page)
+            match = None
+            if signature is not None:
+                match = deduplicator.find(signature) or self._find_pending(signature)
+            deduplicator.metrics.observe("dedupe", time.perf_counter() - start_time)
+
+            if signature is None:
+                deduplicator.record("blank", self.document, page.page_num)
+                self._duplicates[page.page_num] = ""
+                yield RenderedPage(page.page_num, text="")
+                continue
+
+            if match is None:
+                self._signatures[page.page_num] = signature
+                self._pending.append(_Entry(signature, self.document, page.page_num))
+                yield page
+                continue
+
+            source, similarity = match
+            deduplicator.record("duplicate", self.document, page.page_num, source, similarity)
+            if source.text is None:
+                self._waiting[source.page_num] = self._waiting.get(source.page_num, 0) + 1
+            self._duplicates[page.page_num] = source
+            yield RenderedPage(page.page_num, text="")
+
+    def resolve(self, page_num: int, result: Union[str, Exception]) -> Union[str, Exception]:
+        """
+        Get the final result of a page after OCR.
+
+        Args:
+            page_num: Zero-based page number
+            result: Text (or exception) returned for the page filtered by filter()
+
+        Returns:
+            Text (or exception) of the page: the text of its source for duplicates
+        """
+        duplicate = self._duplicates.pop(page_num, None)
+        if isinstance(duplicate, str):
+            return duplicate
+        if duplicate is not None:
+            if duplicate.text is not None:
+                return duplicate.text
+            # The source is an earlier page of this stream, resolved before this one
+            result = self._results[duplicate.page_num]
+            self._waiting[duplicate.page_num] -= 1
+            if not self._waiting[duplicate.page_num]:
+                del self._waiting[duplicate.page_num]
+                del self._results[duplicate.page_num]
+            return result
+
+        signature = self._signatures.pop(page_num, None)
+        if signature is not None:
+            self._pending = [entry for entry in self._pending if entry.page_num != page_num]
+            if page_num in self._waiting:
+                self._results[page_num] = result
+            if not isinstance(result, Exception):
+                self.deduplicator.remember(signature, self.document, page_num, result)
+        return result
@@ -0,0 +1,261 @@
+"""
+Module for running conversions as background jobs.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Status of a job that is waiting for a worker
+STATUS_QUEUED = "queued"
+# Status of a job that a worker is processing
+STATUS_RUNNING = "running"
+# Status of a job that finished successfully
+STATUS_DONE = "done"
+# Status of a job that failed
+STATUS_FAILED = "failed"
+
+# Signature of the function that processes a job: (job, progress callback) -> None
+JobHandler = Callable[[Dict, Callable[[int, int], None]], None]
+
+
+class JobQueue:
+    """
+    Persistent job queue backed by SQLite, with a local pool of worker threads.
+
+    Jobs survive restarts: jobs that were running when the process stopped
+    are put back in the queue on startup. Workers claim jobs atomically, so
+    a job is never processed by two workers at once.
+    """
+
+    def __init__(self, db_path: str, poll_interval: float = 1.0):
+        """
+        Initialize the job queue.
+
+        Args:
+            db_path: Path to the SQLite database file (created if missing)
+            poll_interval: Seconds an idle worker waits before checking the queue again
+        """
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT NOT NULL, "
+                "pdf_path TEXT NOT NULL, result_path TEXT, error TEXT, "
+                "pages_done INTEGER NOT NULL DEFAULT 0, pages_total INTEGER NOT NULL DEFAULT 0, "
+                "created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the database for one transaction.
+
+        Every call opens its own connection, so the queue can be used from
+        request threads and worker threads alike. The transaction is committed
+        (or rolled back on error) and the connection closed on exit.
+
+        Yields:
+            SQLite connection returning rows as dictionaries
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def submit(self, pdf_path: str, filename: str) -> str:
+        """
+        Add a conversion job to the queue.
+
+        Args:
+            pdf_path: Path to the uploaded PDF file
+            filename: Original name of the uploaded file
+
+        Returns:
+            ID of the new job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, filename, pdf_path, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, filename, pdf_path, now, now),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Get a job.
+
+        Args:
+            job_id: ID of the job
+
+        Returns:
+            Job as a dictionary, or None if it does not exist
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_by_status(self) -> Dict[str, int]:
+        """
+        Count the jobs in each status.
+
+        Returns:
+            Dictionary mapping every status to its number of jobs
+        """
+        counts = {status: 0 for status in (STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED)}
+        with self._connect() as conn:
+            for row in conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"):
+                counts[row["status"]] = row["count"]
+        return counts
+
+    def list_active(self) -> List[Dict]:
+        """
+        Get the jobs that are queued or running.
+
+        Returns:
+            Jobs as dictionaries, oldest first
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created", (STATUS_QUEUED, STATUS_RUNNING)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_expired(self, before: float) -> List[Dict]:
+        """
+        Delete the finished jobs that were last updated before a point in time.
+
+        The files of the jobs are left to the caller.
+
+        Args:
+            before: Unix timestamp; done and failed jobs last updated earlier are deleted
+
+        Returns:
+            Deleted jobs as dictionaries
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) AND updated < ?", (STATUS_DONE, STATUS_FAILED, before)
+            ).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields) -> None:
+        """
+        Update fields of a job.
+
+        Args:
+            job_id: ID of the job
+            **fields: Column values to set
+        """
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _claim(self) -> Optional[Dict]:
+        """
+        Atomically take the oldest queued job and mark it as running.
+
+        Returns:
+            Claimed job, or None if the queue is empty
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (STATUS_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated = ? WHERE id = ?",
+                (STATUS_RUNNING, time.time(), row["id"]),
+            )
+        job = dict(row)
+        job["status"] = STATUS_RUNNING
+        return job
+
+    def _worker_loop(self, handler: JobHandler) -> None:
+        """
+        Process jobs until the queue is stopped.
+
+        Args:
+            handler: Function processing a job
+        """
+        while not self._stop_event.is_set():
+            job = self._claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            def report_progress(done: int, total: int, job_id: str = job["id"]) -> None:
+                self.update(job_id, pages_done=done, pages_total=total)
+
+            try:
+                handler(job, report_progress)
+                self.update(job["id"], status=STATUS_DONE)
+            except Exception as e:
+                self.update(job["id"], status=STATUS_FAILED, error=str(e))
+
+    def start(self, handler: JobHandler, workers: int = 2) -> None:
+        """
+        Start the worker threads.
+
+        Jobs left running by a previous process are queued again first.
+
+        Args:
+            handler: Function processing a job; it raises to mark the job as failed
+            workers: Number of worker threads
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated = ? WHERE status = ?",
+                (STATUS_QUEUED, time.time(), STATUS_RUNNING),
+            )
+
+        for index in range(workers):
+            worker = threading.Thread(
+                target=self._worker_loop, args=(handler,), name=f"pdf2md-job-{index}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def count_alive_workers(self) -> int:
+        """
+        Count the worker threads that are running.
+
+        Returns:
+            Number of live worker threads
+        """
+        return sum(worker.is_alive() for worker in self._workers)
+
+    def stop(self) -> None:
+        """
+        Stop the worker threads once they finish their current job.
+        """
+        self._stop_event.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
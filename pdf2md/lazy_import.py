@@ -0,0 +1,51 @@
+"""
+Module for deferring the import of heavy dependencies until they are used.
+"""
+
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Lets modules refer to a heavy dependency at module level (e.g.
+    ``fitz = LazyModule("fitz")``) without paying for its import until a
+    code path actually uses it, so commands such as ``--help`` start fast.
+    The import happens once, even when several threads use the module at
+    the same time.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the lazy module.
+
+        Args:
+            name: Absolute name of the module to import
+        """
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        """
+        Import the module, if not done yet.
+
+        Returns:
+            Imported module
+        """
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+            return self._module
+
+    def __getattr__(self, attribute: str) -> Any:
+        module = self._module or self._load()
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
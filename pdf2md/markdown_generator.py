@@ -2,101 +2,210 @@
 Module for converting OCR text to Markdown format.
 """
 
+import itertools
+import multiprocessing
 import re
-from typing import List, Optional
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pdf2md.metrics import Metrics
+
+# Separator inserted between the Markdown of consecutive pages
+PAGE_SEPARATOR = "\n\n---\n\n"
+
+# Written in place of a page whose text could not be obtained
+FAILED_PAGE_PLACEHOLDER = "<!-- pdf2md: this page could not be converted -->"
+
+# Marker at the start of every page in incremental output, with the one-based
+# page number and the hash of the page content and conversion settings
+PAGE_MARKER = "<!-- pdf2md:page {number} {page_hash} -->"
+
+# Marker of a page that failed, which is never reused
+FAILED_PAGE_MARKER = "<!-- pdf2md:page {number} -->"
+
+# Marker line as parsed from an existing output file
+_PAGE_MARKER = re.compile(r"^<!-- pdf2md:page (\d+)(?: ([0-9a-f]+))? -->$", re.MULTILINE)
+
+# Blank line (possibly containing whitespace) separating paragraphs
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# Potential heading (short line with no punctuation at the end)
+_HEADING = re.compile(r"[A-Z0-9][A-Za-z0-9\s\-:]{0,60}")
+
+# Length of the longest line that can match _HEADING
+_MAX_HEADING_LENGTH = 61
+
+# Bullet point list item
+_BULLET = re.compile(r"\s*[•●○◦*-]\s+(.+)")
+
+# Numbered list item
+_NUMBERED = re.compile(r"\s*(\d+)\.\s+(.+)")
+
+# End of a line that finishes a sentence or clause
+_BLOCK_END = re.compile(r"[.!?:;)\]\"'»”]$")
+
+# Marker of a list item as generated by _format_line
+_LIST_MARKER = re.compile(r"(?:\*|\d+\.) ")
+
+
+def _generate_pages_in_worker(generator: "MarkdownGenerator",
+                              ocr_texts: List[Optional[str]]) -> Tuple[List[str], Metrics]:
+    """
+    Generate the Markdown of a chunk of pages in a worker process.
+
+    Args:
+        generator: Markdown generator
+        ocr_texts: OCR text of each page (None for failed pages)
+
+    Returns:
+        Tuple of the Markdown of each page, in order, and the metrics recorded
+        while generating it
+    """
+    return [generator._generate_page(text) for text in ocr_texts], generator.metrics
 
 
 class MarkdownGenerator:
     """
     Class for converting OCR text to Markdown format.
+
+    Pages are converted independently. With ``workers`` above 1, pages are
+    converted in a process pool in chunks of ``chunk_size`` consecutive
+    pages and written in order as chunks come back, so the output is the
+    same as with one worker and is still written incrementally. With
+    ``reconcile`` enabled, a pass over the page breaks then fixes the start
+    of each page using the last line of the page before it.
     """
 
-    def __init__(self):
+    def __init__(self, metrics: Optional[Metrics] = None, workers: int = 1, chunk_size: int = 64,
+                 reconcile: bool = False):
         """
         Initialize the Markdown generator.
+
+        Args:
+            metrics: Metrics recording the time spent per page (optional)
+            workers: Number of processes converting pages in parallel
+            chunk_size: Number of consecutive pages sent to a worker process at once
+            reconcile: Whether to fix the start of each page using the end of the page before it
         """
-        pass
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
 
-    def _detect_headings(self, text: str) -> str:
+        self.metrics = metrics or Metrics()
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.reconcile = reconcile
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def __getstate__(self):
         """
-        Detect and format headings in the text.
+        Get the state sent to worker processes, without the process pool.
 
-        Args:
-            text: Input text
+        Workers record into fresh metrics, which are sent back with every
+        chunk of pages and merged into the generator's metrics.
+        """
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["metrics"] = None
+        del state["_pool_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore the state received by a worker process.
+        """
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+        self.metrics = Metrics()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Get the process pool, creating it on first use.
 
         Returns:
-            Text with Markdown headings
-        """
-        # Pattern for potential headings (short lines with no punctuation at the end)
-        heading_pattern = r"^([A-Z0-9][A-Za-z0-9\s\-:]{0,60})$"
-        
-        lines = text.split("\n")
-        result_lines = []
-        
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                result_lines.append("")
-                continue
-                
-            # Check if the line looks like a heading
-            match = re.match(heading_pattern, line)
-            if match and len(line) < 100:  # Limit heading length
-                # Determine heading level based on context
-                if i == 0 or all(not l.strip() for l in lines[max(0, i-2):i]):
-                    # First line or preceded by blank lines - likely a main heading
-                    result_lines.append(f"# {line}")
-                elif i > 0 and lines[i-1].strip() == "":
-                    # Preceded by one blank line - likely a subheading
-                    result_lines.append(f"## {line}")
-                else:
-                    # Just add the line as is
-                    result_lines.append(line)
-            else:
-                result_lines.append(line)
-                
-        return "\n".join(result_lines)
-
-    def _detect_lists(self, text: str) -> str:
-        """
-        Detect and format lists in the text.
+            Process pool with workers processes
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawn rather than fork: the pool is usually created from a thread
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def close(self) -> None:
+        """
+        Shut down the process pool.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def get_settings(self) -> tuple:
+        """
+        Get the settings that affect the Markdown output.
+
+        Returns:
+            Empty tuple, or a marker of page-break reconciliation when it is enabled
+        """
+        return ("reconcile",) if self.reconcile else ()
+
+    @staticmethod
+    def _iter_paragraphs(text: str) -> Iterator[str]:
+        """
+        Split text into paragraphs at blank lines, lazily.
 
         Args:
             text: Input text
 
+        Yields:
+            Raw paragraphs, in order
+        """
+        start = 0
+        for match in _PARAGRAPH_BREAK.finditer(text):
+            yield text[start:match.start()]
+            start = match.end()
+        yield text[start:]
+
+    @staticmethod
+    def _format_line(line: str, blank_lines: int) -> str:
+        """
+        Format a single normalized line as a heading, list item or plain text.
+
+        Args:
+            line: Non-empty line with whitespace collapsed to single spaces
+            blank_lines: Number of consecutive blank lines before the line
+
         Returns:
-            Text with Markdown lists
-        """
-        # Pattern for potential list items
-        bullet_patterns = [
-            r"^[\s]*[•●○◦*-][\s]+(.+)$",  # Bullet points
-            r"^[\s]*(\d+)\.[\s]+(.+)$",    # Numbered lists
-        ]
-        
-        lines = text.split("\n")
-        result_lines = []
-        
-        for line in lines:
-            line_processed = False
-            
-            # Check for bullet lists
-            match = re.match(bullet_patterns[0], line)
-            if match:
-                result_lines.append(f"* {match.group(1)}")
-                line_processed = True
-                
-            # Check for numbered lists
-            if not line_processed:
-                match = re.match(bullet_patterns[1], line)
-                if match:
-                    result_lines.append(f"{match.group(1)}. {match.group(2)}")
-                    line_processed = True
-            
-            # If not a list item, add as is
-            if not line_processed:
-                result_lines.append(line)
-                
-        return "\n".join(result_lines)
+            Markdown for the line
+        """
+        # Short lines with no punctuation at the end are potential headings
+        if len(line) <= _MAX_HEADING_LENGTH and _HEADING.fullmatch(line):
+            if blank_lines >= 2:
+                # First line or preceded by blank lines - likely a main heading
+                return f"# {line}"
+            if blank_lines == 1:
+                # Preceded by one blank line - likely a subheading
+                return f"## {line}"
+            return line
+
+        # Bullet points
+        match = _BULLET.fullmatch(line)
+        if match:
+            return f"* {match.group(1)}"
+
+        # Numbered lists
+        match = _NUMBERED.fullmatch(line)
+        if match:
+            return f"{match.group(1)}. {match.group(2)}"
+
+        return line
 
     def _detect_emphasis(self, text: str) -> str:
         """
@@ -113,24 +222,202 @@ class MarkdownGenerator:
         # more sophisticated NLP might be needed for accurate detection
         return text
 
-    def _format_paragraphs(self, text: str) -> str:
+    @staticmethod
+    def stitch_tiles(tile_texts: List[str]) -> str:
         """
-        Format paragraphs in the text.
+        Stitch the OCR text of the tiles of a page back into the text of the page.
+
+        Tiles are cut at blank rows, usually between paragraphs, so the tiles
+        are joined as separate paragraphs in top-to-bottom order.
 
         Args:
-            text: Input text
+            tile_texts: Text of each tile, from top to bottom
+
+        Returns:
+            Text of the whole page
+        """
+        return "\n\n".join(text.strip("\n") for text in tile_texts if text.strip())
+
+    def generate_page_markdown(self, text: str) -> str:
+        """
+        Generate Markdown from the OCR text of a single page.
+
+        Args:
+            text: OCR text result for one page
+
+        Returns:
+            Markdown formatted text for the page (without page separator)
+        """
+        start_time = time.perf_counter()
+
+        # Tokenize the text in a single scan: paragraphs are collapsed to one
+        # line each and separated by a blank line, and every line is classified
+        # as it is produced, tracking the blank lines that precede it
+        lines = []
+        blank_lines = 2  # The first line counts as preceded by blank lines
+
+        for index, paragraph in enumerate(self._iter_paragraphs(text)):
+            if index:
+                lines.append("")
+                blank_lines += 1
+
+            # Remove extra whitespace within the paragraph (str.split uses the
+            # same definition of whitespace as \s in regular expressions)
+            line = " ".join(paragraph.split())
+            if not line:
+                lines.append("")
+                blank_lines += 1
+                continue
+
+            lines.append(self._format_line(line, blank_lines))
+            blank_lines = 0
+
+        markdown = "\n".join(lines)
+        self.metrics.observe("markdown", time.perf_counter() - start_time)
+        return markdown
+
+    def _generate_page(self, text: Optional[str]) -> str:
+        """
+        Generate the Markdown of a page, or the placeholder of a failed page.
+
+        Args:
+            text: OCR text of the page, or None if the page failed
+
+        Returns:
+            Markdown formatted text for the page
+        """
+        return FAILED_PAGE_PLACEHOLDER if text is None else self.generate_page_markdown(text)
+
+    def _iter_pages_parallel(self, ocr_texts: Iterable[Optional[str]]) -> Iterator[str]:
+        """
+        Generate the Markdown of pages in the process pool, yielding it in order.
+
+        At most two chunks per worker are in flight, so neither the OCR texts
+        nor the generated Markdown pile up in memory when the consumer is
+        slower than the workers.
+
+        Args:
+            ocr_texts: Iterable of OCR text results (one per page, None for failed pages)
+
+        Yields:
+            Markdown of each page, in order
+        """
+        pool = self._get_pool()
+        ocr_texts = iter(ocr_texts)
+        pending = deque()
+
+        try:
+            while True:
+                chunk = list(itertools.islice(ocr_texts, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_generate_pages_in_worker, self, chunk))
+                if len(pending) >= 2 * self.workers:
+                    yield from self._collect_worker_result(pending.popleft().result())
+
+            while pending:
+                yield from self._collect_worker_result(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _collect_worker_result(self, result: Tuple[List[str], Metrics]) -> List[str]:
+        """
+        Merge the metrics of a chunk converted by a worker process.
+
+        Args:
+            result: Markdown pages and metrics returned by the worker
+
+        Returns:
+            Markdown pages
+        """
+        markdown_pages, worker_metrics = result
+        self.metrics.merge(worker_metrics)
+        return markdown_pages
+
+    @staticmethod
+    def reconcile_boundary(previous_line: Optional[str], markdown: str) -> str:
+        """
+        Fix the start of a page using the last line of the page before it.
+
+        A page is converted without context, so its first line becomes a main
+        heading whenever it looks like one. Across the page break:
+
+        - a heading right after a heading that ended the previous page is
+          nested one level below it;
+        - a page that continues a sentence left unfinished by the previous
+          page starts with plain text rather than a heading;
+        - a page that continues a list item left unfinished by the previous
+          page starts with plain text indented under the item, rather than
+          with a heading or a paragraph of its own.
+
+        Args:
+            previous_line: Last non-blank line of the previous page's Markdown (None for the first page)
+            markdown: Markdown of the page
 
         Returns:
-            Text with properly formatted paragraphs
+            Markdown of the page with its first line fixed
+        """
+        # Nothing to reconcile after or before an empty or failed page
+        if (not previous_line or previous_line.startswith("<!--")
+                or not markdown[:1].strip() or markdown.startswith("<!--")):
+            return markdown
+
+        if previous_line.startswith("#"):
+            if markdown.startswith("# "):
+                level = min(len(previous_line) - len(previous_line.lstrip("#")) + 1, 6)
+                return "#" * level + markdown[1:]
+            return markdown
+        if _BLOCK_END.search(previous_line):
+            return markdown
+
+        # The page starts in the middle of the last block of the previous page
+        if markdown.startswith("# "):
+            markdown = markdown[2:]
+        item = _LIST_MARKER.match(previous_line)
+        if item and not _LIST_MARKER.match(markdown):
+            # Align the continuation with the item's text, short of an indented code block
+            markdown = " " * min(item.end(), 3) + markdown
+        return markdown
+
+    @staticmethod
+    def last_line(markdown: str) -> str:
+        """
+        Get the last non-blank line of a page's Markdown, as passed to reconcile_boundary.
+
+        Args:
+            markdown: Markdown of the page
+
+        Returns:
+            Last non-blank line, or an empty string for an empty page
+        """
+        return markdown.rstrip().rpartition("\n")[2]
+
+    def iter_markdown(self, ocr_texts: Iterable[Optional[str]]) -> Iterator[str]:
+        """
+        Generate the Markdown of a stream of pages, reconciling page breaks if enabled.
+
+        Args:
+            ocr_texts: Iterable of OCR text results (one per page, None for failed pages,
+                       may be a generator)
+
+        Yields:
+            Markdown of each page (without page separator), in order
         """
-        # Split text into paragraphs (double newlines)
-        paragraphs = re.split(r"\n\s*\n", text)
-        
-        # Remove extra whitespace within paragraphs
-        paragraphs = [re.sub(r"\s+", " ", p.strip()) for p in paragraphs]
-        
-        # Join paragraphs with double newlines
-        return "\n\n".join(paragraphs)
+        if self.workers > 1:
+            markdown_pages = self._iter_pages_parallel(ocr_texts)
+        else:
+            markdown_pages = (self._generate_page(text) for text in ocr_texts)
+
+        if not self.reconcile:
+            yield from markdown_pages
+            return
+
+        previous_line = None
+        for markdown in markdown_pages:
+            markdown = self.reconcile_boundary(previous_line, markdown)
+            previous_line = self.last_line(markdown)
+            yield markdown
 
     def generate_markdown(self, ocr_texts: List[str]) -> str:
         """
@@ -142,26 +429,96 @@ class MarkdownGenerator:
         Returns:
             Markdown formatted text
         """
-        markdown_pages = []
-        
-        for i, text in enumerate(ocr_texts):
-            # Process the text
-            processed_text = text
-            
-            # Format paragraphs
-            processed_text = self._format_paragraphs(processed_text)
-            
-            # Detect and format headings
-            processed_text = self._detect_headings(processed_text)
-            
-            # Detect and format lists
-            processed_text = self._detect_lists(processed_text)
-            
-            # Add page separator if not the last page
-            if i < len(ocr_texts) - 1:
-                processed_text += "\n\n---\n\n"
-                
-            markdown_pages.append(processed_text)
-        
         # Combine all pages
-        return "".join(markdown_pages)
+        return PAGE_SEPARATOR.join(self.iter_markdown(ocr_texts))
+
+    def write_markdown(self, ocr_texts: Iterable[Optional[str]], output_file: IO[str]) -> int:
+        """
+        Generate Markdown from a stream of OCR texts and write it incrementally.
+
+        Each page is written and flushed as soon as its text is available (or,
+        with several workers, as soon as its chunk is converted), so the output
+        never has to be held in memory as a whole. Pages whose text is None are
+        written as a placeholder comment.
+
+        Args:
+            ocr_texts: Iterable of OCR text results (one per page, may be a generator)
+            output_file: Text file object to write the Markdown to
+
+        Returns:
+            Number of pages written
+        """
+        return self.write_pages(self.iter_markdown(ocr_texts), output_file)
+
+    @staticmethod
+    def write_pages(markdown_pages: Iterable[str], output_file: IO[str]) -> int:
+        """
+        Write a stream of page Markdown, separating the pages.
+
+        Args:
+            markdown_pages: Iterable of the Markdown of each page (may be a generator)
+            output_file: Text file object to write the Markdown to
+
+        Returns:
+            Number of pages written
+        """
+        num_pages = 0
+
+        for markdown in markdown_pages:
+            # Add page separator before every page but the first
+            if num_pages:
+                output_file.write(PAGE_SEPARATOR)
+
+            output_file.write(markdown)
+            output_file.flush()
+            num_pages += 1
+
+        return num_pages
+
+    def generate_marked_page(self, page_num: int, text: Optional[str], page_hash: str,
+                             previous_line: Optional[str] = None) -> str:
+        """
+        Generate the Markdown of a page preceded by its page marker.
+
+        If reconciliation is enabled, the page break is reconciled as in
+        iter_markdown, so marked pages read the same as unmarked ones.
+
+        Args:
+            page_num: Zero-based page number
+            text: OCR text of the page, or None if the page failed
+            page_hash: Hash of the page content and conversion settings
+            previous_line: Last non-blank line of the previous marked page (None for the first page)
+
+        Returns:
+            Marker line, blank line and Markdown of the page
+        """
+        if text is None:
+            return f"{FAILED_PAGE_MARKER.format(number=page_num + 1)}\n\n{FAILED_PAGE_PLACEHOLDER}"
+        markdown = self.generate_page_markdown(text)
+        if self.reconcile:
+            markdown = self.reconcile_boundary(previous_line, markdown)
+        marker = PAGE_MARKER.format(number=page_num + 1, page_hash=page_hash)
+        return f"{marker}\n\n{markdown}"
+
+    @staticmethod
+    def parse_marked_pages(markdown: str) -> Dict[int, Tuple[Optional[str], str]]:
+        """
+        Split Markdown written with page markers back into its pages.
+
+        Args:
+            markdown: Content of an output file written in incremental mode
+
+        Returns:
+            Dictionary mapping zero-based page numbers to the page hash (None
+            for failed pages) and the marked Markdown of the page, exactly as
+            written by generate_marked_page
+        """
+        matches = list(_PAGE_MARKER.finditer(markdown))
+        pages = {}
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            end = next_match.start() if next_match else len(markdown)
+            chunk = markdown[match.start():end]
+            if next_match and chunk.endswith(PAGE_SEPARATOR):
+                chunk = chunk[:-len(PAGE_SEPARATOR)]
+            pages[int(match.group(1)) - 1] = (match.group(2), chunk)
+        return pages
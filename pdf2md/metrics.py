@@ -0,0 +1,245 @@
+"""
+Module for collecting per-stage timings and counters of conversions.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Quantiles reported for every timing
+QUANTILES = (0.5, 0.95)
+
+
+def percentile(sorted_samples: List[float], quantile: float) -> float:
+    """
+    Get a percentile of samples with the nearest-rank method.
+
+    Args:
+        sorted_samples: Samples in ascending order (must not be empty)
+        quantile: Quantile between 0 and 1
+
+    Returns:
+        Value of the percentile
+    """
+    rank = max(1, math.ceil(quantile * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+class Metrics:
+    """
+    Thread-safe collection of counters and timing samples.
+
+    Timings keep an exact count and total, and the most recent
+    ``max_samples`` samples for percentiles, so a long-running process does
+    not grow without bound. The stages recorded by the converter are:
+
+    - render: rasterizing and encoding a page (PDFProcessor)
+    - text_extract: extracting the text of a text-native page (PDFProcessor)
+    - encode: base64-encoding a page image for upload (OCRProcessor)
+    - ocr_request: one OCR request, including failed attempts (OCRProcessor)
+    - ocr_page: OCR of a page, including retries and backoff (OCRProcessor)
+    - markdown: generating the Markdown of a page (MarkdownGenerator)
+    - queue_wait: OCR waiting for the next rendered page (ConversionPipeline)
+    - first_page: time until the first page is written (ConversionPipeline)
+    - document: converting a whole document (ConversionPipeline)
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        """
+        Initialize the metrics.
+
+        Args:
+            max_samples: Number of recent samples kept per timing for percentiles
+        """
+        self.max_samples = max_samples
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """
+        Get the state sent to other processes, without the lock.
+        """
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_timings"] = {
+                name: {"count": timing["count"], "total": timing["total"], "samples": list(timing["samples"])}
+                for name, timing in self._timings.items()
+            }
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore the state received from another process.
+        """
+        timings = state.pop("_timings")
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._timings = {}
+        for name, timing in timings.items():
+            self._timings[name] = {
+                "count": timing["count"],
+                "total": timing["total"],
+                "samples": deque(timing["samples"], maxlen=self.max_samples),
+            }
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name: Name of the counter
+            amount: Amount to add
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record a timing sample.
+
+        Args:
+            name: Name of the timing
+            seconds: Duration in seconds
+        """
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.max_samples)}
+                self._timings[name] = timing
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["samples"].append(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        Time a block of code.
+
+        Args:
+            name: Name of the timing
+
+        Yields:
+            Nothing; the duration of the block is recorded on exit
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time)
+
+    def merge(self, other: "Metrics") -> None:
+        """
+        Add the counters and timings of other metrics, e.g. from a render worker process.
+
+        Args:
+            other: Metrics to add
+        """
+        other_state = other.__getstate__()
+        with self._lock:
+            for name, value in other_state["_counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            for name, other_timing in other_state["_timings"].items():
+                timing = self._timings.get(name)
+                if timing is None:
+                    timing = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.max_samples)}
+                    self._timings[name] = timing
+                timing["count"] += other_timing["count"]
+                timing["total"] += other_timing["total"]
+                timing["samples"].extend(other_timing["samples"])
+
+    def get_counter(self, name: str) -> float:
+        """
+        Get the value of a counter.
+
+        Args:
+            name: Name of the counter
+
+        Returns:
+            Value of the counter (0 if never increased)
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        Summarize the metrics.
+
+        Returns:
+            Dictionary with the counters, and for every timing its count, total,
+            mean, p50, p95 and maximum in seconds
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {
+                name: (timing["count"], timing["total"], sorted(timing["samples"]))
+                for name, timing in self._timings.items()
+            }
+
+        summary = {"counters": counters, "timings": {}}
+        for name, (count, total, samples) in sorted(timings.items()):
+            entry = {"count": count, "total_seconds": round(total, 6), "mean_seconds": round(total / count, 6)}
+            for quantile in QUANTILES:
+                entry[f"p{int(quantile * 100)}_seconds"] = round(percentile(samples, quantile), 6)
+            entry["max_seconds"] = round(samples[-1], 6)
+            summary["timings"][name] = entry
+        return summary
+
+    def to_prometheus(self, prefix: str = "pdf2md", gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Counters become <prefix>_<name>_total, timings become summaries named
+        <prefix>_<name>_seconds with p50 and p95 quantiles.
+
+        Args:
+            prefix: Prefix of every metric name
+            gauges: Extra values exported as gauges named <prefix>_<name> (optional)
+
+        Returns:
+            Metrics text
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {
+                name: (timing["count"], timing["total"], sorted(timing["samples"]))
+                for name, timing in self._timings.items()
+            }
+
+        lines = []
+        for name, value in sorted(counters.items()):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        for name, (count, total, samples) in sorted(timings.items()):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for quantile in QUANTILES:
+                lines.append(f'{metric}{{quantile="{quantile}"}} {percentile(samples, quantile):.6f}')
+            lines.append(f"{metric}_sum {total:.6f}")
+            lines.append(f"{metric}_count {count}")
+
+        for name, value in sorted((gauges or {}).items()):
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def write_report(report: Dict, path: str) -> None:
+    """
+    Write a run report as JSON.
+
+    Args:
+        report: Report, e.g. from ConversionPipeline.get_report
+        path: Path to the JSON file
+    """
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, ensure_ascii=False)
@@ -0,0 +1,430 @@
+"""
+Module for the OCR engines used by the OCR processor.
+"""
+
+import base64
+import http.client
+import io
+import json
+import math
+import os
+import queue
+import threading
+import time
+import urllib.parse
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+# Gemini model used for OCR
+DEFAULT_MODEL_NAME = "gemini-2.5-flash-preview-04-17"
+
+# Address of the stub OCR server started by python -m pdf2md.stub_server
+DEFAULT_STUB_URL = "http://127.0.0.1:8765"
+
+# Token usage of a request: "input_tokens" and "output_tokens"
+Usage = Dict[str, int]
+
+# Content of a request: prompt and label strings, and image parts with a
+# "mime_type" and base64-encoded "data"
+Contents = List[Union[str, Dict[str, str]]]
+
+
+class OCRBackendError(RuntimeError):
+    """
+    Error returned by an OCR backend, with the details needed to decide whether to retry.
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        Initialize the error.
+
+        Args:
+            message: Description of the error
+            status_code: HTTP status code of the failed request (optional)
+            retry_after: Seconds the server asked to wait before retrying (optional)
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date.
+
+    Args:
+        value: Value of the header (optional)
+
+    Returns:
+        Seconds to wait before retrying, or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+
+    # Delay in seconds
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(0.0, seconds) if math.isfinite(seconds) else None
+
+    # Date after which to retry, in UTC when the date has no zone
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, date.timestamp() - time.time())
+
+
+class OCRBackend:
+    """
+    Base class of the OCR engines.
+
+    A backend turns request contents (the prompt, optional labels and one or
+    more page images) into the response text. Backends must be safe to call
+    from several threads at once, and are meant to be created once and reused
+    so that their clients and connections are reused too.
+    """
+
+    # Name identifying the engine and model, used in cache keys
+    model_name = ""
+
+    # Whether the backend follows the batch prompt and delimits the pages of a multi-image request
+    supports_batch = True
+
+    # Whether requests are billed per token, so that budgets apply to them
+    billed = True
+
+    # Usage of the last request of each thread
+    _last_usage = threading.local()
+
+    def _set_last_usage(self, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+        """
+        Remember the token usage reported for the request just made by this thread.
+
+        Args:
+            input_tokens: Input tokens reported by the engine (None if not reported)
+            output_tokens: Output tokens reported by the engine (None if not reported)
+        """
+        if input_tokens is None or output_tokens is None:
+            self._last_usage.value = None
+        else:
+            self._last_usage.value = {"input_tokens": int(input_tokens), "output_tokens": int(output_tokens)}
+
+    def get_last_usage(self) -> Optional[Usage]:
+        """
+        Get the token usage of the last request made by the calling thread.
+
+        Returns:
+            Dictionary with the "input_tokens" and "output_tokens" of the
+            request, or None if the engine did not report them
+        """
+        return getattr(self._last_usage, "value", None)
+
+    def generate_content(self, contents: Contents) -> str:
+        """
+        Run OCR on the images of a request.
+
+        Args:
+            contents: Prompt strings and image parts, in order
+
+        Returns:
+            Response text
+        """
+        raise NotImplementedError
+
+    def check_health(self) -> None:
+        """
+        Check that the engine can answer requests, without running OCR.
+
+        Raises:
+            Exception: If the engine is unavailable
+        """
+
+    def close(self) -> None:
+        """
+        Release the connections held by the backend.
+        """
+
+
+class GeminiBackend(OCRBackend):
+    """
+    OCR backend using the Gemini API.
+
+    The Gemini SDK and its gRPC stack take most of the startup time of the
+    package, so they are only imported when the backend is created.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model_name: str = DEFAULT_MODEL_NAME):
+        """
+        Initialize the Gemini backend.
+
+        Args:
+            api_key: Gemini API key (optional, will use environment variable if not provided)
+            model_name: Name of the Gemini model
+        """
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        # Load environment variables from .env file
+        load_dotenv()
+
+        # Get API key from parameter or environment variable
+        self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
+
+        if not self.api_key:
+            raise ValueError(
+                "Gemini API key not provided. Please set the GEMINI_API_KEY environment variable "
+                "or provide it as a parameter."
+            )
+
+        # Configure the Gemini API
+        self._genai = genai
+        genai.configure(api_key=self.api_key)
+
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def generate_content(self, contents: Contents) -> str:
+        """
+        Run OCR on the images of a request with Gemini.
+
+        Args:
+            contents: Prompt strings and image parts, in order
+
+        Returns:
+            Response text
+        """
+        response = self.model.generate_content(contents)
+
+        # The output tokens include the thinking tokens, which are billed as output too
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.total_token_count:
+            self._set_last_usage(usage.prompt_token_count, usage.total_token_count - usage.prompt_token_count)
+        else:
+            self._set_last_usage(None, None)
+        return response.text
+
+    def check_health(self) -> None:
+        """
+        Check that the API key is accepted and the model exists, with a model metadata request.
+        """
+        self._genai.get_model(f"models/{self.model_name}")
+
+
+class TesseractBackend(OCRBackend):
+    """
+    OCR backend running Tesseract locally on the CPU.
+
+    Tesseract ignores the prompt, so requests must contain a single image.
+    Requires the pytesseract and Pillow packages and the tesseract binary.
+    """
+
+    supports_batch = False
+    billed = False
+
+    def __init__(self, lang: str = "eng"):
+        """
+        Initialize the Tesseract backend.
+
+        Args:
+            lang: Tesseract language code(s), e.g. "eng" or "eng+deu"
+        """
+        try:
+            import pytesseract
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError(
+                "The tesseract backend requires pytesseract and Pillow. "
+                "Install them with: pip install pytesseract Pillow"
+            )
+
+        self._pytesseract = pytesseract
+        self._image_module = Image
+        self.lang = lang
+        self.model_name = f"tesseract-{pytesseract.get_tesseract_version()}-{lang}"
+
+    def generate_content(self, contents: Contents) -> str:
+        """
+        Run Tesseract on the image of a request.
+
+        Args:
+            contents: Prompt strings and exactly one image part
+
+        Returns:
+            Extracted text
+        """
+        images = [part for part in contents if isinstance(part, dict)]
+        if len(images) != 1:
+            raise ValueError(f"The tesseract backend processes one image per request, got {len(images)}")
+
+        image = self._image_module.open(io.BytesIO(base64.b64decode(images[0]["data"])))
+        return self._pytesseract.image_to_string(image, lang=self.lang)
+
+
+class HTTPBackend(OCRBackend):
+    """
+    OCR backend posting requests to an HTTP server, such as the stub OCR server.
+
+    The request body is a JSON object {"contents": [...]} and the response a
+    JSON object {"text": "..."}, optionally with the token usage of the
+    request as {"usage": {"input_tokens": ..., "output_tokens": ...}}. Connections are kept alive and pooled, so
+    consecutive requests from any thread reuse established connections
+    instead of paying for a new connection every time.
+    """
+
+    def __init__(self, url: str = DEFAULT_STUB_URL, timeout: float = 60, model_name: str = "stub",
+                 pool_size: int = 8):
+        """
+        Initialize the HTTP backend.
+
+        Args:
+            url: Base URL of the server; requests are posted to <url>/ocr
+            timeout: Timeout of a request in seconds
+            model_name: Name identifying the server's engine in cache keys
+            pool_size: Maximum number of idle connections kept open
+        """
+        parsed = urllib.parse.urlsplit(url.rstrip("/"))
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported OCR server URL: {url}")
+
+        self.url = url.rstrip("/") + "/ocr"
+        self.timeout = timeout
+        self.model_name = model_name
+        self._scheme = parsed.scheme
+        self._netloc = parsed.netloc
+        self._path = parsed.path
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        """
+        Open a new connection to the server.
+
+        Returns:
+            Unconnected HTTP(S) connection (connects on the first request)
+        """
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self._netloc, timeout=self.timeout)
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        """
+        Return a connection to the pool, or close it if the pool is full.
+
+        Args:
+            connection: Connection whose last response was read completely
+        """
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send a request on a pooled connection.
+
+        A pooled connection may have been closed by the server since its last
+        use, so a request failing on a reused connection before any response
+        is sent again once on a new connection.
+
+        Args:
+            method: HTTP method
+            path: Path relative to the base URL
+            body: Request body (optional)
+
+        Returns:
+            Tuple of the status code, response headers and response body
+        """
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+
+        while True:
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._new_connection(), False
+
+            try:
+                connection.request(method, self._path + path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (ConnectionError, http.client.BadStatusLine):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, dict(response.getheaders()), data
+
+    def generate_content(self, contents: Contents) -> str:
+        """
+        Post a request to the server.
+
+        Args:
+            contents: Prompt strings and image parts, in order
+
+        Returns:
+            Response text
+        """
+        status, headers, data = self._request("POST", "/ocr", json.dumps({"contents": contents}).encode("utf-8"))
+        if status >= 400:
+            raise OCRBackendError(
+                f"HTTP {status}: {data.decode('utf-8', 'replace')}",
+                status_code=status,
+                retry_after=parse_retry_after(headers.get("Retry-After")),
+            )
+        response = json.loads(data.decode("utf-8"))
+        usage = response.get("usage") or {}
+        self._set_last_usage(usage.get("input_tokens"), usage.get("output_tokens"))
+        return response["text"]
+
+    def check_health(self) -> None:
+        """
+        Check that the server answers its health endpoint (<url>/healthz).
+        """
+        status, _, data = self._request("GET", "/healthz")
+        if status != 200:
+            raise OCRBackendError(f"HTTP {status}: {data.decode('utf-8', 'replace')}", status_code=status)
+
+    def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def create_backend(name: str, api_key: Optional[str] = None, url: Optional[str] = None,
+                   lang: str = "eng") -> OCRBackend:
+    """
+    Create an OCR backend by name.
+
+    Args:
+        name: "gemini", "tesseract" or "stub"
+        api_key: Gemini API key (gemini only, optional)
+        url: Server URL (stub only, optional, default: DEFAULT_STUB_URL)
+        lang: Tesseract language code(s) (tesseract only)
+
+    Returns:
+        OCR backend
+    """
+    if name == "gemini":
+        return GeminiBackend(api_key=api_key)
+    if name == "tesseract":
+        return TesseractBackend(lang=lang)
+    if name == "stub":
+        return HTTPBackend(url or DEFAULT_STUB_URL)
+    raise ValueError(f"Unknown OCR backend: {name}")
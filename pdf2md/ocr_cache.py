@@ -0,0 +1,251 @@
+"""
+Module for caching OCR results on disk.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class OCRCache:
+    """
+    Persistent, content-addressed cache of OCR results backed by SQLite.
+
+    Page results are keyed by a hash of the page image bytes, the model name
+    and the prompt, so the same page rendered the same way is never sent to
+    the API twice. Whole documents are keyed by a hash of the PDF file and
+    the conversion settings, and map straight to the final Markdown. The
+    least recently used entries are evicted once the cache grows beyond
+    ``max_size_bytes``. The total size is kept in a metadata row updated in
+    the same transaction as the entries, so storing an entry does not scan
+    the whole cache.
+    """
+
+    def __init__(self, db_path: str, max_size_bytes: int = 512 * 1024 * 1024):
+        """
+        Initialize the OCR cache.
+
+        Args:
+            db_path: Path to the SQLite database file (created if missing)
+            max_size_bytes: Maximum total size of the cached text in bytes
+        """
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.stats = {"hits": 0, "misses": 0, "document_hits": 0, "document_misses": 0, "evictions": 0}
+
+        # A single connection shared by all OCR worker threads, guarded by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+            # Caches created before the metadata table existed are summed up once, when opened
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (name, value) "
+                "SELECT 'total_size', COALESCE(SUM(size), 0) FROM entries"
+            )
+
+    @staticmethod
+    def page_key(image_bytes: bytes, model_name: str, prompt: str) -> str:
+        """
+        Compute the cache key of a page.
+
+        Args:
+            image_bytes: Encoded page image
+            model_name: Name of the OCR model
+            prompt: Prompt sent along with the image
+
+        Returns:
+            Hex digest identifying the page result
+        """
+        digest = hashlib.sha256()
+        for part in (model_name.encode("utf-8"), prompt.encode("utf-8"), image_bytes):
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    @staticmethod
+    def document_key(pdf_path: str, *settings) -> str:
+        """
+        Compute the cache key of a whole document.
+
+        Args:
+            pdf_path: Path to the PDF file
+            *settings: Conversion settings that affect the output (model, DPI, ...)
+
+        Returns:
+            Hex digest identifying the document result
+        """
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(repr(settings).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get(self, key: str, kind: str) -> Optional[str]:
+        """
+        Look up an entry and mark it as recently used.
+
+        Args:
+            key: Cache key
+            kind: Entry kind ("page" or "document")
+
+        Returns:
+            Cached value, or None if not present
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND kind = ?", (key, kind)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def _put(self, key: str, kind: str, value: str) -> None:
+        """
+        Store an entry and evict the least recently used entries if needed.
+
+        Args:
+            key: Cache key
+            kind: Entry kind ("page" or "document")
+            value: Value to store
+        """
+        size = len(value.encode("utf-8"))
+        with self._lock, self._conn:
+            # A replaced entry no longer counts towards the total
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, value, size, time.time()),
+            )
+            total_size = self._add_to_total(size - (row[0] if row else 0))
+            self._evict(total_size)
+
+    def _add_to_total(self, delta: int) -> int:
+        """
+        Update the total size of the entries.
+
+        Must be called with the lock held and inside a transaction.
+
+        Args:
+            delta: Change of the total size in bytes
+
+        Returns:
+            New total size in bytes
+        """
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_size'", (delta,))
+        return self._conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+
+    def _evict(self, total_size: int) -> None:
+        """
+        Delete the least recently used entries until the cache fits its size limit.
+
+        Must be called with the lock held and inside a transaction.
+
+        Args:
+            total_size: Current total size of the entries in bytes
+        """
+        evicted_size = 0
+        while total_size - evicted_size > self.max_size_bytes:
+            # Walk the last_access index a few entries at a time rather than reading every row
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total_size - evicted_size <= self.max_size_bytes:
+                    break
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                evicted_size += size
+                self.stats["evictions"] += 1
+
+        if evicted_size:
+            self._add_to_total(-evicted_size)
+
+    def get_page(self, key: str) -> Optional[str]:
+        """
+        Look up the OCR text of a page.
+
+        Args:
+            key: Page key from page_key
+
+        Returns:
+            Cached OCR text, or None on a miss
+        """
+        text = self._get(key, "page")
+        with self._lock:
+            self.stats["hits" if text is not None else "misses"] += 1
+        return text
+
+    def put_page(self, key: str, text: str) -> None:
+        """
+        Store the OCR text of a page.
+
+        Args:
+            key: Page key from page_key
+            text: OCR text of the page
+        """
+        self._put(key, "page", text)
+
+    def get_document(self, key: str) -> Optional[str]:
+        """
+        Look up the Markdown of a whole document.
+
+        Args:
+            key: Document key from document_key
+
+        Returns:
+            Cached Markdown, or None on a miss
+        """
+        markdown = self._get(key, "document")
+        with self._lock:
+            self.stats["document_hits" if markdown is not None else "document_misses"] += 1
+        return markdown
+
+    def put_document(self, key: str, markdown: str) -> None:
+        """
+        Store the Markdown of a whole document.
+
+        Args:
+            key: Document key from document_key
+            markdown: Markdown generated for the document
+        """
+        self._put(key, "document", markdown)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            Dictionary of hit, miss and eviction counters plus the entry count and size
+        """
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+        return dict(self.stats, entries=count, size_bytes=size)
+
+    def close(self) -> None:
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
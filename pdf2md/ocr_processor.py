@@ -1,118 +1,668 @@
 """
-Module for OCR processing using Gemini 2.5 Flash API.
+Module for OCR processing using Gemini 2.5 Flash API or another OCR backend.
 """
 
 import base64
 import os
+import re
+import threading
 import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar, Union
 
-import google.generativeai as genai
-from dotenv import load_dotenv
-from tqdm import tqdm
+from pdf2md.budget import CostEstimator, TokenBudget, estimate_request_tokens, image_size
+from pdf2md.markdown_generator import MarkdownGenerator
+from pdf2md.ocr_backends import GeminiBackend, OCRBackend
+from pdf2md.metrics import Metrics
+from pdf2md.ocr_cache import OCRCache
+from pdf2md.pdf_processor import RenderedPage
+from pdf2md.rate_limiter import RateLimiter
+from pdf2md.retry import Retrier, is_retryable
+
+T = TypeVar("T")
+
+# Prompt sent along with every page image
+OCR_PROMPT = """
+        Please perform OCR on this image and extract all the text content. 
+        Return ONLY the extracted text, preserving the original formatting as much as possible.
+        Do not add any explanations, headers, or additional content.
+        """
+
+# Prompt sent along with a batch of page images; {count} is the number of pages
+BATCH_OCR_PROMPT = """
+        Please perform OCR on each of the following {count} images and extract all the text content.
+        Each image is a separate page. For every page, in order, output a line of the form
+        ===== PAGE <number> =====
+        followed by the text of that page only.
+        Return ONLY the extracted text, preserving the original formatting as much as possible.
+        Do not add any explanations, headers, or additional content.
+        """
+
+# Delimiter line preceding the text of each page in a batch response
+_PAGE_DELIMITER = re.compile(r"^[ \t]*=====[ \t]*PAGE[ \t]+(\d+)[ \t]*=====[ \t]*$", re.MULTILINE)
 
 
 class OCRProcessor:
     """
-    Class for OCR processing using Gemini 2.5 Flash API.
+    Class for OCR processing using Gemini 2.5 Flash API or another OCR backend.
+
+    All OCR calls made through the processor run on one worker pool of
+    ``max_workers`` threads, created on first use. Several documents can be
+    streamed through the same processor concurrently and share that pool.
+
+    With ``batch_size`` above 1, streamed pages are OCR'd in batches: up to
+    ``batch_size`` page images are sent in a single request and the response
+    is split back into pages. A batch whose request fails or whose response
+    cannot be split is processed again one page at a time. Backends that
+    cannot follow the batch prompt always get one page per request.
+
+    The token usage reported by the backend is recorded in the metrics and,
+    with an ``estimator``, priced and added to its usage history. With a
+    ``budget``, no request is sent once the budget is exhausted.
     """
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, max_workers: int = 1,
+                 requests_per_minute: Optional[float] = None, cache: Optional[OCRCache] = None,
+                 batch_size: int = 1, backend: Optional[OCRBackend] = None,
+                 retrier: Optional[Retrier] = None, metrics: Optional[Metrics] = None,
+                 estimator: Optional[CostEstimator] = None, budget: Optional[TokenBudget] = None):
         """
         Initialize the OCR processor.
 
         Args:
             api_key: Gemini API key (optional, will use environment variable if not provided)
+            max_workers: Maximum number of OCR requests in flight at once
+            requests_per_minute: Maximum number of API requests per minute (optional, default: unlimited)
+            cache: Cache of OCR results, consulted before every API call (optional)
+            batch_size: Maximum number of page images sent in one request
+            backend: OCR engine answering the requests (optional, default: Gemini)
+            retrier: Retry policy and circuit breaker shared by all requests (optional,
+                     default: Retrier())
+            metrics: Metrics recording request timings, upload sizes and token usage (optional)
+            estimator: Cost estimator pricing the token usage and recording it in its history (optional)
+            budget: Budget checked before every request (optional, default: unlimited)
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        self.cache = cache
+        self.retrier = retrier or Retrier()
+        self.metrics = metrics or Metrics()
+        self.estimator = estimator
+        self.budget = budget
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        # Use the Gemini API unless another backend is given
+        self.backend = backend or GeminiBackend(api_key=api_key)
+        self.model_name = self.backend.model_name
+        if not self.backend.supports_batch:
+            self.batch_size = 1
+
+    def _read_image(self, image: Union[str, bytes]) -> bytes:
         """
-        # Load environment variables from .env file
-        load_dotenv()
-        
-        # Get API key from parameter or environment variable
-        self.api_key = api_key or os.environ.get("GEMINI_API_KEY")
-        
-        if not self.api_key:
-            raise ValueError(
-                "Gemini API key not provided. Please set the GEMINI_API_KEY environment variable "
-                "or provide it as a parameter."
-            )
-        
-        # Configure the Gemini API
-        genai.configure(api_key=self.api_key)
-        
-        # Initialize the Gemini model (using specified model for OCR)
-        # 使用用户指定的 gemini-2.5-flash-preview-04-17 模型
-        self.model = genai.GenerativeModel('gemini-2.5-flash-preview-04-17')
-    
-    def _encode_image(self, image_path: str) -> str:
-        """
-        Encode an image file to base64.
-
-        Args:
-            image_path: Path to the image file
+        Read the encoded bytes of an image.
+
+        Args:
+            image: Path to the image file, or the encoded image bytes
+
+        Returns:
+            Encoded image bytes
+        """
+        if isinstance(image, bytes):
+            return image
+
+        with open(image, "rb") as image_file:
+            return image_file.read()
+
+    def _encode_image(self, image: Union[str, bytes]) -> str:
+        """
+        Encode an image to base64.
+
+        Args:
+            image: Path to the image file, or the encoded image bytes
 
         Returns:
             Base64-encoded image data
         """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
-    
-    def process_image(self, image_path: str, max_retries: int = 3, retry_delay: int = 2) -> str:
+        return base64.b64encode(self._read_image(image)).decode("utf-8")
+
+    def _get_mime_type(self, image: Union[str, bytes]) -> str:
+        """
+        Determine the MIME type of an image.
+
+        Args:
+            image: Path to the image file, or the encoded image bytes
+
+        Returns:
+            MIME type of the image (defaults to image/png)
+        """
+        if isinstance(image, bytes):
+            if image.startswith(b"\xff\xd8"):
+                return "image/jpeg"
+            if image[:4] == b"RIFF" and image[8:12] == b"WEBP":
+                return "image/webp"
+            return "image/png"
+
+        suffix = Path(image).suffix.lower()
+        if suffix in (".jpg", ".jpeg"):
+            return "image/jpeg"
+        if suffix == ".webp":
+            return "image/webp"
+        return "image/png"
+
+    def _make_image_part(self, image_bytes: bytes) -> Dict[str, str]:
+        """
+        Build the image part of an OCR request.
+
+        Args:
+            image_bytes: Encoded image bytes
+
+        Returns:
+            Dictionary with the MIME type and base64-encoded data of the image
+        """
+        with self.metrics.timer("encode"):
+            return {"mime_type": self._get_mime_type(image_bytes), "data": self._encode_image(image_bytes)}
+
+    def _record_usage(self, prompt_parts: List[str], images: List[bytes], pages: float) -> None:
+        """
+        Record the token usage of the request just sent by this thread.
+
+        Args:
+            prompt_parts: Prompt and label strings of the request
+            images: Encoded images of the request
+            pages: Number of source pages the images cover (a tile counts as a fraction of its page)
+        """
+        usage = self.backend.get_last_usage()
+        if usage is None or not self.backend.billed:
+            return
+
+        input_tokens, output_tokens = usage["input_tokens"], usage["output_tokens"]
+        self.metrics.increment("input_tokens", input_tokens)
+        self.metrics.increment("output_tokens", output_tokens)
+
+        cost = 0.0
+        if self.estimator is not None:
+            cost = self.estimator.cost(input_tokens, output_tokens)
+            self.metrics.increment("cost", cost)
+
+            # Keep the predicted tokens next to the reported ones to calibrate future estimates
+            if self.estimator.history is not None:
+                estimated_tokens = estimate_request_tokens(prompt_parts, [image_size(image) for image in images])
+                self.estimator.history.record(
+                    self.model_name, pages, len(images), estimated_tokens, input_tokens, output_tokens, cost
+                )
+
+        if self.budget is not None:
+            self.budget.add(input_tokens + output_tokens, cost)
+
+    def get_settings(self) -> tuple:
+        """
+        Get the settings that affect the OCR output.
+
+        Returns:
+            Tuple of the model name, the prompt and, when batching, the batch size
+        """
+        if self.batch_size == 1:
+            return (self.model_name, OCR_PROMPT)
+        return (self.model_name, BATCH_OCR_PROMPT, self.batch_size)
+
+    def process_image(self, image: Union[str, bytes], max_retries: Optional[int] = None, pages: float = 1.0) -> str:
         """
         Process a single image with OCR.
 
+        Retryable errors (rate limits, server errors, timeouts) are retried
+        with exponential backoff; other errors fail immediately.
+
         Args:
-            image_path: Path to the image file
-            max_retries: Maximum number of retries on failure
-            retry_delay: Delay between retries in seconds
+            image: Path to the image file, or the encoded image bytes
+            max_retries: Maximum number of attempts (optional, default: from the retry policy)
+            pages: Number of source pages the image covers, for the usage history
+                   (default: 1, a tile covers a fraction of its page)
 
         Returns:
             Extracted text from the image
         """
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
-        
-        # Prepare the prompt for OCR
-        prompt = """
-        Please perform OCR on this image and extract all the text content. 
-        Return ONLY the extracted text, preserving the original formatting as much as possible.
-        Do not add any explanations, headers, or additional content.
+        if isinstance(image, bytes):
+            image_name = "<in-memory image>"
+        else:
+            image_name = image
+            if not os.path.exists(image):
+                raise FileNotFoundError(f"Image file not found: {image}")
+
+        image_bytes = self._read_image(image)
+
+        # Serve the page from the cache if it has been OCR'd before
+        cache_key = None
+        if self.cache is not None:
+            cache_key = OCRCache.page_key(image_bytes, self.model_name, OCR_PROMPT)
+            cached_text = self.cache.get_page(cache_key)
+            if cached_text is not None:
+                return cached_text
+
+        start_time = time.perf_counter()
+
+        # Create the image part for the API request once, not on every attempt
+        image_data = self._make_image_part(image_bytes)
+
+        def send_request() -> str:
+            # Wait for the rate limiter before each API call, including retries
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            # Generate content using the OCR backend
+            self.metrics.increment("upload_bytes", len(image_data["data"]))
+            with self.metrics.timer("ocr_request"):
+                response_text = self.backend.generate_content([OCR_PROMPT, image_data])
+            self._record_usage([OCR_PROMPT], [image_bytes], pages)
+            return response_text
+
+        # Do not start a request once the budget is spent
+        if self.budget is not None:
+            self.budget.check()
+
+        text = self.retrier.call(send_request, f"image {image_name}", max_attempts=max_retries)
+        self.metrics.observe("ocr_page", time.perf_counter() - start_time)
+
+        # Remember the text for next time
+        if cache_key:
+            self.cache.put_page(cache_key, text)
+        return text
+
+    def process_images(self, image_paths: List[Union[str, bytes]]) -> List[str]:
+        """
+        Process multiple images with OCR.
+
+        Up to ``max_workers`` images are processed concurrently; the results
+        are always returned in the order of ``image_paths``.
+
+        Args:
+            image_paths: List of paths to image files, or encoded image bytes
+
+        Returns:
+            List of extracted text from each image
+        """
+        from tqdm import tqdm
+
+        if self.max_workers == 1:
+            results = []
+
+            for image_path in tqdm(image_paths, desc="Processing images with OCR"):
+                text = self.process_image(image_path)
+                results.append(text)
+
+            return results
+
+        # executor.map yields results in submission order
+        return list(tqdm(
+            self._get_executor().map(self.process_image, image_paths),
+            total=len(image_paths),
+            desc="Processing images with OCR",
+        ))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        Get the shared OCR worker pool, creating it on first use.
+
+        Returns:
+            Thread pool with max_workers threads
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="pdf2md-ocr"
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """
+        Shut down the shared OCR worker pool and close the backend's idle connections.
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.backend.close()
+
+    def process_page(self, page: RenderedPage) -> str:
+        """
+        Get the text of a page, running OCR only if it has no extracted text.
+
+        The tiles of a tiled page are OCR'd one after another and stitched
+        back together.
+
+        Args:
+            page: Page produced by PDFProcessor.iter_pages
+
+        Returns:
+            Text of the page
+        """
+        if not page.needs_ocr:
+            return page.text
+        if page.tiles:
+            share = 1 / len(page.tiles)
+            return MarkdownGenerator.stitch_tiles([self.process_image(tile, pages=share) for tile in page.tiles])
+        return self.process_image(page.image)
+
+    @staticmethod
+    def _split_batch_response(text: str, count: int) -> Optional[List[str]]:
+        """
+        Split the response to a batch request into the text of each page.
+
+        Args:
+            text: Response text
+            count: Number of pages in the batch
+
+        Returns:
+            Text of each page, or None if the delimiters are missing, out of
+            order or preceded by other text
+        """
+        matches = list(_PAGE_DELIMITER.finditer(text))
+        if [int(match.group(1)) for match in matches] != list(range(1, count + 1)):
+            return None
+        if text[:matches[0].start()].strip():
+            return None
+
+        ends = [match.start() for match in matches[1:]] + [len(text)]
+        return [text[match.end():end].strip("\n") for match, end in zip(matches, ends)]
+
+    @staticmethod
+    def _describe_batch(page_nums: Optional[List[int]], count: int) -> str:
+        """
+        Describe the images of a batch request for messages.
+
+        Args:
+            page_nums: Zero-based page number of each image, or None if unknown
+            count: Number of images in the request
+
+        Returns:
+            Description naming the batch's pages, e.g. "the batch of pages 3-7"
+        """
+        if not page_nums:
+            return f"a batch of {count} images"
+        numbers = sorted(set(page_num + 1 for page_num in page_nums))
+        if len(numbers) == 1:
+            return f"the batch of {count} tiles of page {numbers[0]}"
+        if numbers[-1] - numbers[0] == len(numbers) - 1:
+            return f"the batch of pages {numbers[0]}-{numbers[-1]}"
+        return f"the batch of pages {', '.join(str(number) for number in numbers)}"
+
+    def process_batch(self, images: List[Union[str, bytes]], page_nums: Optional[List[int]] = None,
+                      return_exceptions: bool = False) -> List[Union[str, Exception]]:
         """
-        
-        # Retry logic for API calls
-        for attempt in range(max_retries):
+        Process several images with OCR in a single request.
+
+        Cached images are not sent again. A request failing with a retryable
+        error is retried as a whole, following the retry policy. If it fails
+        with a fatal error or its response cannot be split into pages, the
+        images are processed one at a time instead.
+
+        Args:
+            images: Paths to image files, or encoded image bytes
+            page_nums: Zero-based page number of each image, used in messages and to count
+                       the source pages of the request (optional, the tiles of a page share its number)
+            return_exceptions: Whether to return the exception of an image that failed
+                               instead of raising it
+
+        Returns:
+            Extracted text (or exception) from each image, in input order
+        """
+        texts: List[Union[str, Exception, None]] = [None] * len(images)
+        image_bytes = [self._read_image(image) for image in images]
+
+        # Serve pages from the cache if they have been OCR'd before, alone or in a batch
+        cache_keys = [None] * len(images)
+        if self.cache is not None:
+            for index, data in enumerate(image_bytes):
+                cache_keys[index] = OCRCache.page_key(data, self.model_name, OCR_PROMPT)
+                texts[index] = self.cache.get_page(cache_keys[index])
+
+        # Share of a source page covered by each image, so tiles of one page add up to one page
+        shares = [1.0] * len(images)
+        if page_nums:
+            tiles_per_page = Counter(page_nums)
+            shares = [1 / tiles_per_page[page_num] for page_num in page_nums]
+
+        missing = [index for index, text in enumerate(texts) if text is None]
+
+        # Keep the texts of the other images when one of them fails, if asked
+        process_image = self.process_image
+        if return_exceptions:
+            process_image = self._capture_exceptions(self.process_image)
+
+        if len(missing) == 1:
+            texts[missing[0]] = process_image(images[missing[0]], pages=shares[missing[0]])
+        elif missing:
+            # Label every image with its position so the response can be split
+            contents = [BATCH_OCR_PROMPT.format(count=len(missing))]
+            for position, index in enumerate(missing, start=1):
+                contents.append(f"Page {position}:")
+                contents.append(self._make_image_part(image_bytes[index]))
+            upload_bytes = sum(len(part["data"]) for part in contents if isinstance(part, dict))
+            description = self._describe_batch([page_nums[index] for index in missing] if page_nums else None, len(missing))
+
+            def send_request() -> str:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire()
+                self.metrics.increment("upload_bytes", upload_bytes)
+                with self.metrics.timer("ocr_request"):
+                    response_text = self.backend.generate_content(contents)
+                self._record_usage(
+                    [part for part in contents if isinstance(part, str)], [image_bytes[index] for index in missing],
+                    sum(shares[index] for index in missing),
+                )
+                return response_text
+
+            if self.budget is not None:
+                self.budget.check()
+
+            # Rate limits and server errors are retried as a whole; only a batch the server
+            # rejects, or whose response cannot be split, is split into single pages
+            page_texts = None
             try:
-                # Create the image part for the API request
-                image_data = {"mime_type": "image/png", "data": self._encode_image(image_path)}
-                
-                # Generate content using the Gemini API
-                response = self.model.generate_content([prompt, image_data])
-                
-                # Extract and return the text
-                return response.text
-                
+                response_text = self.retrier.call(send_request, description)
+                page_texts = self._split_batch_response(response_text, len(missing))
+                if page_texts is None:
+                    print(f"Could not split the OCR response for {description}")
             except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"Error processing image {image_path}: {e}")
-                    print(f"Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                    time.sleep(retry_delay)
-                else:
-                    raise RuntimeError(f"Failed to process image after {max_retries} attempts: {e}")
-    
-    def process_images(self, image_paths: List[str]) -> List[str]:
+                if e.__cause__ is None or is_retryable(e.__cause__):
+                    if not return_exceptions:
+                        raise
+                    for index in missing:
+                        texts[index] = e
+                    return texts
+                print(f"Error processing {description}: {e.__cause__}")
+
+            if page_texts is None:
+                print("Processing the pages of the batch one at a time...")
+                for index in missing:
+                    texts[index] = process_image(images[index], pages=shares[index])
+            else:
+                for index, text in zip(missing, page_texts):
+                    texts[index] = text
+                    if cache_keys[index]:
+                        self.cache.put_page(cache_keys[index], text)
+
+        return texts
+
+    def _process_page_batch(self, pages: List[RenderedPage],
+                            return_exceptions: bool = False) -> List[Union[str, Exception]]:
         """
-        Process multiple images with OCR.
+        Get the text of a batch of pages, OCR'ing those that need it in one request.
 
         Args:
-            image_paths: List of paths to image files
+            pages: Pages produced by PDFProcessor.iter_pages
+            return_exceptions: Whether to return the exception of a page that failed
+                               instead of raising it
 
         Returns:
-            List of extracted text from each image
+            Text (or exception) of each page, in input order
         """
-        results = []
-        
-        for image_path in tqdm(image_paths, desc="Processing images with OCR"):
-            text = self.process_image(image_path)
-            results.append(text)
-        
+        results: List[Union[str, Exception]] = [page.text for page in pages]
+        ocr_indexes = [index for index, page in enumerate(pages) if page.needs_ocr]
+        if not ocr_indexes:
+            return results
+
+        # Send the tiles of tiled pages as images of the batch, remembering which images belong to which page
+        images, page_nums, spans = [], [], []
+        for index in ocr_indexes:
+            page_images = pages[index].images
+            spans.append((index, len(images), len(images) + len(page_images)))
+            images.extend(page_images)
+            page_nums.extend([pages[index].page_num] * len(page_images))
+
+        try:
+            texts = self.process_batch(images, page_nums, return_exceptions)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            # Nothing was sent, e.g. the budget ran out: every page of the batch fails with the error
+            texts = [e] * len(images)
+
+        # A page fails if any of its tiles failed
+        for index, start, end in spans:
+            page_texts = texts[start:end]
+            error = next((text for text in page_texts if isinstance(text, Exception)), None)
+            if error is not None:
+                results[index] = error
+            elif pages[index].tiles:
+                results[index] = MarkdownGenerator.stitch_tiles(page_texts)
+            else:
+                results[index] = page_texts[0]
+
         return results
+
+    @staticmethod
+    def _iter_chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+        """
+        Group a stream of items into lists of consecutive items.
+
+        Args:
+            items: Iterable of items (may be a generator)
+            size: Maximum number of items per list
+
+        Yields:
+            Lists of up to size items, in input order
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _iter_ordered(self, func: Callable[[T], str], items: Iterable[T],
+                      return_exceptions: bool = False) -> Iterator[Union[str, Exception]]:
+        """
+        Lazily apply a function to a stream of items using the worker pool.
+
+        Items are pulled only as fast as OCR capacity allows, so at most
+        ``max_workers`` items of this stream are in flight at any time. Results
+        are yielded in input order as soon as they are available.
+
+        Args:
+            func: Function to apply to each item
+            items: Iterable of items (may be a generator)
+            return_exceptions: Whether to yield the exception raised for an item
+                               instead of propagating it
+
+        Yields:
+            Result (or exception) for each item, in input order
+        """
+        if return_exceptions:
+            func = self._capture_exceptions(func)
+
+        executor = self._get_executor()
+        pending = deque()
+
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+
+                # Wait for the oldest item once the pool is saturated
+                if len(pending) >= self.max_workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Do not leave work queued on the shared pool if the stream is abandoned
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _capture_exceptions(func: Callable[..., str]) -> Callable[..., Union[str, Exception]]:
+        """
+        Wrap a function so that it returns the exception it raises instead of raising it.
+
+        Args:
+            func: Function to wrap
+
+        Returns:
+            Wrapped function
+        """
+        def wrapper(*args, **kwargs) -> Union[str, Exception]:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                return e
+
+        return wrapper
+
+    def iter_process_images(self, image_paths: Iterable[Union[str, bytes]]) -> Iterator[str]:
+        """
+        Lazily process a stream of images with OCR.
+
+        Args:
+            image_paths: Iterable of paths to image files or encoded image bytes
+                         (may be a generator)
+
+        Yields:
+            Extracted text from each image, in input order
+        """
+        return self._iter_ordered(self.process_image, image_paths)
+
+    def iter_process_pages(self, pages: Iterable[RenderedPage],
+                           return_exceptions: bool = False) -> Iterator[Union[str, Exception]]:
+        """
+        Lazily get the text of a stream of pages, OCR'ing only those that need it.
+
+        Args:
+            pages: Iterable of pages produced by PDFProcessor.iter_pages (may be a generator)
+            return_exceptions: Whether to yield the exception for a page that failed
+                               instead of aborting the whole stream
+
+        Yields:
+            Text (or exception) of each page, in input order
+        """
+        if self.batch_size == 1:
+            return self._iter_ordered(self.process_page, pages, return_exceptions)
+        return self._iter_batched_pages(pages, return_exceptions)
+
+    def _iter_batched_pages(self, pages: Iterable[RenderedPage],
+                            return_exceptions: bool = False) -> Iterator[Union[str, Exception]]:
+        """
+        Lazily get the text of a stream of pages, OCR'ing them in batches.
+
+        Args:
+            pages: Iterable of pages produced by PDFProcessor.iter_pages (may be a generator)
+            return_exceptions: Whether to yield the exception for a page that failed
+                               instead of aborting the whole stream
+
+        Yields:
+            Text (or exception) of each page, in input order
+        """
+        def process_chunk(chunk: List[RenderedPage]) -> List[Union[str, Exception]]:
+            return self._process_page_batch(chunk, return_exceptions)
+
+        for results in self._iter_ordered(process_chunk, self._iter_chunks(pages, self.batch_size)):
+            yield from results
@@ -2,14 +2,141 @@
 Module for converting PDF files to images.
 """
 
+import hashlib
+import io
+import math
+import multiprocessing
 import os
 import tempfile
-from pathlib import Path
-from typing import List, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-import fitz  # PyMuPDF
-import pdf2image
-from tqdm import tqdm
+from pdf2md.lazy_import import LazyModule
+from pdf2md.metrics import Metrics
+
+# PyMuPDF, imported on first use so that commands not touching a PDF start fast
+fitz = LazyModule("fitz")
+
+# Documents opened by a render worker process, keyed by (path, mtime, size)
+_worker_documents: "OrderedDict[Tuple, fitz.Document]" = OrderedDict()
+
+# Maximum number of documents a render worker process keeps open
+_WORKER_DOCUMENT_LIMIT = 4
+
+# Resolution of the grayscale preview used to find the content of a page
+_LAYOUT_PREVIEW_DPI = 50
+
+# Gray level below which a preview pixel counts as ink
+_INK_THRESHOLD = 200
+
+# Minimum number of ink pixels for a preview row to count as content, so
+# single specks of scanner noise do not stretch the content box
+_MIN_ROW_INK = 2
+
+# Translation table mapping ink pixels of a grayscale row to 1 and background to 0
+_INK_TABLE = bytes(1 if value < _INK_THRESHOLD else 0 for value in range(256))
+
+
+def _open_worker_document(pdf_path: str) -> "fitz.Document":
+    """
+    Open a document in a render worker process, reusing it across tasks.
+
+    Each worker opens a document once and keeps it open for every later
+    slice of pages it renders. The key includes the file's modification
+    time and size, so a file replaced on disk is opened again.
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+        Open PyMuPDF document
+    """
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+
+    if key in _worker_documents:
+        _worker_documents.move_to_end(key)
+        return _worker_documents[key]
+
+    while len(_worker_documents) >= _WORKER_DOCUMENT_LIMIT:
+        _, old_document = _worker_documents.popitem(last=False)
+        old_document.close()
+
+    document = fitz.open(pdf_path)
+    _worker_documents[key] = document
+    return document
+
+
+def _render_pages_in_worker(processor: "PDFProcessor", pdf_path: str, page_nums: Sequence[int],
+                            output_dir: Optional[str], in_memory: bool,
+                            extract_text: bool) -> Tuple[List["RenderedPage"], Metrics]:
+    """
+    Render a slice of pages in a render worker process.
+
+    Args:
+        processor: PDF processor holding the render settings
+        pdf_path: Path to the PDF file
+        page_nums: Zero-based numbers of the pages to render
+        output_dir: Directory to save the images (unused in in-memory mode)
+        in_memory: Whether to return encoded image bytes instead of writing files
+        extract_text: Whether to extract text from text-native pages
+
+    Returns:
+        Tuple of the rendered pages, in the order of page_nums, and the metrics
+        recorded while rendering them
+    """
+    document = _open_worker_document(pdf_path)
+    pages = [
+        processor._process_page_or_fallback(document, pdf_path, page_num, output_dir, in_memory, extract_text)
+        for page_num in page_nums
+    ]
+    return pages, processor.metrics
+
+
+class RenderedPage:
+    """
+    A single page produced by PDFProcessor.
+
+    A page carries either an image that still needs OCR, tiles of a tall
+    page that are OCR'd separately and stitched back together, or the text
+    extracted locally from the page's text layer.
+    """
+
+    def __init__(self, page_num: int, image: Union[str, bytes, None] = None, text: Optional[str] = None,
+                 tiles: Optional[List[Union[str, bytes]]] = None):
+        """
+        Initialize the rendered page.
+
+        Args:
+            page_num: Zero-based page number
+            image: Path to the rendered image, or its encoded bytes (optional)
+            text: Text extracted from the page's text layer (optional)
+            tiles: Paths to the rendered tiles, or their encoded bytes, from top
+                   to bottom (optional, instead of image)
+        """
+        self.page_num = page_num
+        self.image = image
+        self.text = text
+        self.tiles = tiles
+
+    @property
+    def images(self) -> List[Union[str, bytes]]:
+        """
+        All images of the page: its tiles, its single image, or nothing.
+        """
+        if self.tiles:
+            return list(self.tiles)
+        return [self.image] if self.image is not None else []
+
+    @property
+    def needs_ocr(self) -> bool:
+        """
+        Whether the page still has to be sent to OCR.
+        """
+        return self.text is None
 
 
 class PDFProcessor:
@@ -17,72 +144,921 @@ class PDFProcessor:
     Class for converting PDF files to images.
     """
 
-    def __init__(self, dpi: int = 300, image_format: str = "png"):
+    def __init__(self, dpi: int = 300, image_format: str = "png", extract_text: bool = False,
+                 min_text_chars: int = 50, max_image_coverage: float = 0.5, adaptive: bool = False,
+                 max_pixels: int = 4_000_000, min_dpi: int = 100, quality: int = 85,
+                 render_workers: int = 1, render_chunk_size: int = 4, crop: bool = False,
+                 crop_margin: float = 12.0, tile_ratio: Optional[float] = None,
+                 poppler_threads: Optional[int] = None, metrics: Optional[Metrics] = None):
         """
         Initialize the PDF processor.
 
         Args:
-            dpi: DPI for image conversion
-            image_format: Image format for conversion (png or jpg)
+            dpi: DPI for image conversion (the maximum DPI in adaptive mode)
+            image_format: Image format for conversion (png, jpg, webp, or auto to
+                          pick PNG or JPEG per page)
+            extract_text: Whether to extract text locally from pages with a usable
+                          text layer instead of rendering them for OCR
+            min_text_chars: Minimum number of characters for a text layer to be usable
+            max_image_coverage: Maximum fraction of the page covered by images for the
+                                page to be treated as text-native
+            adaptive: Whether to pick the DPI per page from its size and text, and to
+                      render pages without color in grayscale
+            max_pixels: Pixel budget of a rendered page in adaptive mode
+            min_dpi: Lowest DPI used in adaptive mode
+            quality: Quality of JPEG and WebP images (1-100)
+            render_workers: Number of processes rendering pages in parallel
+            render_chunk_size: Number of consecutive pages a render process handles per task
+            crop: Whether to render only the content of a page, without its blank margins
+            crop_margin: Blank border kept around the content when cropping, in points
+            tile_ratio: Maximum height of a tile relative to its width (optional, default:
+                        no tiling); pages whose content is taller are split into tiles at
+                        blank rows, which are OCR'd separately and stitched back together
+            poppler_threads: Number of pdftoppm processes used when rendering with
+                             pdf2image (optional, default: number of CPUs)
+            metrics: Metrics recording render timings and sizes (optional)
         """
+        if render_workers < 1:
+            raise ValueError("render_workers must be at least 1")
+        if tile_ratio is not None and tile_ratio <= 0:
+            raise ValueError("tile_ratio must be positive")
+
         self.dpi = dpi
+        self.extract_text = extract_text
+        self.min_text_chars = min_text_chars
+        self.max_image_coverage = max_image_coverage
+        self.adaptive = adaptive
+        self.max_pixels = max_pixels
+        self.min_dpi = min_dpi
+        self.quality = quality
+        self.render_workers = render_workers
+        self.render_chunk_size = render_chunk_size
+        self.crop = crop
+        self.crop_margin = crop_margin
+        self.tile_ratio = tile_ratio
+        self.poppler_threads = poppler_threads or os.cpu_count() or 1
+        self.metrics = metrics or Metrics()
+        self._render_pool = None
+        self._render_pool_lock = threading.Lock()
         self.image_format = image_format.lower()
-        if self.image_format not in ["png", "jpg", "jpeg"]:
-            raise ValueError("Image format must be png, jpg, or jpeg")
+        if self.image_format not in ["png", "jpg", "jpeg", "webp", "auto"]:
+            raise ValueError("Image format must be png, jpg, jpeg, webp, or auto")
         
         # Normalize jpg/jpeg
         if self.image_format == "jpg":
             self.image_format = "jpeg"
 
-    def convert_pdf_to_images_pymupdf(self, pdf_path: str, output_dir: Optional[str] = None) -> List[str]:
+    def __getstate__(self):
         """
-        Convert PDF to images using PyMuPDF.
+        Get the state sent to render worker processes, without the process pool.
+
+        Workers record into fresh metrics, which are sent back with every
+        slice of pages and merged into the processor's metrics.
+        """
+        state = self.__dict__.copy()
+        state["_render_pool"] = None
+        state["metrics"] = None
+        del state["_render_pool_lock"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore the state received by a render worker process.
+        """
+        self.__dict__.update(state)
+        self._render_pool_lock = threading.Lock()
+        self.metrics = Metrics()
+
+    def _get_render_pool(self) -> ProcessPoolExecutor:
+        """
+        Get the render process pool, creating it on first use.
+
+        Returns:
+            Process pool with render_workers processes
+        """
+        with self._render_pool_lock:
+            if self._render_pool is None:
+                # Spawn rather than fork: the pool is usually created from a thread
+                self._render_pool = ProcessPoolExecutor(
+                    max_workers=self.render_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._render_pool
+
+    def close(self) -> None:
+        """
+        Shut down the render process pool.
+        """
+        with self._render_pool_lock:
+            if self._render_pool is not None:
+                self._render_pool.shutdown(wait=True)
+                self._render_pool = None
+
+    def get_settings(self) -> Tuple:
+        """
+        Get the settings that affect the rendered output.
+
+        Returns:
+            Tuple of settings, suitable for building cache keys
+        """
+        return (
+            self.dpi, self.image_format, self.extract_text, self.min_text_chars,
+            self.max_image_coverage, self.adaptive, self.max_pixels, self.min_dpi, self.quality,
+            self.crop, self.crop_margin, self.tile_ratio,
+        )
+
+    def get_page_count(self, pdf_path: str) -> int:
+        """
+        Get the number of pages in a PDF.
 
         Args:
             pdf_path: Path to the PDF file
-            output_dir: Directory to save the images (optional)
 
         Returns:
-            List of paths to the generated images
+            Number of pages
+        """
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        try:
+            with fitz.open(pdf_path) as pdf_document:
+                return len(pdf_document)
+        except Exception as e:
+            # Count the pages with poppler, which renders the document when PyMuPDF cannot read it
+            try:
+                import pdf2image
+
+                return pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
+            except Exception:
+                raise e
+
+    def get_page_hashes(self, pdf_path: str) -> List[str]:
+        """
+        Hash the content of every page of a PDF.
+
+        A page's hash covers its content streams, the images and form
+        XObjects it draws, and its size and rotation, so it changes whenever
+        the rendered page can change. Pages appended to a document, or
+        edited, get new hashes while untouched pages keep theirs.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Hex digest of each page, in page order
+        """
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        hashes = []
+        with fitz.open(pdf_path) as pdf_document:
+            for page in pdf_document:
+                digest = hashlib.sha256()
+                digest.update(repr((tuple(page.rect), page.rotation)).encode("utf-8"))
+                for xref in page.get_contents():
+                    digest.update(pdf_document.xref_stream_raw(xref) or b"")
+
+                # Images and forms are referenced by name, so hash their data too
+                xrefs = {image[0] for image in page.get_images(full=True)}
+                xrefs.update(xobject[0] for xobject in page.get_xobjects())
+                for xref in sorted(xref for xref in xrefs if xref > 0):
+                    digest.update(pdf_document.xref_stream_raw(xref) or b"")
+
+                hashes.append(digest.hexdigest())
+        return hashes
+
+    def get_render_sizes(self, pdf_path: str, pages: Optional[Iterable[int]] = None) -> List[List[Tuple[int, int]]]:
+        """
+        Compute the size of the images every page would be rendered to, without rendering them.
+
+        Follows the same decisions as iter_pages (text layer, adaptive DPI,
+        cropping and tiling), so that the OCR cost of a document can be
+        estimated up front.
+
+        Args:
+            pdf_path: Path to the PDF file
+            pages: Zero-based page numbers (optional, default: all pages)
+
+        Returns:
+            For each page, the (width, height) in pixels of each of its images,
+            or an empty list if its text layer is used instead of OCR
+        """
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        sizes = []
+        with fitz.open(pdf_path) as pdf_document:
+            for page_num in (range(len(pdf_document)) if pages is None else pages):
+                page = pdf_document.load_page(page_num)
+                if self.extract_text and self.classify_page(page) == "text":
+                    sizes.append([])
+                    continue
+
+                page_sizes = []
+                for region in self._plan_regions(page):
+                    zoom = self._choose_dpi(page, region) / 72
+                    rect = (region if region is not None else page.rect) * fitz.Matrix(zoom, zoom)
+                    page_sizes.append((rect.irect.width, rect.irect.height))
+                sizes.append(page_sizes)
+        return sizes
+
+    def _get_text_dpi(self, page: "fitz.Page") -> Optional[int]:
+        """
+        Estimate the DPI needed to make the text of a page legible.
+
+        Small print needs more pixels per point than large print, so the DPI
+        is chosen to render the median font size at about 24 pixels.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            Suggested DPI, or None if the page has no text layer
+        """
+        sizes = sorted(
+            span["size"]
+            for block in page.get_text("dict")["blocks"]
+            for line in block.get("lines", [])
+            for span in line["spans"]
+            if span["text"].strip()
+        )
+        if not sizes:
+            return None
+
+        median_size = sizes[len(sizes) // 2]
+        return int(24 * 72 / max(median_size, 1))
+
+    def _choose_dpi(self, page: "fitz.Page", clip: Optional["fitz.Rect"] = None) -> int:
+        """
+        Choose the DPI for rendering a page.
+
+        Args:
+            page: PyMuPDF page
+            clip: Region of the page that is rendered (optional, default: the whole page)
+
+        Returns:
+            DPI to render the page at
+        """
+        if not self.adaptive:
+            return self.dpi
+
+        dpi = self.dpi
+        text_dpi = self._get_text_dpi(page)
+        if text_dpi is not None:
+            dpi = min(dpi, text_dpi)
+
+        # Keep the rendered region within the pixel budget
+        region = clip if clip is not None else page.rect
+        width_in, height_in = region.width / 72, region.height / 72
+        if width_in > 0 and height_in > 0:
+            budget_dpi = int((self.max_pixels / (width_in * height_in)) ** 0.5)
+            dpi = min(dpi, budget_dpi)
+
+        return max(self.min_dpi, dpi)
+
+    def _is_grayscale(self, page: "fitz.Page") -> bool:
+        """
+        Check whether a page has no color, using a low-resolution preview.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            True if every pixel of the preview is gray
+        """
+        preview = page.get_pixmap(matrix=fitz.Matrix(0.5, 0.5), colorspace=fitz.csRGB, alpha=False)
+        samples = preview.samples
+        return samples[0::3] == samples[1::3] == samples[2::3]
+
+    def _choose_format(self, page: "fitz.Page") -> str:
+        """
+        Choose the image format of a page.
+
+        In auto mode, pages dominated by photos are encoded as JPEG and all
+        other pages as PNG, which keeps text sharp and compresses well.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            Image format (png, jpeg or webp)
+        """
+        if self.image_format != "auto":
+            return self.image_format
+        if self._get_image_coverage(page) > self.max_image_coverage:
+            return "jpeg"
+        return "png"
+
+    def _render_page(self, page: "fitz.Page", clip: Optional["fitz.Rect"] = None,
+                     grayscale: Optional[bool] = None) -> "fitz.Pixmap":
+        """
+        Render a single page, or a region of it, to a pixmap.
+
+        Args:
+            page: PyMuPDF page
+            clip: Region of the page to render (optional, default: the whole page)
+            grayscale: Whether to render in grayscale (optional, default: in adaptive
+                       mode, if the page has no color)
+
+        Returns:
+            Rendered pixmap
+        """
+        dpi = self._choose_dpi(page, clip)
+        if grayscale is None:
+            grayscale = self.adaptive and self._is_grayscale(page)
+        colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+        return page.get_pixmap(
+            matrix=fitz.Matrix(dpi/72, dpi/72), colorspace=colorspace, alpha=False, clip=clip
+        )
+
+    def _find_ink_rows(self, page: "fitz.Page") -> Tuple[List[Optional[Tuple[int, int]]], int]:
+        """
+        Find the ink of a page in a low-resolution grayscale preview.
+
+        Works the same for text-native and scanned pages, as it looks at the
+        rendered pixels rather than the page layout.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            Tuple of the ink extent of every preview row, from top to bottom
+            (the first and last column containing ink, or None for blank rows),
+            and the width of the preview
+        """
+        scale = _LAYOUT_PREVIEW_DPI / 72
+        preview = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY, alpha=False)
+        samples, width, stride = preview.samples, preview.width, preview.stride
+
+        rows = []
+        for y in range(preview.height):
+            row = samples[y * stride:y * stride + width].translate(_INK_TABLE)
+            if row.count(1) < _MIN_ROW_INK:
+                rows.append(None)
+            else:
+                rows.append((row.find(1), row.rfind(1)))
+        return rows, width
+
+    def _plan_regions(self, page: "fitz.Page") -> List[Optional["fitz.Rect"]]:
+        """
+        Decide which regions of a page to render.
+
+        With cropping, the blank margins around the ink are left out. With
+        tiling, content taller than tile_ratio times its width is split into
+        tiles. Each cut is placed in the widest run of blank rows near its
+        ideal position, so lines of text are not cut in half and cuts tend to
+        fall between paragraphs.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            Regions to render from top to bottom ([None] for the whole page)
+        """
+        if not self.crop and self.tile_ratio is None:
+            return [None]
+
+        rows, width = self._find_ink_rows(page)
+        ink_rows = [y for y, row in enumerate(rows) if row is not None]
+        if not ink_rows:
+            # Nothing recognizable as ink; render the whole page rather than guess
+            return [None]
+
+        # Content box in preview pixels, or the whole preview without cropping
+        if self.crop:
+            top, bottom = ink_rows[0], ink_rows[-1] + 1
+            left = min(rows[y][0] for y in ink_rows)
+            right = max(rows[y][1] for y in ink_rows) + 1
+        else:
+            top, bottom, left, right = 0, len(rows), 0, width
+
+        # Split tall content into tiles of about equal height
+        cuts = [top]
+        if self.tile_ratio is not None:
+            count = math.ceil((bottom - top) / (self.tile_ratio * (right - left)))
+            tile_height = (bottom - top) / count
+            for index in range(1, count):
+                target = top + index * tile_height
+                cuts.append(self._find_cut(rows, target, tile_height / 4))
+        cuts.append(bottom)
+
+        # Convert preview pixels to page coordinates and add the margin
+        scale = _LAYOUT_PREVIEW_DPI / 72
+        margin = self.crop_margin if self.crop else 0
+        regions = []
+        for index, (start, end) in enumerate(zip(cuts, cuts[1:])):
+            # Blank tiles have nothing to OCR
+            if all(row is None for row in rows[start:end]):
+                continue
+            # Only the outer edges get a margin, so tiles do not overlap
+            region = fitz.Rect(
+                page.rect.x0 + left / scale - margin,
+                page.rect.y0 + start / scale - (margin if index == 0 else 0),
+                page.rect.x0 + right / scale + margin,
+                page.rect.y0 + end / scale + (margin if index == len(cuts) - 2 else 0),
+            ) & page.rect
+            if not region.is_empty:
+                regions.append(region)
+        return regions or [None]
+
+    @staticmethod
+    def _find_cut(rows: List[Optional[Tuple[int, int]]], target: float, window: float) -> int:
+        """
+        Find the preview row to cut a page at.
+
+        Args:
+            rows: Ink extent of every preview row, None for blank rows
+            target: Ideal row to cut at
+            window: Maximum distance of the cut from the target, in rows
+
+        Returns:
+            Middle row of the widest blank run within the window (the one
+            closest to the target among equally wide runs), or the target row
+            if the window contains no blank row
+        """
+        low = max(0, int(target - window))
+        high = min(len(rows), int(target + window) + 1)
+
+        best_key, best_row = None, int(target)
+        y = low
+        while y < high:
+            if rows[y] is not None:
+                y += 1
+                continue
+            start = y
+            while y < high and rows[y] is None:
+                y += 1
+            middle = (start + y) // 2
+            key = (y - start, -abs(middle - target))
+            if best_key is None or key > best_key:
+                best_key, best_row = key, middle
+        return best_row
+
+    def _encode_pixmap(self, pix: "fitz.Pixmap", image_format: str) -> bytes:
+        """
+        Encode a pixmap in the given image format.
+
+        Args:
+            pix: Rendered pixmap
+            image_format: Image format (png, jpeg or webp)
+
+        Returns:
+            Encoded image bytes
+        """
+        if image_format == "png":
+            return pix.tobytes("png")
+        if image_format == "jpeg":
+            return pix.tobytes("jpeg", jpg_quality=self.quality)
+
+        # PyMuPDF cannot write WebP, so go through Pillow
+        try:
+            return pix.pil_tobytes(format="WEBP", quality=self.quality)
+        except ImportError:
+            raise RuntimeError("WebP output requires Pillow. Install it with: pip install Pillow")
+
+    def _get_image_coverage(self, page: "fitz.Page") -> float:
+        """
+        Estimate the fraction of a page covered by images.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            Covered fraction of the page area (0.0 to 1.0)
+        """
+        page_rect = page.rect
+        if page_rect.is_empty:
+            return 0.0
+
+        image_area = 0.0
+        for image_info in page.get_image_info():
+            image_rect = fitz.Rect(image_info["bbox"]) & page_rect
+            if not image_rect.is_empty:
+                image_area += image_rect.width * image_rect.height
+
+        return min(1.0, image_area / (page_rect.width * page_rect.height))
+
+    def classify_page(self, page: "fitz.Page") -> str:
+        """
+        Classify a page as text-native or scanned.
+
+        A page is text-native when it has enough extractable text in real
+        fonts and is not dominated by images. Scans with an invisible OCR text
+        layer (full-page image, GlyphLessFont) or text that fails to decode
+        are treated as scanned, so they go through OCR.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            "text" for text-native pages, "scanned" for pages that need OCR
+        """
+        text = page.get_text("text")
+        if len(text.strip()) < self.min_text_chars:
+            return "scanned"
+
+        # Text that does not map to Unicode comes out as replacement characters
+        if text.count("\ufffd") > len(text) * 0.05:
+            return "scanned"
+
+        # Invisible text layers added by OCR tools use a placeholder font
+        font_names = [font[3] for font in page.get_fonts()]
+        if font_names and all("GlyphLess" in name for name in font_names):
+            return "scanned"
+
+        if self._get_image_coverage(page) > self.max_image_coverage:
+            return "scanned"
+
+        return "text"
+
+    def extract_page_text(self, page: "fitz.Page") -> str:
+        """
+        Extract the text of a text-native page.
+
+        Text blocks are returned in reading order and separated by blank
+        lines, which is the shape of text MarkdownGenerator expects from OCR.
+
+        Args:
+            page: PyMuPDF page
+
+        Returns:
+            Extracted text of the page
+        """
+        blocks = page.get_text("blocks", sort=True)
+        return "\n\n".join(
+            block[4].strip() for block in blocks if block[6] == 0 and block[4].strip()
+        )
+
+    def iter_pages(self, pdf_path: str, output_dir: Optional[str] = None, in_memory: bool = False,
+                   extract_text: Optional[bool] = None,
+                   pages: Optional[Iterable[int]] = None) -> Iterator[RenderedPage]:
+        """
+        Lazily convert PDF pages for OCR using PyMuPDF.
+
+        Each page is processed only when the next item is requested, so callers
+        can start working on the first pages before the rest are rendered. If
+        extract_text is enabled, text-native pages are not rendered at all and
+        carry their extracted text instead.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images (optional, unused in in-memory mode)
+            in_memory: Whether to return encoded image bytes instead of writing files
+            extract_text: Override of the processor's extract_text setting (optional)
+            pages: Zero-based numbers of the pages to process (optional, default: all pages)
+
+        Yields:
+            RenderedPage for each page, in page order
         """
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
+        if extract_text is None:
+            extract_text = self.extract_text
+
         # Create output directory if not provided
-        if output_dir is None:
-            output_dir = tempfile.mkdtemp(prefix="pdf2md_")
+        if not in_memory:
+            if output_dir is None:
+                output_dir = tempfile.mkdtemp(prefix="pdf2md_")
+            else:
+                os.makedirs(output_dir, exist_ok=True)
+
+        # Open the PDF, rendering the whole document with pdf2image if PyMuPDF cannot read it
+        try:
+            pdf_document = fitz.open(pdf_path)
+        except Exception as e:
+            print(f"Error opening {pdf_path} with PyMuPDF: {e}")
+            print("Trying pdf2image for the whole document instead...")
+            yield from self._iter_pdf2image_document(pdf_path, output_dir, in_memory, pages)
+            return
+
+        with pdf_document:
+            if pages is None:
+                pages = range(len(pdf_document))
+
+            if self.render_workers <= 1:
+                for page_num in pages:
+                    yield self._process_page_or_fallback(
+                        pdf_document, pdf_path, page_num, output_dir, in_memory, extract_text
+                    )
+                return
+
+        # The render workers open their own copy of the document
+        yield from self._iter_pages_parallel(pdf_path, output_dir, in_memory, extract_text, list(pages))
+
+    def _process_page(self, page: "fitz.Page", page_num: int, output_dir: Optional[str],
+                      in_memory: bool, extract_text: bool) -> RenderedPage:
+        """
+        Render a single page, or extract its text if it is text-native.
+
+        Args:
+            page: PyMuPDF page
+            page_num: Zero-based page number
+            output_dir: Directory to save the image (unused in in-memory mode)
+            in_memory: Whether to return encoded image bytes instead of writing a file
+            extract_text: Whether to extract text from text-native pages
+
+        Returns:
+            Rendered page
+        """
+        start_time = time.perf_counter()
+
+        # Skip rendering for pages whose text can be extracted directly
+        if extract_text and self.classify_page(page) == "text":
+            text = self.extract_page_text(page)
+            self.metrics.observe("text_extract", time.perf_counter() - start_time)
+            self.metrics.increment("text_layer_pages")
+            return RenderedPage(page_num, text=text)
+
+        # Convert the page, or each of its regions, to a pixmap and encode it once
+        image_format = self._choose_format(page)
+        regions = self._plan_regions(page)
+        grayscale = self.adaptive and self._is_grayscale(page)
+        images = [
+            self._encode_pixmap(self._render_page(page, region, grayscale), image_format)
+            for region in regions
+        ]
+        self.metrics.observe("render", time.perf_counter() - start_time)
+        self.metrics.increment("rendered_pages")
+        self.metrics.increment("rendered_bytes", sum(len(image_bytes) for image_bytes in images))
+        if regions[0] is not None and self.crop:
+            self.metrics.increment("cropped_pages")
+        if len(images) > 1:
+            self.metrics.increment("tiles", len(images))
+
+        return self._make_rendered_page(page_num, images, image_format, output_dir, in_memory)
+
+    def _make_rendered_page(self, page_num: int, images: List[bytes], image_format: str,
+                            output_dir: Optional[str], in_memory: bool) -> RenderedPage:
+        """
+        Build a rendered page from its encoded images, saving them unless in in-memory mode.
+
+        Args:
+            page_num: Zero-based page number
+            images: Encoded image of the page, or of each of its tiles
+            image_format: Format the images are encoded in
+            output_dir: Directory to save the images (unused in in-memory mode)
+            in_memory: Whether to keep the encoded image bytes instead of writing files
+
+        Returns:
+            Rendered page
+        """
+        if not in_memory:
+            # Save the images, one file per tile
+            paths = []
+            for index, image_bytes in enumerate(images, start=1):
+                suffix = f"_tile_{index}" if len(images) > 1 else ""
+                output_path = os.path.join(output_dir, f"page_{page_num + 1}{suffix}.{image_format}")
+                with open(output_path, "wb") as image_file:
+                    image_file.write(image_bytes)
+                paths.append(output_path)
+            images = paths
+
+        if len(images) > 1:
+            return RenderedPage(page_num, tiles=images)
+        return RenderedPage(page_num, image=images[0])
+
+    def _process_page_or_fallback(self, document: "fitz.Document", pdf_path: str, page_num: int,
+                                  output_dir: Optional[str], in_memory: bool, extract_text: bool) -> RenderedPage:
+        """
+        Process a page with PyMuPDF, rendering it with pdf2image if PyMuPDF fails.
+
+        Only the failing page is rendered again, as a whole page at the
+        processor's DPI in PNG (or the configured fixed format); the other
+        pages of the document are unaffected.
+
+        Args:
+            document: PyMuPDF document
+            pdf_path: Path to the PDF file
+            page_num: Zero-based page number
+            output_dir: Directory to save the image (unused in in-memory mode)
+            in_memory: Whether to return encoded image bytes instead of writing a file
+            extract_text: Whether to extract text from text-native pages
+
+        Returns:
+            Rendered page
+        """
+        try:
+            return self._process_page(document.load_page(page_num), page_num, output_dir, in_memory, extract_text)
+        except Exception as e:
+            print(f"Error rendering page {page_num + 1} with PyMuPDF: {e}")
+            print("Trying pdf2image for this page instead...")
+            image_format = self._get_fallback_format()
+            try:
+                images = list(self.iter_pdf2image_pages(pdf_path, [page_num], image_format))
+            except Exception as e2:
+                raise RuntimeError(f"Failed to convert page {page_num + 1} to an image: {e2}") from e
+
+            self.metrics.increment("fallback_pages")
+            return self._make_rendered_page(page_num, images, image_format, output_dir, in_memory)
+
+    def _iter_pdf2image_document(self, pdf_path: str, output_dir: Optional[str], in_memory: bool,
+                                 pages: Optional[Iterable[int]]) -> Iterator[RenderedPage]:
+        """
+        Render the pages of a document that PyMuPDF cannot open with pdf2image.
+
+        Without PyMuPDF there is no text layer to extract, so every page is
+        rendered for OCR, as a whole page in the fallback format.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images (unused in in-memory mode)
+            in_memory: Whether to return encoded image bytes instead of writing files
+            pages: Zero-based numbers of the pages to render (optional, default: all pages)
+
+        Yields:
+            RenderedPage for each page, in page order
+        """
+        import pdf2image
+
+        if pages is None:
+            pages = range(pdf2image.pdfinfo_from_path(pdf_path)["Pages"])
+        pages = list(pages)
+
+        image_format = self._get_fallback_format()
+        for page_num, image_bytes in zip(pages, self.iter_pdf2image_pages(pdf_path, pages, image_format)):
+            self.metrics.increment("fallback_pages")
+            yield self._make_rendered_page(page_num, [image_bytes], image_format, output_dir, in_memory)
+
+    def _get_fallback_format(self) -> str:
+        """
+        Get the image format of pages rendered with pdf2image.
+
+        Returns:
+            The configured format, or PNG when the format is picked per page with PyMuPDF
+        """
+        return "png" if self.image_format == "auto" else self.image_format
+
+    def _encode_pil_image(self, image, image_format: str) -> bytes:
+        """
+        Encode a Pillow image in the given image format.
+
+        Args:
+            image: Pillow image
+            image_format: Image format (png, jpeg or webp)
+
+        Returns:
+            Encoded image bytes
+        """
+        buffer = io.BytesIO()
+        if image_format == "png":
+            image.save(buffer, format="PNG")
         else:
-            os.makedirs(output_dir, exist_ok=True)
+            image.convert("RGB").save(buffer, format=image_format.upper(), quality=self.quality)
+        return buffer.getvalue()
 
-        # Open the PDF
-        pdf_document = fitz.open(pdf_path)
-        num_pages = len(pdf_document)
-        image_paths = []
+    @staticmethod
+    def _iter_page_runs(pages: Iterable[int], max_length: int) -> Iterator[Tuple[int, int]]:
+        """
+        Group page numbers into runs of consecutive pages.
 
-        # Process each page
-        for page_num in tqdm(range(num_pages), desc="Converting PDF to images"):
-            page = pdf_document.load_page(page_num)
-            
-            # Convert page to pixmap
-            pix = page.get_pixmap(matrix=fitz.Matrix(self.dpi/72, self.dpi/72))
-            
-            # Generate output path
-            output_path = os.path.join(output_dir, f"page_{page_num + 1}.{self.image_format}")
-            
-            # Save the image
-            if self.image_format == "png":
-                pix.save(output_path)
-            else:  # jpeg
-                pix.save(output_path, "jpeg")
-                
-            image_paths.append(output_path)
-            
-        pdf_document.close()
-        return image_paths
+        Args:
+            pages: Zero-based page numbers, in order
+            max_length: Maximum number of pages in a run
 
-    def convert_pdf_to_images_pdf2image(self, pdf_path: str, output_dir: Optional[str] = None) -> List[str]:
+        Yields:
+            Tuples of the first and last page number of each run
         """
-        Convert PDF to images using pdf2image.
+        first = last = None
+        for page_num in pages:
+            if first is not None and page_num == last + 1 and page_num - first < max_length:
+                last = page_num
+                continue
+            if first is not None:
+                yield first, last
+            first = last = page_num
+        if first is not None:
+            yield first, last
+
+    def iter_pdf2image_pages(self, pdf_path: str, pages: Iterable[int],
+                             image_format: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Render pages with pdf2image (poppler), yielding the encoded images in order.
+
+        Runs of consecutive pages are rendered by one pdf2image call, which
+        splits them across poppler_threads pdftoppm processes. A call covers at
+        most render_chunk_size pages per thread, so only that many decoded
+        pages are held in memory at once. Images are returned in memory
+        rather than through files.
+
+        Args:
+            pdf_path: Path to the PDF file
+            pages: Zero-based numbers of the pages to render, in order
+            image_format: Image format (optional, default: the processor's format, PNG for auto)
+
+        Yields:
+            Encoded image of each page
+        """
+        import pdf2image
+
+        image_format = image_format or self._get_fallback_format()
+        max_pages = self.poppler_threads * self.render_chunk_size
+
+        for first, last in self._iter_page_runs(pages, max_pages):
+            start_time = time.perf_counter()
+            images = pdf2image.convert_from_path(
+                pdf_path,
+                dpi=self.dpi,
+                first_page=first + 1,
+                last_page=last + 1,
+                thread_count=min(self.poppler_threads, last - first + 1),
+            )
+            encoded = []
+            for image in images:
+                encoded.append(self._encode_pil_image(image, image_format))
+                image.close()
+            del images
+
+            elapsed = time.perf_counter() - start_time
+            for image_bytes in encoded:
+                self.metrics.observe("render", elapsed / len(encoded))
+                self.metrics.increment("rendered_pages")
+                self.metrics.increment("rendered_bytes", len(image_bytes))
+            yield from encoded
+
+    def _iter_pages_parallel(self, pdf_path: str, output_dir: Optional[str], in_memory: bool,
+                             extract_text: bool, pages: List[int]) -> Iterator[RenderedPage]:
+        """
+        Render pages in the render process pool, yielding them in order.
+
+        Pages are split into slices of render_chunk_size consecutive pages.
+        At most two slices per worker are in flight, so rendered pages do not
+        pile up in memory when the consumer is slower than the renderers.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images (unused in in-memory mode)
+            in_memory: Whether to return encoded image bytes instead of writing files
+            extract_text: Whether to extract text from text-native pages
+            pages: Zero-based numbers of the pages to render
+
+        Yields:
+            RenderedPage for each page, in the order of pages
+        """
+        pool = self._get_render_pool()
+        chunks = [pages[i:i + self.render_chunk_size] for i in range(0, len(pages), self.render_chunk_size)]
+        pending = deque()
+
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(
+                    _render_pages_in_worker, self, pdf_path, chunk, output_dir, in_memory, extract_text
+                ))
+                if len(pending) >= 2 * self.render_workers:
+                    yield from self._collect_worker_result(pending.popleft().result())
+
+            while pending:
+                yield from self._collect_worker_result(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _collect_worker_result(self, result: Tuple[List[RenderedPage], Metrics]) -> List[RenderedPage]:
+        """
+        Merge the metrics of a slice rendered by a worker process.
+
+        Args:
+            result: Rendered pages and metrics returned by the worker
+
+        Returns:
+            Rendered pages
+        """
+        pages, worker_metrics = result
+        self.metrics.merge(worker_metrics)
+        return pages
+
+    def iter_page_images(self, pdf_path: str) -> Iterator[bytes]:
+        """
+        Lazily render PDF pages to encoded images in memory using PyMuPDF.
+
+        Unlike iter_pdf_pages, nothing is written to disk: each page is
+        encoded once, in the configured image format, straight from the pixmap.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Yields:
+            Encoded image bytes of each page (of each tile, for tiled pages), in page order
+        """
+        for page in self.iter_pages(pdf_path, in_memory=True, extract_text=False):
+            yield from page.images
+
+    def iter_pdf_pages(self, pdf_path: str, output_dir: Optional[str] = None) -> Iterator[str]:
+        """
+        Lazily convert PDF pages to images using PyMuPDF.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images (optional)
+
+        Yields:
+            Path to each generated image (to each tile, for tiled pages), in page order
+        """
+        for page in self.iter_pages(pdf_path, output_dir, extract_text=False):
+            yield from page.images
+
+    def convert_pdf_to_images_pymupdf(self, pdf_path: str, output_dir: Optional[str] = None) -> List[str]:
+        """
+        Convert PDF to images using PyMuPDF.
 
         Args:
             pdf_path: Path to the PDF file
@@ -91,32 +1067,63 @@ class PDFProcessor:
         Returns:
             List of paths to the generated images
         """
+        from tqdm import tqdm
+
+        num_pages = self.get_page_count(pdf_path)
+        return list(tqdm(
+            self.iter_pdf_pages(pdf_path, output_dir),
+            total=num_pages,
+            desc="Converting PDF to images",
+        ))
+
+    def convert_pdf_to_images_pdf2image(self, pdf_path: str, output_dir: Optional[str] = None,
+                                        in_memory: bool = False) -> List[Union[str, bytes]]:
+        """
+        Convert PDF to images using pdf2image.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images (optional, unused in in-memory mode)
+            in_memory: Whether to return encoded image bytes instead of writing files
+
+        Returns:
+            List of paths to the generated images, or of encoded images in in-memory mode
+        """
+        import pdf2image
+
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
+        # Count the pages with poppler too, as this path is used when PyMuPDF cannot read the file
+        num_pages = pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
+        image_format = self._get_fallback_format()
+        images = self.iter_pdf2image_pages(pdf_path, range(num_pages), image_format)
+        if in_memory:
+            return list(images)
+
         # Create output directory if not provided
         if output_dir is None:
             output_dir = tempfile.mkdtemp(prefix="pdf2md_")
         else:
             os.makedirs(output_dir, exist_ok=True)
 
-        # Convert PDF to images
-        images = pdf2image.convert_from_path(
-            pdf_path,
-            dpi=self.dpi,
-            fmt=self.image_format,
-            output_folder=output_dir,
-            output_file=f"page_",
-            paths_only=True,
-        )
-        
-        return images
+        paths = []
+        for page_num, image_bytes in enumerate(images):
+            output_path = os.path.join(output_dir, f"page_{page_num + 1}.{image_format}")
+            with open(output_path, "wb") as image_file:
+                image_file.write(image_bytes)
+            paths.append(output_path)
+        return paths
 
     def convert_pdf_to_images(self, pdf_path: str, output_dir: Optional[str] = None, 
                               use_pymupdf: bool = True) -> List[str]:
         """
         Convert PDF to images using the preferred method.
 
+        Pages that PyMuPDF fails to render are rendered with pdf2image one by
+        one; the whole document only goes through the other method if the
+        preferred one cannot process the file at all.
+
         Args:
             pdf_path: Path to the PDF file
             output_dir: Directory to save the images (optional)
@@ -131,7 +1138,7 @@ class PDFProcessor:
             else:
                 return self.convert_pdf_to_images_pdf2image(pdf_path, output_dir)
         except Exception as e:
-            # If one method fails, try the other
+            # If one method fails on the whole file, try the other
             print(f"Error using {'PyMuPDF' if use_pymupdf else 'pdf2image'}: {e}")
             print(f"Trying {'pdf2image' if use_pymupdf else 'PyMuPDF'} instead...")
             
@@ -0,0 +1,563 @@
+"""
+Module for streaming a PDF through rendering, OCR and Markdown generation.
+"""
+
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from pdf2md.checkpoint import Checkpoint
+from pdf2md.dedupe import PageDeduplicator
+from pdf2md.markdown_generator import PAGE_MARKER, MarkdownGenerator
+from pdf2md.metrics import Metrics
+from pdf2md.ocr_cache import OCRCache
+from pdf2md.ocr_processor import OCRProcessor
+from pdf2md.pdf_processor import PDFProcessor, RenderedPage
+
+# Marker put on the render queue once all pages have been rendered
+_DONE = object()
+
+T = TypeVar("T")
+
+
+class ConversionPipeline:
+    """
+    Class for converting a PDF to Markdown as a stream of pages.
+
+    Pages are rendered in a background thread into a bounded queue, OCR'd as
+    soon as they exist and appended to the output file in page order. Each
+    rendered image is deleted once its text is available, so disk and memory
+    usage stay flat regardless of the number of pages. In in-memory mode the
+    images are never written to disk at all.
+
+    In incremental mode every page of the output starts with a marker holding
+    a hash of the page content and conversion settings. When the output
+    already exists, pages whose hash did not change are copied from it and
+    only edited or added pages are converted.
+
+    With a deduplicator, blank pages and pages that are the same as a page
+    already OCR'd (in any document of the pipeline) are not sent to OCR.
+    """
+
+    def __init__(self, pdf_processor: PDFProcessor, ocr_processor: OCRProcessor,
+                 markdown_generator: MarkdownGenerator, queue_size: int = 4,
+                 in_memory: bool = False, retry_passes: int = 1, show_progress: bool = True,
+                 incremental: bool = False, metrics: Optional[Metrics] = None,
+                 deduplicator: Optional[PageDeduplicator] = None):
+        """
+        Initialize the conversion pipeline.
+
+        Args:
+            pdf_processor: Processor used to render pages to images
+            ocr_processor: Processor used to extract text from the images
+            markdown_generator: Generator used to convert the text to Markdown
+            queue_size: Maximum number of rendered pages waiting for OCR
+            in_memory: Whether to keep rendered images in memory instead of on disk
+            retry_passes: Number of extra passes over failed pages when checkpointing
+            show_progress: Whether to show a per-page progress bar
+            incremental: Whether to mark the pages of the output and reuse unchanged
+                         pages of an existing output
+            metrics: Metrics recording queue waits and document timings (optional, default:
+                     the OCR processor's metrics; pass the same object to every processor to
+                     get a single report)
+            deduplicator: Stage skipping blank and duplicate pages before OCR (optional)
+        """
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        self.pdf_processor = pdf_processor
+        self.ocr_processor = ocr_processor
+        self.markdown_generator = markdown_generator
+        self.queue_size = queue_size
+        self.in_memory = in_memory
+        self.retry_passes = retry_passes
+        self.show_progress = show_progress
+        self.incremental = incremental
+        self.metrics = metrics or ocr_processor.metrics
+        self.deduplicator = deduplicator
+
+    def _discard(self, page: RenderedPage) -> None:
+        """
+        Delete the rendered images of a page that is no longer needed.
+
+        Args:
+            page: Page produced by the PDF processor
+        """
+        for image in page.images:
+            if isinstance(image, str) and os.path.exists(image):
+                os.remove(image)
+
+    def _render_worker(self, pdf_path: str, output_dir: str, pages: Sequence[int],
+                       render_queue: queue.Queue, stop_event: threading.Event) -> None:
+        """
+        Render pages into the queue until the document is exhausted or the pipeline stops.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images
+            pages: Zero-based numbers of the pages to render
+            render_queue: Queue receiving rendered pages, then _DONE or an exception
+            stop_event: Event set when the consumer has stopped
+        """
+        try:
+            rendered = self.pdf_processor.iter_pages(pdf_path, output_dir, in_memory=self.in_memory, pages=pages)
+            for page in rendered:
+                # Block while the queue is full, but give up if the consumer has stopped
+                while True:
+                    if stop_event.is_set():
+                        self._discard(page)
+                        return
+                    try:
+                        render_queue.put(page, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+            render_queue.put(_DONE)
+        except Exception as e:
+            render_queue.put(e)
+
+    def _iter_rendered(self, render_queue: queue.Queue, in_flight: deque) -> Iterator[RenderedPage]:
+        """
+        Yield rendered pages from the queue.
+
+        Args:
+            render_queue: Queue filled by the render worker
+            in_flight: Deque recording every page handed to OCR, in order
+
+        Yields:
+            Each rendered page, in page order
+        """
+        while True:
+            with self.metrics.timer("queue_wait"):
+                item = render_queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise RuntimeError(f"Failed to convert PDF to images: {item}")
+            in_flight.append(item)
+            yield item
+
+    def _iter_results(self, pdf_path: str, output_dir: str, pages: Sequence[int],
+                      return_exceptions: bool = False) -> Iterator[Tuple[RenderedPage, Union[str, Exception]]]:
+        """
+        Yield the text of each page while rendering runs in the background.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images
+            pages: Zero-based numbers of the pages to convert
+            return_exceptions: Whether to yield the exception of a failed page instead of raising it
+
+        Yields:
+            Tuple of each page and its text (or exception), in page order
+        """
+        from tqdm import tqdm
+
+        render_queue = queue.Queue(maxsize=self.queue_size)
+        stop_event = threading.Event()
+        in_flight = deque()
+
+        render_thread = threading.Thread(
+            target=self._render_worker,
+            args=(pdf_path, output_dir, pages, render_queue, stop_event),
+            daemon=True,
+        )
+        render_thread.start()
+
+        # Skip blank and duplicate pages between rendering and OCR
+        rendered = self._iter_rendered(render_queue, in_flight)
+        dedupe = self.deduplicator.stream(pdf_path) if self.deduplicator is not None else None
+        if dedupe is not None:
+            rendered = dedupe.filter(rendered)
+
+        try:
+            results = self.ocr_processor.iter_process_pages(rendered, return_exceptions=return_exceptions)
+            for result in tqdm(results, total=len(pages), desc="Converting pages", disable=not self.show_progress):
+                # The image of this page is no longer needed
+                page = in_flight.popleft()
+                self._discard(page)
+                if dedupe is not None:
+                    result = dedupe.resolve(page.page_num, result)
+                yield page, result
+        finally:
+            stop_event.set()
+            render_thread.join()
+
+            # Remove images left behind if the pipeline stopped early
+            for page in in_flight:
+                self._discard(page)
+            while not render_queue.empty():
+                item = render_queue.get_nowait()
+                if isinstance(item, RenderedPage):
+                    self._discard(item)
+
+    def _iter_checkpointed(self, pdf_path: str, output_dir: str, pages: Sequence[int],
+                           checkpoint: Checkpoint) -> Iterator[Optional[str]]:
+        """
+        Yield the text of each page, converting only pages missing from the checkpoint.
+
+        Every converted page is recorded in the checkpoint as soon as it
+        finishes. Pages that fail are recorded as failed and yielded as None
+        instead of aborting the run.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images
+            pages: Zero-based numbers of the pages to yield
+            checkpoint: Checkpoint of the document
+
+        Yields:
+            Text of each page (None for failed pages), in page order
+        """
+        missing = [page_num for page_num in pages if not checkpoint.is_done(page_num)]
+        if len(missing) < len(pages):
+            print(f"Resuming: {len(pages) - len(missing)} pages already converted")
+
+        results = self._iter_results(pdf_path, output_dir, missing, return_exceptions=True)
+        for page_num in pages:
+            if checkpoint.is_done(page_num):
+                yield checkpoint.get_text(page_num)
+                continue
+
+            page, result = next(results)
+            if isinstance(result, Exception):
+                print(f"Failed to convert page {page.page_num + 1}: {result}")
+                checkpoint.record_failure(page.page_num, result)
+                yield None
+            else:
+                checkpoint.record_success(page.page_num, result)
+                yield result
+
+    def _retry_failed(self, pdf_path: str, output_dir: str, checkpoint: Checkpoint) -> bool:
+        """
+        Run the extra passes over the pages that failed.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_dir: Directory to save the images
+            checkpoint: Checkpoint of the document
+
+        Returns:
+            True if any page was retried
+        """
+        retried = False
+        for _ in range(self.retry_passes):
+            failed = checkpoint.failed_pages
+            if not failed:
+                break
+
+            print(f"Retrying {len(failed)} failed pages...")
+            retried = True
+            for page, result in self._iter_results(pdf_path, output_dir, failed, return_exceptions=True):
+                if isinstance(result, Exception):
+                    checkpoint.record_failure(page.page_num, result)
+                else:
+                    checkpoint.record_success(page.page_num, result)
+
+        return retried
+
+    def _report_progress(self, items: Iterable[T], total: int,
+                         progress_callback: Optional[Callable[[int, int], None]],
+                         start_time: float) -> Iterator[T]:
+        """
+        Pass items through, reporting how many have been consumed.
+
+        Args:
+            items: Iterable of per-page items
+            total: Total number of pages
+            progress_callback: Function called with (pages done, total pages) (optional)
+            start_time: time.perf_counter() value at the start of the run
+
+        Yields:
+            The items, unchanged
+        """
+        for done, item in enumerate(items, start=1):
+            yield item
+            if done == 1:
+                self.metrics.observe("first_page", time.perf_counter() - start_time)
+            self.metrics.increment("pages_written")
+            if progress_callback:
+                progress_callback(done, total)
+
+    def get_report(self) -> Dict:
+        """
+        Build a machine-readable report of everything converted by the pipeline so far.
+
+        Returns:
+            Dictionary with the per-stage timings (count, total, mean, p50, p95, max)
+            and counters, the retry counters and, if used, the cache statistics and the
+            pages skipped by deduplication
+        """
+        report = self.metrics.summary()
+        report["retries"] = self.ocr_processor.retrier.get_stats()
+        if self.deduplicator is not None:
+            report["dedupe"] = self.deduplicator.get_report()
+        if self.ocr_processor.cache is not None:
+            report["cache"] = self.ocr_processor.cache.get_stats()
+        return report
+
+    def _get_dedupe_settings(self) -> tuple:
+        """
+        Get the deduplication settings that affect the output.
+
+        Returns:
+            Tuple holding the deduplicator's settings, or an empty tuple without deduplication
+        """
+        if self.deduplicator is None:
+            return ()
+        return (("dedupe", *self.deduplicator.get_settings()),)
+
+    def document_cache_key(self, pdf_path: str) -> str:
+        """
+        Compute the key identifying a document and the settings it is converted with.
+
+        Used for the document cache and to match checkpoints to documents.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Document cache key covering the PDF content and every setting affecting the output
+        """
+        return OCRCache.document_key(
+            pdf_path,
+            *self.ocr_processor.get_settings(),
+            self.pdf_processor.get_settings(),
+            *self.markdown_generator.get_settings(),
+            *self._get_dedupe_settings(),
+        )
+
+    def get_page_hashes(self, pdf_path: str) -> List[str]:
+        """
+        Compute the hash written in the marker of every page in incremental mode.
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Short hex digest of each page's content and every setting affecting its output
+        """
+        settings = repr((
+            self.ocr_processor.get_settings(),
+            self.pdf_processor.get_settings(),
+            *self.markdown_generator.get_settings(),
+            *self._get_dedupe_settings(),
+        )).encode("utf-8")
+        return [
+            hashlib.sha256(settings + content_hash.encode("ascii")).hexdigest()[:16]
+            for content_hash in self.pdf_processor.get_page_hashes(pdf_path)
+        ]
+
+    def _load_unchanged_pages(self, output_path: str, pages: Sequence[int],
+                              page_hashes: List[str]) -> Dict[int, str]:
+        """
+        Find the pages of an existing output that can be reused.
+
+        Pages are matched by hash rather than position, so pages moved by
+        pages inserted or removed before them are reused too. When page breaks
+        are reconciled, the start of a page depends on the end of the page
+        before it, so a page is only reused if it followed the same page.
+
+        Args:
+            output_path: Path to the output of a previous incremental run
+            pages: Zero-based numbers of the pages being converted
+            page_hashes: Current hash of every page
+
+        Returns:
+            Dictionary mapping page numbers to their marked Markdown, for pages
+            whose hash is found in the existing output
+        """
+        if not os.path.exists(output_path):
+            return {}
+
+        with open(output_path, "r", encoding="utf-8") as output_file:
+            previous = self.markdown_generator.parse_marked_pages(output_file.read())
+        reconcile = self.markdown_generator.reconcile
+
+        # Key the pages by their hash, and by the hash of the page before them when reconciling
+        chunks, previous_hash = {}, ""
+        for _, (page_hash, chunk) in sorted(previous.items()):
+            if page_hash:
+                chunks[(previous_hash, page_hash) if reconcile else page_hash] = chunk
+            previous_hash = page_hash
+
+        reused, previous_hash = {}, ""
+        for page_num in pages:
+            page_hash = page_hashes[page_num]
+            chunk = chunks.get((previous_hash, page_hash) if reconcile else page_hash)
+            previous_hash = page_hash
+            if chunk is not None:
+                # Renumber the marker in case the page moved
+                marker = PAGE_MARKER.format(number=page_num + 1, page_hash=page_hashes[page_num])
+                _, _, markdown = chunk.partition("\n")
+                reused[page_num] = f"{marker}\n{markdown}"
+        return reused
+
+    def _iter_marked_pages(self, pages: Sequence[int], texts: Iterable[Optional[str]],
+                           page_hashes: List[str], reused: Dict[int, str]) -> Iterator[str]:
+        """
+        Splice reused and newly converted pages into a stream of marked page Markdown.
+
+        Args:
+            pages: Zero-based numbers of the pages to write
+            texts: Text (None for failed pages) of every page not in reused, in page order
+            page_hashes: Current hash of every page
+            reused: Marked Markdown of the unchanged pages
+
+        Yields:
+            Marked Markdown of each page, in page order
+        """
+        texts = iter(texts)
+        previous_line = None
+        for page_num in pages:
+            if page_num in reused:
+                markdown = reused[page_num]
+            else:
+                markdown = self.markdown_generator.generate_marked_page(
+                    page_num, next(texts), page_hashes[page_num], previous_line
+                )
+            previous_line = MarkdownGenerator.last_line(markdown)
+            yield markdown
+
+    def _write_output(self, output_path: str, pages: Sequence[int], texts: Iterable[Optional[str]],
+                      page_hashes: Optional[List[str]] = None, reused: Optional[Dict[int, str]] = None) -> None:
+        """
+        Write the Markdown output of a run.
+
+        In incremental mode the output is written to a temporary file that
+        replaces the previous output once complete, as the previous output
+        is the source of the reused pages.
+
+        Args:
+            output_path: Path to the output Markdown file
+            pages: Zero-based numbers of the pages to write
+            texts: Text (None for failed pages) of every converted page, in page order
+            page_hashes: Current hash of every page (incremental mode only)
+            reused: Marked Markdown of the unchanged pages (incremental mode only)
+        """
+        if page_hashes is None:
+            with open(output_path, "w", encoding="utf-8") as output_file:
+                self.markdown_generator.write_markdown(texts, output_file)
+            return
+
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".md")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as output_file:
+                self.markdown_generator.write_pages(
+                    self._iter_marked_pages(pages, texts, page_hashes, reused or {}), output_file
+                )
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def run(self, pdf_path: str, output_path: str, output_dir: Optional[str] = None,
+            checkpoint: Optional[Checkpoint] = None,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+            pages: Optional[Iterable[int]] = None) -> int:
+        """
+        Convert a PDF to a Markdown file, writing each page as soon as it is ready.
+
+        If the OCR processor has a cache and the same document has been
+        converted before with the same settings, the cached Markdown is written
+        directly without rendering or OCR'ing any page.
+
+        With a checkpoint, pages already in the checkpoint are not converted
+        again and failed pages do not abort the run: they are retried in
+        extra passes and, if they still fail, left as placeholders in the
+        output and reported with a RuntimeError once the output is written.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_path: Path to the output Markdown file
+            output_dir: Directory to store the temporary images (optional, default: a temporary
+                        directory removed afterwards; unused in in-memory mode)
+            checkpoint: Checkpoint to resume from and record progress to (optional)
+            progress_callback: Function called with (pages done, total pages) after
+                               each converted page is written (optional)
+            pages: Zero-based numbers of the pages to convert (optional, default: all pages)
+
+        Returns:
+            Number of pages written
+        """
+        # Use a temporary directory for the images that is removed afterwards
+        if output_dir is None and not self.in_memory:
+            with tempfile.TemporaryDirectory(prefix="pdf2md_") as temp_dir:
+                return self.run(pdf_path, output_path, temp_dir, checkpoint, progress_callback, pages)
+
+        start_time = time.perf_counter()
+        num_pages = self.pdf_processor.get_page_count(pdf_path)
+        if pages is None:
+            pages = list(range(num_pages))
+        else:
+            pages = sorted(set(pages))
+            for page_num in pages:
+                if not 0 <= page_num < num_pages:
+                    raise ValueError(f"Page {page_num + 1} is out of range, the document has {num_pages} pages")
+
+        # Short-circuit documents that have already been converted
+        cache = self.ocr_processor.cache
+        document_key = None
+        if cache is not None and len(pages) == num_pages and not self.incremental:
+            document_key = self.document_cache_key(pdf_path)
+            markdown_text = cache.get_document(document_key)
+            if markdown_text is not None:
+                with open(output_path, "w", encoding="utf-8") as output_file:
+                    output_file.write(markdown_text)
+                if progress_callback:
+                    progress_callback(num_pages, num_pages)
+                self.metrics.increment("documents")
+                self.metrics.observe("document", time.perf_counter() - start_time)
+                return num_pages
+
+        # Only convert the pages that changed since the previous incremental output
+        page_hashes, reused = None, {}
+        if self.incremental:
+            page_hashes = self.get_page_hashes(pdf_path)
+            reused = self._load_unchanged_pages(output_path, pages, page_hashes)
+            self.metrics.increment("reused_pages", len(reused))
+            if reused:
+                print(f"Incremental: {len(reused)} unchanged pages reused, {len(pages) - len(reused)} to convert")
+        convert = [page_num for page_num in pages if page_num not in reused]
+
+        if checkpoint is None:
+            texts = (text for _, text in self._iter_results(pdf_path, output_dir, convert))
+        else:
+            texts = self._iter_checkpointed(pdf_path, output_dir, convert, checkpoint)
+
+        self._write_output(
+            output_path, pages, self._report_progress(texts, len(convert), progress_callback, start_time),
+            page_hashes, reused,
+        )
+
+        if checkpoint is not None:
+            # Rewrite the output from the checkpoint if any failed page was retried
+            if self._retry_failed(pdf_path, output_dir, checkpoint):
+                self._write_output(
+                    output_path, pages, (checkpoint.get_text(page_num) for page_num in convert),
+                    page_hashes, reused,
+                )
+
+            checkpoint.compact()
+            failed = checkpoint.failed_pages
+            if failed:
+                page_list = ", ".join(str(page_num + 1) for page_num in failed)
+                raise RuntimeError(
+                    f"{len(failed)} of {num_pages} pages could not be converted (pages {page_list}); "
+                    "run again with resume to retry them"
+                )
+
+        if document_key:
+            with open(output_path, "r", encoding="utf-8") as output_file:
+                cache.put_document(document_key, output_file.read())
+
+        self.metrics.increment("documents")
+        self.metrics.observe("document", time.perf_counter() - start_time)
+        return len(pages)
@@ -0,0 +1,52 @@
+"""
+Module for limiting the rate of OCR API requests.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting the number of requests per minute.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            requests_per_minute: Maximum sustained number of requests per minute
+            burst: Maximum number of requests that may be sent back to back
+                   (optional, default: 1)
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be greater than 0")
+
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or 1)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """
+        Add the tokens accumulated since the last refill.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """
+        Block until a request may be sent.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
@@ -0,0 +1,323 @@
+"""
+Module for retrying failed OCR requests.
+"""
+
+import random
+import threading
+import time
+import urllib.error
+from collections import deque
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# HTTP status codes of errors that go away when the request is retried later
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Exception types caused by the request itself, which fail again on every retry
+FATAL_ERROR_TYPES = (ValueError, TypeError, KeyError, NotImplementedError, FileNotFoundError, PermissionError)
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """
+    Get the HTTP status code of a failed request.
+
+    Works with OCRBackendError, urllib errors and Google API errors.
+
+    Args:
+        error: Error raised by the request
+
+    Returns:
+        HTTP status code, or None if the error does not carry one
+    """
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return int(value)
+    return None
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Get the delay a server asked to wait before retrying.
+
+    Reads the retry_after attribute of OCRBackendError (from the Retry-After
+    header) and the RetryInfo details of Google API errors.
+
+    Args:
+        error: Error raised by the request
+
+    Returns:
+        Delay in seconds, or None if the server gave no hint
+    """
+    retry_after = getattr(error, "retry_after", None)
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+
+    try:
+        for detail in getattr(error, "details", None) or []:
+            retry_delay = getattr(detail, "retry_delay", None)
+            if retry_delay is not None:
+                return retry_delay.seconds + retry_delay.nanos / 1e9
+    except (AttributeError, TypeError):
+        pass
+
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether a failed request is worth retrying.
+
+    Rate limits, server errors, timeouts and connection problems are
+    retryable. Other HTTP errors (bad request, authentication, ...) and
+    errors caused by the request itself are fatal.
+
+    Args:
+        error: Error raised by the request
+
+    Returns:
+        True if the request may succeed when retried
+    """
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+
+    if isinstance(error, (TimeoutError, ConnectionError, urllib.error.URLError)):
+        return True
+    if isinstance(error, FATAL_ERROR_TYPES):
+        return False
+
+    # Unknown errors are retried, as they always were
+    return True
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    The delay before retry n (starting at 0) is drawn uniformly between 0
+    and min(max_delay, base_delay * 2**n), so workers that failed together do
+    not retry together. A delay requested by the server is always honored,
+    with a little jitter added on top.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0, max_delay: float = 60.0,
+                 seed: Optional[int] = None):
+        """
+        Initialize the retry policy.
+
+        Args:
+            max_attempts: Maximum number of attempts per request, including the first
+            base_delay: Upper bound of the first backoff delay in seconds
+            max_delay: Upper bound of any backoff delay in seconds
+            seed: Seed of the jitter (optional, for repeatable runs)
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def get_delay(self, retry: int, retry_after: Optional[float] = None) -> float:
+        """
+        Compute the delay before a retry.
+
+        Args:
+            retry: Zero-based number of the retry
+            retry_after: Delay requested by the server, in seconds (optional)
+
+        Returns:
+            Delay in seconds
+        """
+        with self._lock:
+            if retry_after is not None:
+                return retry_after + self._rng.uniform(0, self.base_delay)
+            return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """
+    Breaker shared by all OCR workers that slows the whole job down when requests keep failing.
+
+    The outcomes of the last ``window`` requests are tracked. Once at least
+    ``min_requests`` are known and the share of retryable failures reaches
+    ``failure_threshold``, the breaker opens: every worker waits ``cooldown``
+    seconds before sending its next request. A server's retry hint opens the
+    breaker for at least that long, so one rate limit response pauses every
+    worker instead of only the one that received it.
+    """
+
+    def __init__(self, window: int = 20, failure_threshold: float = 0.5, min_requests: int = 10,
+                 cooldown: float = 10.0):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            window: Number of recent requests considered
+            failure_threshold: Share of failed requests that opens the breaker
+            min_requests: Minimum number of recent requests before the breaker can open
+            cooldown: Seconds the breaker stays open
+        """
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+        self.opens = 0
+
+    def wait(self) -> float:
+        """
+        Block while the breaker is open.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                remaining = self._open_until - time.monotonic()
+            if remaining <= 0:
+                return waited
+            time.sleep(remaining)
+            waited += remaining
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold back every worker for a while.
+
+        Args:
+            seconds: Seconds to wait before the next request
+        """
+        with self._lock:
+            self._open_until = max(self._open_until, time.monotonic() + seconds)
+
+    def record_success(self) -> None:
+        """
+        Record a successful request.
+        """
+        with self._lock:
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        """
+        Record a request that failed with a retryable error, opening the breaker if needed.
+        """
+        with self._lock:
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if (len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.failure_threshold):
+                self._open_until = max(self._open_until, time.monotonic() + self.cooldown)
+                self.opens += 1
+                # Start over, so the breaker only opens again on new failures
+                self._outcomes.clear()
+
+
+class Retrier:
+    """
+    Runs requests with retries, a shared circuit breaker and counters.
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize the retrier.
+
+        Args:
+            policy: Retry policy (optional, default: RetryPolicy())
+            breaker: Circuit breaker shared by every request (optional, default: CircuitBreaker())
+        """
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "fatal_errors": 0,
+            "exhausted": 0,
+            "backoff_seconds": 0.0,
+            "circuit_wait_seconds": 0.0,
+        }
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name: Name of the counter
+            amount: Amount to add
+        """
+        with self._lock:
+            self._stats[name] += amount
+
+    def call(self, func: Callable[[], T], description: str, max_attempts: Optional[int] = None) -> T:
+        """
+        Call a function, retrying it on retryable errors.
+
+        Args:
+            func: Function sending the request
+            description: Description of the request used in messages, e.g. "image page_1.png"
+            max_attempts: Maximum number of attempts (optional, default: from the policy)
+
+        Returns:
+            Result of the function
+
+        Raises:
+            RuntimeError: If the error is fatal or every attempt failed
+        """
+        max_attempts = max_attempts or self.policy.max_attempts
+
+        for attempt in range(max_attempts):
+            self._count("circuit_wait_seconds", self.breaker.wait())
+            self._count("requests")
+
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    self._count("fatal_errors")
+                    raise RuntimeError(f"Failed to process {description}: {e}") from e
+
+                # Hold back every request the server asked to wait, even when this one gives up
+                self.breaker.record_failure()
+                retry_after = get_retry_after(e)
+                if retry_after is not None:
+                    self.breaker.pause(retry_after)
+
+                if attempt == max_attempts - 1:
+                    self._count("exhausted")
+                    if max_attempts == 1:
+                        raise RuntimeError(f"Failed to process {description}: {e}") from e
+                    raise RuntimeError(f"Failed to process {description} after {max_attempts} attempts: {e}") from e
+
+                delay = self.policy.get_delay(attempt, retry_after)
+
+                print(f"Error processing {description}: {e}")
+                print(f"Retrying in {delay:.1f} seconds... (Attempt {attempt + 1}/{max_attempts})")
+                self._count("retries")
+                self._count("backoff_seconds", delay)
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get the retry counters.
+
+        Returns:
+            Dictionary with the number of requests sent, retries, fatal errors,
+            requests that ran out of attempts, circuit breaker openings, and the
+            seconds spent in backoff and waiting on the circuit breaker
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["circuit_opens"] = self.breaker.opens
+        stats["backoff_seconds"] = round(stats["backoff_seconds"], 3)
+        stats["circuit_wait_seconds"] = round(stats["circuit_wait_seconds"], 3)
+        return stats
@@ -0,0 +1,105 @@
+"""
+Module for a long-lived conversion service shared by the requests of a server.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from pdf2md.pipeline import ConversionPipeline
+
+
+class ConversionService:
+    """
+    Class holding one conversion pipeline for the lifetime of a server.
+
+    The pipeline, and with it the OCR backend's client and pooled
+    connections and the OCR worker pool, is built once when the service
+    starts and then shared by every conversion, which may run concurrently
+    from several threads. A pipeline that fails to build (e.g. a missing API
+    key) does not stop the server: conversions fail with the startup error
+    and the health check reports it.
+    """
+
+    def __init__(self, build_pipeline: Callable[[], ConversionPipeline], health_ttl: float = 30.0):
+        """
+        Initialize the conversion service.
+
+        Args:
+            build_pipeline: Function building the shared pipeline, called once by start()
+            health_ttl: Seconds a backend health check result is reused, so frequent
+                        probes do not all reach the OCR backend
+        """
+        self._build_pipeline = build_pipeline
+        self.health_ttl = health_ttl
+        self.pipeline: Optional[ConversionPipeline] = None
+        self.startup_error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._health: Optional[Dict] = None
+        self._health_checked = 0.0
+
+    def start(self) -> None:
+        """
+        Build the shared pipeline, if not done yet.
+        """
+        with self._lock:
+            if self.started_at is not None:
+                return
+
+            self.started_at = time.time()
+            try:
+                self.pipeline = self._build_pipeline()
+            except Exception as e:
+                self.startup_error = f"{type(e).__name__}: {e}"
+
+    def convert(self, pdf_path: str, output_path: str,
+                progress_callback: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Convert a PDF to a Markdown file with the shared pipeline.
+
+        Args:
+            pdf_path: Path to the PDF file
+            output_path: Path to the output Markdown file
+            progress_callback: Function called with (pages done, total pages) (optional)
+
+        Returns:
+            Number of pages converted
+        """
+        self.start()
+        if self.pipeline is None:
+            raise RuntimeError(f"The conversion service failed to start: {self.startup_error}")
+        return self.pipeline.run(pdf_path, output_path, progress_callback=progress_callback)
+
+    def check_health(self) -> Dict:
+        """
+        Check that the service started and that the OCR backend is reachable.
+
+        Returns:
+            Dictionary with "healthy", the backend "model", "uptime" in seconds,
+            "checked_at" time of the backend check and "error" if unhealthy
+        """
+        self.start()
+        if self.pipeline is None:
+            return {"healthy": False, "error": self.startup_error}
+
+        with self._lock:
+            now = time.time()
+            if self._health is None or now - self._health_checked >= self.health_ttl:
+                health = {"healthy": True, "model": self.pipeline.ocr_processor.model_name, "checked_at": now}
+                try:
+                    self.pipeline.ocr_processor.backend.check_health()
+                except Exception as e:
+                    health.update(healthy=False, error=f"{type(e).__name__}: {e}")
+                self._health, self._health_checked = health, now
+
+            return dict(self._health, uptime=round(now - self.started_at, 1))
+
+    def close(self) -> None:
+        """
+        Shut down the shared workers and close the backend's connections.
+        """
+        if self.pipeline is not None:
+            self.pipeline.ocr_processor.close()
+            self.pipeline.pdf_processor.close()
+            self.pipeline.markdown_generator.close()
@@ -0,0 +1,269 @@
+"""
+Module for a local stub OCR server with configurable latency and error rates.
+
+The server answers OCR requests from HTTPBackend with deterministic text
+derived from the image data, so throughput and retry behavior of the
+pipeline can be measured repeatably without calling a real OCR API.
+
+Usage:
+    python -m pdf2md.stub_server --port 8765 --latency 0.5 --error-rate 0.05
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple, Union
+
+from pdf2md.budget import estimate_request_tokens, image_size, text_tokens
+
+# Words the stub text is made of
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua"
+).split()
+
+
+def stub_page_text(image_data: str, paragraphs: int = 3) -> str:
+    """
+    Build the deterministic text of a page.
+
+    Args:
+        image_data: Base64-encoded image data
+        paragraphs: Number of paragraphs after the heading
+
+    Returns:
+        Text that only depends on the image data
+    """
+    digest = hashlib.sha256(image_data.encode("ascii")).hexdigest()
+    rng = random.Random(digest)
+    lines = [f"Stub Page {digest[:12]}"]
+    for _ in range(paragraphs):
+        lines.append(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(20, 60))) + ".")
+    return "\n\n".join(lines)
+
+
+class StubOCRServer:
+    """
+    Threaded HTTP server imitating an OCR API.
+
+    Every request waits ``latency`` seconds (plus up to ``jitter`` seconds),
+    then fails with HTTP 429 (with a Retry-After header) with probability
+    ``rate_limit_rate``, fails with HTTP 500 with probability ``error_rate``,
+    and otherwise returns the stub text of its images. Requests with several
+    images get one "===== PAGE n =====" delimited section per image.
+    Responses report a token usage computed like the Gemini API's (by the
+    image dimensions and prompt length), for testing budgets. The
+    random draws come from a seeded generator, so a run with the same
+    requests in the same order fails the same requests.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, seed: int = 0):
+        """
+        Initialize the stub server.
+
+        Args:
+            host: Address to listen on
+            port: Port to listen on (0 picks a free port)
+            latency: Base latency of a request in seconds
+            jitter: Maximum extra latency of a request in seconds
+            error_rate: Fraction of requests failing with HTTP 500
+            rate_limit_rate: Fraction of requests failing with HTTP 429
+            retry_after: Value of the Retry-After header of HTTP 429 responses, in seconds
+            seed: Seed of the random generator deciding latency and failures
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._connections = set()
+        self.stats = {"requests": 0, "images": 0, "rate_limited": 0, "errors": 0}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive between requests, like a real OCR API
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server._connections.add(self.connection)
+
+            def handle(self):
+                try:
+                    super().handle()
+                except OSError:
+                    # The client or stop() closed the kept-alive connection
+                    pass
+
+            def finish(self):
+                super().finish()
+                with server._lock:
+                    server._connections.discard(self.connection)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/healthz"):
+                    self._send(200, {"status": "ok"})
+                else:
+                    self._send(404, {"error": "Not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    contents = json.loads(self.rfile.read(length))["contents"]
+                except (ValueError, KeyError) as e:
+                    self._send(400, {"error": f"Invalid request: {e}"})
+                    return
+
+                status, body, headers = server.handle(contents)
+                self._send(status, body, headers)
+
+            def _send(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Keep benchmark output clean
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL of the server.
+        """
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle(self, contents: List[Union[str, Dict[str, str]]]) -> Tuple[int, Dict, Dict[str, str]]:
+        """
+        Answer an OCR request.
+
+        Args:
+            contents: Prompt strings and image parts of the request
+
+        Returns:
+            Tuple of the HTTP status, JSON body and extra headers
+        """
+        images = [part["data"] for part in contents if isinstance(part, dict)]
+
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            draw = self._rng.random()
+            self.stats["requests"] += 1
+            self.stats["images"] += len(images)
+            if draw < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+            elif draw < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+
+        time.sleep(delay)
+
+        if draw < self.rate_limit_rate:
+            return 429, {"error": "Rate limit exceeded"}, {"Retry-After": str(self.retry_after)}
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500, {"error": "Internal server error"}, {}
+        if not images:
+            return 400, {"error": "Request contains no image"}, {}
+
+        if len(images) == 1:
+            text = stub_page_text(images[0])
+        else:
+            text = "\n".join(
+                f"===== PAGE {number} =====\n{stub_page_text(data)}"
+                for number, data in enumerate(images, start=1)
+            )
+
+        usage = {
+            "input_tokens": estimate_request_tokens(
+                [part for part in contents if isinstance(part, str)],
+                [image_size(base64.b64decode(data)) for data in images],
+            ),
+            "output_tokens": text_tokens(text),
+        }
+        return 200, {"text": text, "usage": usage}, {}
+
+    def start(self) -> str:
+        """
+        Serve requests in a background thread.
+
+        Returns:
+            Base URL of the server
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="pdf2md-stub-server", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        """
+        Stop the server, closing the connections kept alive by clients.
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    """
+    Run the stub OCR server until interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Run a local stub OCR server for load tests and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Base latency of a request in seconds (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum extra latency in seconds (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500")
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 429"
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=1.0, help="Retry-After of HTTP 429 responses in seconds (default: 1)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed deciding latency and failures (default: 0)")
+    args = parser.parse_args()
+
+    server = StubOCRServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed,
+    )
+    print(f"Stub OCR server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(f"Served {server.stats['requests']} requests ({server.stats['images']} images), "
+              f"{server.stats['rate_limited']} rate limited, {server.stats['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()